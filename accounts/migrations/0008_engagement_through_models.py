@@ -0,0 +1,65 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_profile_reset_code'),
+        ('storyapp', '0018_engagement_through_models'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # The through models reuse the tables of the auto-created many-to-many
+    # fields. story_project.routers.EngagementRouter only lets CreateModel run
+    # on the engagement database; on the default database the existing tables
+    # are left in place (copy_engagement_data moves their rows).
+    operations = [
+        migrations.CreateModel(
+            name='FavoriteStory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profile', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='accounts.profile')),
+                ('story', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='storyapp.story')),
+            ],
+            options={
+                'db_table': 'accounts_profile_favorite_stories',
+                'unique_together': {('profile', 'story')},
+            },
+        ),
+        # The tables already exist; only the model state gains the through model.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='profile',
+                    name='favorite_stories',
+                    field=models.ManyToManyField(blank=True, related_name='favorited_by', through='accounts.FavoriteStory', to='storyapp.story'),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProfileFollow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profile', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='accounts.profile')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'accounts_profile_following',
+                'unique_together': {('profile', 'user')},
+            },
+        ),
+        # The tables already exist; only the model state gains the through model.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='profile',
+                    name='following',
+                    field=models.ManyToManyField(blank=True, related_name='followers', through='accounts.ProfileFollow', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+    ]
@@ -2,7 +2,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from storyapp.models import Story
+from storyapp.models import LiveManager, Story
 
 class Profile(models.Model):
     ROLE_CHOICES = (
@@ -14,12 +14,23 @@ class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(max_length=500, blank=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
-    following = models.ManyToManyField(User, related_name='followers', blank=True)
-    favorite_stories = models.ManyToManyField(Story, related_name='favorited_by', blank=True)
+    # Stored in the engagement database, see storyapp.engagement
+    following = models.ManyToManyField(User, related_name='followers', blank=True, through='ProfileFollow')
+    favorite_stories = models.ManyToManyField(Story, related_name='favorited_by', blank=True, through='FavoriteStory')
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='user')
     assigned_to = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_users')
     reset_code = models.CharField(max_length=6, blank=True, null=True)
 
+    # (role, assigned_to_id) as last loaded or saved; a change resyncs the
+    # story access grants (storyapp.access, storyapp.signals)
+    _saved_access = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        profile = super().from_db(db, field_names, values)
+        profile._saved_access = (profile.__dict__.get('role'), profile.__dict__.get('assigned_to_id'))
+        return profile
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
@@ -44,6 +55,28 @@ class Organization(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_account_organizations')
     members = models.ManyToManyField(User, related_name='account_organizations', blank=True)
+    # Tombstone: set when the organization is deleted (storyapp.deletion)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager()
     
     def __str__(self):
         return self.name
+
+
+class ProfileFollow(models.Model):
+    profile = models.ForeignKey(Profile, on_delete=models.DO_NOTHING, db_constraint=False)
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
+
+    class Meta:
+        db_table = 'accounts_profile_following'
+        unique_together = [('profile', 'user')]
+
+
+class FavoriteStory(models.Model):
+    profile = models.ForeignKey(Profile, on_delete=models.DO_NOTHING, db_constraint=False)
+    story = models.ForeignKey(Story, on_delete=models.DO_NOTHING, db_constraint=False)
+
+    class Meta:
+        db_table = 'accounts_profile_favorite_stories'
+        unique_together = [('profile', 'story')]
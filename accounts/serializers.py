@@ -2,6 +2,7 @@ from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import Profile
 from .models import Organization
+from storyapp.engagement import EngagementListSerializer, engagement_lookup
 
 class ProfileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -33,12 +34,16 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'profile', 'followers_count', 'following_count']
-    
+        list_serializer_class = EngagementListSerializer
+
+    def prime_engagement(self, lookup, users):
+        lookup.prime_users(users)
+
     def get_followers_count(self, obj):
-        return obj.followers.count()
+        return engagement_lookup(self.context).followers(obj)
     
     def get_following_count(self, obj):
-        return obj.profile.following.count()
+        return engagement_lookup(self.context).following(obj)
 
 class UserRegisterSerializer(serializers.ModelSerializer):
     password_confirmation = serializers.CharField(write_only=True)
@@ -1,7 +1,8 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from storyapp.models import StoryInvite
+from storyapp.models import Story, StoryInvite
+from .models import FavoriteStory, Profile, ProfileFollow
 
 User = get_user_model()
 
@@ -9,6 +10,21 @@ User = get_user_model()
 def assign_invites_to_new_user(sender, instance, created, **kwargs):
     if created and instance.email:
         StoryInvite.objects.filter(
-            invited_email__iexact=instance.email,
+            normalized_email=StoryInvite.normalize_email(instance.email),
             invited_user__isnull=True
         ).update(invited_user=instance)
+
+
+# Follows and favorites are in the engagement database and do not cascade
+@receiver(post_delete, sender=Profile)
+def delete_profile_engagement(sender, instance, **kwargs):
+    ProfileFollow.objects.filter(profile_id=instance.pk).delete()
+    FavoriteStory.objects.filter(profile_id=instance.pk).delete()
+
+@receiver(post_delete, sender=User)
+def delete_followers(sender, instance, **kwargs):
+    ProfileFollow.objects.filter(user_id=instance.pk).delete()
+
+@receiver(post_delete, sender=Story)
+def delete_favorites(sender, instance, **kwargs):
+    FavoriteStory.objects.filter(story_id=instance.pk).delete()
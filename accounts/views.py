@@ -6,12 +6,13 @@ from django.contrib.auth import authenticate, login, logout
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
-from .models import Profile, Organization
+from .models import Profile, Organization, FavoriteStory
 from .serializers import OrganizationSerializer
 from .serializers import UserRegisterSerializer, UserSerializer, ProfileSerializer
 from .models import Profile
 from storyapp.models import Story
-from storyapp.serializers import StorySerializer
+from storyapp import deletion, engagement
+from storyapp.serializers import DeletionJobSerializer, StorySerializer
 
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
@@ -175,14 +176,14 @@ class FollowedStoriesView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Story.objects.filter(followed_by=self.request.user)
+        return Story.objects.filter(id__in=engagement.followed_story_ids(self.request.user))
 
 class FavoriteStoriesView(generics.ListAPIView):
     serializer_class = StorySerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return self.request.user.profile.favorite_stories.all()
+        return Story.objects.filter(id__in=engagement.favorite_story_ids(self.request.user.profile))
 
 class AddToFavoritesView(APIView):
     permission_classes = [IsAuthenticated]
@@ -190,7 +191,7 @@ class AddToFavoritesView(APIView):
     def post(self, request, story_id):
         try:
             story = Story.objects.get(id=story_id)
-            request.user.profile.favorite_stories.add(story)
+            engagement.set_engaged(FavoriteStory, 'story', story.id, request.user.profile.id, True, owner_field='profile')
             return Response({'detail': 'Added to favorites'}, status=status.HTTP_200_OK)
         except Story.DoesNotExist:
             return Response({'error': 'Story not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -201,7 +202,7 @@ class RemoveFromFavoritesView(APIView):
     def post(self, request, story_id):
         try:
             story = Story.objects.get(id=story_id)
-            request.user.profile.favorite_stories.remove(story)
+            engagement.set_engaged(FavoriteStory, 'story', story.id, request.user.profile.id, False, owner_field='profile')
             return Response({'detail': 'Removed from favorites'}, status=status.HTTP_200_OK)
         except Story.DoesNotExist:
             return Response({'error': 'Story not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -782,7 +783,7 @@ class SubadminDeleteUserView(APIView):
                            status=status.HTTP_403_FORBIDDEN)
         
         try:
-            user = User.objects.get(id=user_id)
+            user = User.objects.get(id=user_id, is_active=True)
             
             # Don't allow subadmins to delete themselves
             if user == request.user:
@@ -796,12 +797,13 @@ class SubadminDeleteUserView(APIView):
                     return Response({'error': 'You can only delete users assigned to you'}, 
                                   status=status.HTTP_403_FORBIDDEN)
             
-            username = user.username
-            user.delete()
+            # Deactivated now, their content is deleted in the background
+            job = deletion.delete_user(user, request.user)
             
             return Response({
-                'detail': f'User {username} has been deleted successfully'
-            }, status=status.HTTP_200_OK)
+                'detail': f'User {user.username} has been deleted successfully',
+                'job': DeletionJobSerializer(job).data,
+            }, status=status.HTTP_202_ACCEPTED)
             
         except User.DoesNotExist:
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -823,12 +825,13 @@ class DeleteOrganizationView(APIView):
                 return Response({'error': 'You do not have permission to delete this organization'}, 
                                status=status.HTTP_403_FORBIDDEN)
             
-            org_name = organization.name
-            organization.delete()
+            # Hidden now, its rows are deleted in the background
+            job = deletion.delete_organization(organization, request.user)
             
             return Response({
-                'detail': f'Organization "{org_name}" has been deleted successfully'
-            }, status=status.HTTP_200_OK)
+                'detail': f'Organization "{organization.name}" has been deleted successfully',
+                'job': DeletionJobSerializer(job).data,
+            }, status=status.HTTP_202_ACCEPTED)
             
         except Organization.DoesNotExist:
             return Response({'error': 'Organization not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -843,19 +846,20 @@ class DeleteUserView(APIView):
                            status=status.HTTP_403_FORBIDDEN)
         
         try:
-            user = User.objects.get(id=user_id)
+            user = User.objects.get(id=user_id, is_active=True)
             
             # Don't allow admins to delete themselves
             if user == request.user:
                 return Response({'error': 'You cannot delete your own account'}, 
                                status=status.HTTP_400_BAD_REQUEST)
             
-            username = user.username
-            user.delete()
+            # Deactivated now, their content is deleted in the background
+            job = deletion.delete_user(user, request.user)
             
             return Response({
-                'detail': f'User {username} has been deleted successfully'
-            }, status=status.HTTP_200_OK)
+                'detail': f'User {user.username} has been deleted successfully',
+                'job': DeletionJobSerializer(job).data,
+            }, status=status.HTTP_202_ACCEPTED)
             
         except User.DoesNotExist:
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
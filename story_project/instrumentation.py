@@ -0,0 +1,132 @@
+import heapq
+import re
+import time
+from contextvars import ContextVar
+
+from rest_framework.renderers import JSONRenderer
+
+_current_stats = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """
+    Costs collected while a single request is being handled.
+
+    view_ms is the time from calling the view until it returned its
+    response, which includes serializer.data and the queries the view runs
+    (those count towards query_ms as well); render_ms is the time spent
+    turning the result into JSON, which for DRF views happens after the
+    view has returned.
+
+    Statements are grouped by fingerprint (see ``fingerprint``), so the ones
+    behind an N+1 pattern add up under a single entry. The SQL parameters
+    are only kept when keep_sql is set.
+    """
+
+    def __init__(self, keep_queries=5, keep_sql=False):
+        self.view = None
+        self.query_count = 0
+        self.query_ms = 0.0
+        self.view_ms = 0.0
+        self.render_ms = 0.0
+        self.total_ms = 0.0
+        self._keep_queries = keep_queries
+        self._keep_sql = keep_sql
+        # fingerprint -> [count, ms, database alias, slowest (ms, sql, params) or None]
+        self._fingerprints = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper() on every database.
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.query_count += 1
+            self.query_ms += elapsed
+            if self._keep_queries:
+                entry = self._fingerprints.setdefault(
+                    fingerprint(sql), [0, 0.0, context['connection'].alias, None]
+                )
+                entry[0] += 1
+                entry[1] += elapsed
+                if self._keep_sql and (entry[3] is None or elapsed > entry[3][0]):
+                    entry[3] = (elapsed, sql, params)
+
+    @property
+    def top_fingerprints(self):
+        """
+        (milliseconds, count, database alias, fingerprint, slowest statement)
+        for the fingerprints that took the most time in total, slowest first.
+        The slowest statement is (sql, params), or None unless keep_sql is set.
+        """
+        ranked = heapq.nlargest(self._keep_queries, self._fingerprints.items(), key=lambda item: item[1][1])
+        return [
+            (ms, count, alias, key, None if slowest is None else slowest[1:])
+            for key, (count, ms, alias, slowest) in ranked
+        ]
+
+    def activate(self):
+        # Set and cleared with plain set() calls rather than a reset token:
+        # under ASGI the two happen in different copies of the context.
+        _current_stats.set(self)
+
+    @staticmethod
+    def deactivate():
+        _current_stats.set(None)
+
+
+def current_stats():
+    """The RequestStats of the request being handled, or None outside the middleware"""
+    return _current_stats.get()
+
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)')
+_SELECT_LIST = re.compile(r'^SELECT\s.*?\sFROM\s', re.DOTALL)
+
+
+def fingerprint(sql):
+    """
+    The statement without its values: literals become placeholders, IN lists
+    of any length become ``(%s, ...)`` and the selected columns are left out,
+    e.g. ``SELECT ... FROM "storyapp_story" WHERE "storyapp_story"."id" IN (%s, ...)``.
+    """
+    sql = _LITERALS.sub('%s', sql)
+    sql = _PLACEHOLDER_LISTS.sub('(%s, ...)', sql)
+    sql = _SELECT_LIST.sub('SELECT ... FROM ', sql)
+    return ' '.join(sql.split())
+
+
+def view_label(request):
+    """
+    Name of the view that handled the request, e.g. ``StoryViewSet.feed`` for a
+    viewset action or ``AdminEpisodeReviewView`` for a plain APIView.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view = match.func
+    cls = getattr(view, 'cls', None) or getattr(view, 'view_class', None)
+    if cls is None:
+        return getattr(view, '__name__', match.view_name)
+    actions = getattr(view, 'actions', None)
+    if actions:
+        action = actions.get(request.method.lower())
+        if action:
+            return f'{cls.__name__}.{action}'
+    return cls.__name__
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer that reports how long rendering took to the request stats"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        stats = current_stats()
+        if stats is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        started = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            stats.render_ms += (time.perf_counter() - started) * 1000
@@ -0,0 +1,327 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger('story_project.metrics')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, registry, name, documentation, labelnames):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[label]) for label in self.labelnames)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.changed()
+
+    def dump(self):
+        return [[list(key), value] for key, value in self.values.items()]
+
+    @staticmethod
+    def merge(into, dumped):
+        for key, value in dumped:
+            key = tuple(key)
+            into[key] = into.get(key, 0) + value
+
+    def samples(self, values):
+        for key, value in values.items():
+            yield self.name, key, value
+
+
+class Histogram(Counter):
+    """Fixed-bucket histogram; ``values`` maps label values to [per-bucket counts, sum]"""
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames, buckets):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[label]) for label in self.labelnames)
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        with self.registry.lock:
+            counts, total = self.values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[index] += 1
+            self.values[key] = [counts, total + value]
+        self.registry.changed()
+
+    def inc(self, amount=1, **labels):
+        raise TypeError('Histograms are updated with observe()')
+
+    def merge(self, into, dumped):
+        for key, (counts, total) in dumped:
+            key = tuple(key)
+            if len(counts) != len(self.buckets) + 1:
+                # Written by a process running with different buckets
+                continue
+            current_counts, current_total = into.get(key) or ([0] * len(counts), 0.0)
+            into[key] = [[a + b for a, b in zip(current_counts, counts)], current_total + total]
+
+    def samples(self, values):
+        label_count = len(self.labelnames)
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', key + (_format_value(bound),), cumulative
+            yield f'{self.name}_sum', key[:label_count], total
+            yield f'{self.name}_count', key[:label_count], cumulative
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Registry:
+    """
+    In-process metrics. A thread of each process writes its values to
+    ``<METRICS_DIR>/<pid>.json`` every METRICS_FLUSH_INTERVAL; the exposition
+    endpoint sums the files of every worker, so counters survive whichever
+    process answers the scrape.
+
+    The files of processes that are no longer running are taken over by a
+    live one (``prune``): it adds their values to its own and removes them,
+    so the totals keep counting up after a worker exits and a file is never
+    mistaken for the one of a new process that got the same pid.
+
+    Gauges are not stored: their callbacks are evaluated at scrape time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.metrics = {}
+        self.gauges = {}
+        self._dirty = False
+        # Process running the flush thread, and the one that wrote <pid>.json
+        self._pid = None
+        self._written_pid = None
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f'Metric {metric.name} is already registered')
+        self.metrics[metric.name] = metric
+        return metric
+
+    def register_gauge(self, name, documentation, callback):
+        """
+        Registers a gauge evaluated on every scrape. ``callback`` returns a
+        number, or a dict of {label value tuple: number} together with a
+        ``labelnames`` attribute on the callback.
+        """
+        self.gauges[name] = (documentation, callback)
+
+    def changed(self):
+        self._dirty = True
+        if self._pid != os.getpid():
+            self._start()
+
+    def _start(self):
+        # Also after a fork: the child needs its own thread
+        with self.lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name='metrics-flush', daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                self.prune()
+                self.flush()
+            except Exception:
+                logger.exception('Could not write metrics to %s', metrics_dir())
+            time.sleep(getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0))
+
+    def prune(self):
+        """Takes over the files of processes that are no longer running; returns how many"""
+        directory = metrics_dir()
+        names = os.listdir(directory) if os.path.isdir(directory) else []
+        taken = 0
+        for name in names:
+            pid, _, extension = name.partition('.')
+            if extension != 'json' or not pid.isdigit():
+                continue
+            if int(pid) == os.getpid():
+                # Until this process has written its own file, one named
+                # after it predates it: the pid was reused
+                if self._written_pid == os.getpid():
+                    continue
+            elif _pid_alive(int(pid)):
+                continue
+            path = os.path.join(directory, name)
+            # Renamed first, so no other process takes over the same file
+            claimed = f'{path}.{os.getpid()}'
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            try:
+                with open(claimed) as metrics_file:
+                    data = json.load(metrics_file)
+            except ValueError:
+                data = {}
+            finally:
+                os.remove(claimed)
+            with self.lock:
+                for metric_name, dumped in data.items():
+                    if metric_name in self.metrics:
+                        metric = self.metrics[metric_name]
+                        metric.merge(metric.values, dumped)
+                self._dirty = True
+            taken += 1
+        return taken
+
+    def flush(self):
+        """Writes this process's values to the shared directory"""
+        # A scrape flushes as well as the thread
+        with self._flush_lock:
+            if not self._dirty:
+                return
+            directory = metrics_dir()
+            os.makedirs(directory, exist_ok=True)
+            with self.lock:
+                data = json.dumps({name: metric.dump() for name, metric in self.metrics.items()})
+                self._dirty = False
+            path = os.path.join(directory, f'{os.getpid()}.json')
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w') as metrics_file:
+                metrics_file.write(data)
+            os.replace(tmp_path, path)
+            self._written_pid = os.getpid()
+
+    def collect(self):
+        """Values of every metric summed over all processes: {name: {label values: value}}"""
+        self.flush()
+        totals = {name: {} for name in self.metrics}
+        directory = metrics_dir()
+        names = os.listdir(directory) if os.path.isdir(directory) else []
+        for file_name in names:
+            if not file_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, file_name)) as metrics_file:
+                    data = json.load(metrics_file)
+            except (FileNotFoundError, ValueError):
+                continue
+            for name, dumped in data.items():
+                if name in self.metrics:
+                    self.metrics[name].merge(totals[name], dumped)
+        return totals
+
+    def exposition(self):
+        """All metrics in the Prometheus text format"""
+        lines = []
+        for name, values in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            labelnames = metric.labelnames
+            if metric.type == 'histogram':
+                labelnames += ('le',)
+            for sample_name, key, value in metric.samples(values):
+                lines.append(f'{sample_name}{_format_labels(labelnames[:len(key)], key)} {_format_value(value)}')
+
+        for name, (documentation, callback) in self.gauges.items():
+            try:
+                value = callback()
+            except Exception:
+                logger.exception('Gauge %s failed', name)
+                continue
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} gauge')
+            if isinstance(value, dict):
+                labelnames = getattr(callback, 'labelnames', ())
+                for key, sample in value.items():
+                    lines.append(f'{name}{_format_labels(labelnames, key)} {_format_value(sample)}')
+            else:
+                lines.append(f'{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def metrics_dir():
+    return str(getattr(settings, 'METRICS_DIR', os.path.join(settings.BASE_DIR, 'metrics')))
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value):
+    return '+Inf' if value == float('inf') else str(value)
+
+
+registry = Registry()
+
+requests_total = registry.counter(
+    'http_requests_total', 'HTTP requests handled, by view', ('view', 'method', 'status')
+)
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Wall time spent handling a request, by view', ('view',)
+)
+db_queries_total = registry.counter(
+    'db_queries_total', 'SQL statements executed while handling requests, by view', ('view',)
+)
+db_queries_per_request = registry.histogram(
+    'db_queries_per_request', 'SQL statements per request, by view', ('view',), buckets=QUERY_BUCKETS
+)
+cache_requests_total = registry.counter(
+    'cache_requests_total', 'Application cache lookups by cache and result (hit or miss)', ('cache', 'result')
+)
+
+
+def record_cache(cache, hit):
+    """Counts a lookup against one of the application caches"""
+    cache_requests_total.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def cache_hit_ratio():
+    lookups = {}
+    for (cache, result), count in registry.collect()['cache_requests_total'].items():
+        hits, total = lookups.get(cache, (0, 0))
+        lookups[cache] = (hits + (count if result == 'hit' else 0), total + count)
+    return {(cache,): hits / total for cache, (hits, total) in lookups.items() if total}
+
+
+cache_hit_ratio.labelnames = ('cache',)
+registry.register_gauge('cache_hit_ratio', 'Share of application cache lookups that hit, since start', cache_hit_ratio)
+
+# Write out whatever the last METRICS_FLUSH_INTERVAL collected when a worker exits
+atexit.register(registry.flush)
@@ -0,0 +1,322 @@
+import cProfile
+import hashlib
+import logging
+import threading
+import time
+import tracemalloc
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import metrics, profiling, routers
+from .instrumentation import RequestStats, view_label
+
+logger = logging.getLogger('story_project.requests')
+
+
+class RequestTimingMiddleware(MiddlewareMixin):
+    """
+    Measures what each request costs: resolved view, SQL statement count and
+    time, time spent in the view (serializer.data included), JSON rendering
+    time and wall time.
+
+    The numbers are attached to the request as ``request.request_stats``, sent
+    back in a ``Server-Timing`` header when SERVER_TIMING_ENABLED is set, and
+    requests over SLOW_REQUEST_MS or SLOW_REQUEST_QUERIES are logged together
+    with the SLOW_REQUEST_LOGGED_QUERIES statement fingerprints that took the
+    most time. The statements themselves, with their parameters, are only
+    logged when both DEBUG and SLOW_REQUEST_LOG_SQL are set: they can hold
+    personal data.
+
+    Under ASGI the hooks run in the request's thread-sensitive thread, which
+    is also where the async ORM runs its queries, so the connection wrappers
+    installed here see them.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.header_enabled = getattr(settings, 'SERVER_TIMING_ENABLED', False)
+        self.slow_ms = getattr(settings, 'SLOW_REQUEST_MS', 500)
+        self.slow_queries = getattr(settings, 'SLOW_REQUEST_QUERIES', 50)
+        self.logged_queries = getattr(settings, 'SLOW_REQUEST_LOGGED_QUERIES', 5)
+        self.log_sql = settings.DEBUG and getattr(settings, 'SLOW_REQUEST_LOG_SQL', False)
+
+    def process_request(self, request):
+        stats = RequestStats(keep_queries=self.logged_queries, keep_sql=self.log_sql)
+        request.request_stats = stats
+        request._timing_started = time.perf_counter()
+        stats.activate()
+        for connection in connections.all():
+            connection.execute_wrappers.append(stats)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after this hook, so the view ends here
+        self.view_returned(request)
+        return response
+
+    def process_response(self, request, response):
+        stats = getattr(request, 'request_stats', None)
+        if stats is None:
+            return response
+        for connection in connections.all():
+            if stats in connection.execute_wrappers:
+                connection.execute_wrappers.remove(stats)
+        # Views returning a plain HttpResponse skip process_template_response
+        self.view_returned(request)
+        stats.total_ms = (time.perf_counter() - request._timing_started) * 1000
+        stats.deactivate()
+        stats.view = view_label(request)
+
+        if self.header_enabled:
+            response['Server-Timing'] = self.server_timing(stats)
+        if stats.total_ms >= self.slow_ms or stats.query_count >= self.slow_queries:
+            self.log_slow_request(request, response, stats)
+        return response
+
+    @staticmethod
+    def view_returned(request):
+        started = getattr(request, '_view_started', None)
+        if started is not None:
+            request.request_stats.view_ms = (time.perf_counter() - started) * 1000
+            request._view_started = None
+
+    @staticmethod
+    def server_timing(stats):
+        metrics = [
+            f'db;dur={stats.query_ms:.1f};desc="{stats.query_count} queries"',
+            f'app;dur={stats.view_ms:.1f}',
+            f'render;dur={stats.render_ms:.1f}',
+            f'total;dur={stats.total_ms:.1f}',
+        ]
+        if stats.view:
+            metrics.insert(0, f'view;desc="{stats.view}"')
+        return ', '.join(metrics)
+
+    @staticmethod
+    def log_slow_request(request, response, stats):
+        lines = [
+            f'Slow request {request.method} {request.path} ({stats.view or "unresolved"}) -> {response.status_code}: '
+            f'{stats.total_ms:.1f} ms total, {stats.query_count} queries in {stats.query_ms:.1f} ms, '
+            f'{stats.view_ms:.1f} ms in the view, {stats.render_ms:.1f} ms rendering'
+        ]
+        for ms, count, alias, key, slowest in stats.top_fingerprints:
+            lines.append(f'  {ms:.1f} ms in {count} x [{alias}] {key}')
+            if slowest is not None:
+                sql, params = slowest
+                lines.append(f'    slowest: {sql} {params!r}')
+        logger.warning('\n'.join(lines))
+
+
+class ProfilingMiddleware:
+    """
+    Runs a single request under cProfile when an admin asks for it with an
+    ``X-Profile`` header or a ``_profile`` query parameter. A value of
+    ``memory`` also traces allocations with tracemalloc.
+
+    The raw stats file and a JSON summary are stored in PROFILE_CAPTURE_DIR,
+    which keeps at most PROFILE_CAPTURE_LIMIT captures. The capture id is
+    returned in the ``X-Profile-Capture`` header; admins can list and download
+    captures from /api/stories/admin/profiles/.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    # cProfile and tracemalloc are process wide, so only one request can be
+    # profiled at a time; concurrent requests are served unprofiled.
+    _lock = threading.Lock()
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.summary_lines = getattr(settings, 'PROFILE_SUMMARY_LINES', 30)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        mode = self.requested_mode(request)
+        if not mode or not self.is_admin(request):
+            return self.get_response(request)
+
+        if not self._lock.acquire(blocking=False):
+            response = self.get_response(request)
+            response['X-Profile-Capture'] = 'busy'
+            return response
+        try:
+            return self.profile(request, trace_memory=mode.lower() == 'memory')
+        finally:
+            self._lock.release()
+
+    async def __acall__(self, request):
+        # Under ASGI the profiler sees the event loop thread: async views and
+        # serialization, but not ORM calls, which run in a worker thread.
+        mode = self.requested_mode(request)
+        if not mode or not await sync_to_async(self.is_admin)(request):
+            return await self.get_response(request)
+
+        if not self._lock.acquire(blocking=False):
+            response = await self.get_response(request)
+            response['X-Profile-Capture'] = 'busy'
+            return response
+        try:
+            trace_memory = mode.lower() == 'memory'
+            profiler, started = self.start(trace_memory)
+            try:
+                response = await self.get_response(request)
+            finally:
+                measurements = self.stop(profiler, started, trace_memory)
+            return await sync_to_async(self.store)(request, response, profiler, *measurements)
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def requested_mode(request):
+        return request.headers.get('X-Profile') or request.GET.get('_profile')
+
+    @staticmethod
+    def is_admin(request):
+        # Runs before DRF has authenticated the request, so resolve the token
+        # here; session users are already on the request.
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            try:
+                result = TokenAuthentication().authenticate(request)
+            except AuthenticationFailed:
+                return False
+            if result is None:
+                return False
+            user = result[0]
+        return hasattr(user, 'profile') and user.profile.role == 'admin'
+
+    def profile(self, request, trace_memory):
+        profiler, started = self.start(trace_memory)
+        try:
+            response = self.get_response(request)
+        finally:
+            measurements = self.stop(profiler, started, trace_memory)
+        return self.store(request, response, profiler, *measurements)
+
+    @staticmethod
+    def start(trace_memory):
+        if trace_memory:
+            tracemalloc.start()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        return profiler, started
+
+    @staticmethod
+    def stop(profiler, started, trace_memory):
+        """Stops profiling; returns (total ms, tracemalloc snapshot, peak bytes)"""
+        profiler.disable()
+        total_ms = (time.perf_counter() - started) * 1000
+        if not trace_memory:
+            return total_ms, None, None
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return total_ms, snapshot, peak
+
+    def store(self, request, response, profiler, total_ms, snapshot, peak):
+        stats = getattr(request, 'request_stats', None)
+        summary = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': view_label(request),
+            'status': response.status_code,
+            'total_ms': round(total_ms, 3),
+            'queries': stats.query_count if stats else None,
+            'query_ms': round(stats.query_ms, 3) if stats else None,
+            'profile': profiling.summarize_profile(profiler, self.summary_lines),
+        }
+        if snapshot is not None:
+            summary['memory'] = profiling.summarize_allocations(snapshot, peak, self.summary_lines)
+
+        try:
+            response['X-Profile-Capture'] = profiling.save_capture(profiler, summary)
+        except OSError:
+            logger.exception('Could not store profile capture for %s %s', request.method, request.path)
+        return response
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """
+    Feeds the metrics registry: request counts, latency and SQL statement
+    histograms per view. Must sit above RequestTimingMiddleware, whose stats
+    it reads once the response is complete.
+    """
+
+    def process_request(self, request):
+        request._metrics_started = time.perf_counter()
+
+    def process_response(self, request, response):
+        started = getattr(request, '_metrics_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+
+        stats = getattr(request, 'request_stats', None)
+        view = (stats.view if stats else view_label(request)) or 'unresolved'
+        metrics.requests_total.inc(view=view, method=request.method, status=response.status_code)
+        metrics.request_duration.observe(elapsed, view=view)
+        if stats is not None:
+            metrics.db_queries_total.inc(stats.query_count, view=view)
+            metrics.db_queries_per_request.observe(stats.query_count, view=view)
+        return response
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """
+    Lets GET and HEAD requests read from the replicas in READ_REPLICAS.
+
+    After a client writes (any other method, or a GET that wrote) it is
+    pinned to the primary for REPLICA_PIN_SECONDS, so it reads its own
+    writes even from a replica that lags behind. Pins are recorded under
+    both the client's credentials (Authorization header or session cookie)
+    and its IP address, so a login followed by requests with the new token
+    is still pinned. The pins are kept in the default cache, which has to be
+    shared between worker processes for them to hold across workers.
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD')
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+    def process_request(self, request):
+        request._replica_pin_keys = self.pin_keys(request)
+        use_replicas = request.method in self.SAFE_METHODS and not cache.get_many(request._replica_pin_keys)
+        request._replica_state = routers.activate_replicas(use_replicas)
+
+    def process_response(self, request, response):
+        state = getattr(request, '_replica_state', None)
+        if state is None:
+            return response
+        routers.deactivate_replicas()
+        if state.wrote or request.method not in self.SAFE_METHODS:
+            cache.set_many(dict.fromkeys(request._replica_pin_keys, True), self.pin_seconds)
+        return response
+
+    @staticmethod
+    def pin_keys(request):
+        identities = [
+            request.META.get('HTTP_AUTHORIZATION'),
+            request.COOKIES.get(settings.SESSION_COOKIE_NAME),
+            request.META.get('REMOTE_ADDR'),
+        ]
+        return [
+            'replica-pin:' + hashlib.sha256(identity.encode()).hexdigest()
+            for identity in identities if identity
+        ]
@@ -0,0 +1,128 @@
+import io
+import json
+import os
+import pstats
+import re
+import time
+import uuid
+
+from django.conf import settings
+
+CAPTURE_ID_RE = re.compile(r'^\d{8}T\d{12}-[0-9a-f]{8}$')
+
+
+def capture_dir():
+    return str(getattr(settings, 'PROFILE_CAPTURE_DIR', os.path.join(settings.BASE_DIR, 'profiles')))
+
+
+def capture_path(capture_id, suffix):
+    """Path of a capture's ``.prof`` or ``.json`` file, or None for a malformed id"""
+    if not CAPTURE_ID_RE.match(capture_id or ''):
+        return None
+    return os.path.join(capture_dir(), f'{capture_id}{suffix}')
+
+
+def new_capture_id():
+    # Sortable by creation time (to the microsecond), so the ring buffer can
+    # drop the oldest captures by name
+    now = time.time()
+    stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))
+    return f'{stamp}{int(now % 1 * 1_000_000):06d}-{uuid.uuid4().hex[:8]}'
+
+
+def summarize_profile(profile, limit):
+    """Top ``limit`` functions of a cProfile.Profile by cumulative time"""
+    stats = pstats.Stats(profile, stream=io.StringIO())
+    rows = []
+    for (filename, line, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'function': f'{filename}:{line}({name})',
+            'calls': ncalls,
+            'total_ms': round(tottime * 1000, 3),
+            'cumulative_ms': round(cumtime * 1000, 3),
+        })
+    rows.sort(key=lambda row: row['cumulative_ms'], reverse=True)
+    return {
+        'total_calls': stats.total_calls,
+        'total_ms': round(stats.total_tt * 1000, 3),
+        'functions': rows[:limit],
+    }
+
+
+def summarize_allocations(snapshot, peak, limit):
+    """Top ``limit`` allocation sites of a tracemalloc snapshot"""
+    return {
+        'peak_kb': round(peak / 1024, 1),
+        'sites': [
+            {
+                'location': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+                'size_kb': round(stat.size / 1024, 1),
+                'count': stat.count,
+            }
+            for stat in snapshot.statistics('lineno')[:limit]
+        ],
+    }
+
+
+def save_capture(profile, summary):
+    """
+    Writes the raw profile and its JSON summary, then trims the capture
+    directory to PROFILE_CAPTURE_LIMIT captures, oldest first.
+    """
+    directory = capture_dir()
+    os.makedirs(directory, exist_ok=True)
+    capture_id = new_capture_id()
+    summary['id'] = capture_id
+
+    profile.dump_stats(os.path.join(directory, f'{capture_id}.prof'))
+    # The summary is written last and atomically; list_captures() only
+    # reports captures whose summary exists.
+    tmp_path = os.path.join(directory, f'.{capture_id}.json.tmp')
+    with open(tmp_path, 'w') as summary_file:
+        json.dump(summary, summary_file, indent=2)
+    os.replace(tmp_path, os.path.join(directory, f'{capture_id}.json'))
+
+    _trim(directory, getattr(settings, 'PROFILE_CAPTURE_LIMIT', 50))
+    return capture_id
+
+
+def _trim(directory, limit):
+    capture_ids = sorted(
+        name[:-len('.json')] for name in os.listdir(directory)
+        if name.endswith('.json') and CAPTURE_ID_RE.match(name[:-len('.json')])
+    )
+    for capture_id in capture_ids[:max(0, len(capture_ids) - limit)]:
+        for suffix in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(directory, f'{capture_id}{suffix}'))
+            except FileNotFoundError:
+                pass
+
+
+def load_summary(capture_id):
+    path = capture_path(capture_id, '.json')
+    if path is None:
+        return None
+    try:
+        with open(path) as summary_file:
+            return json.load(summary_file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def list_captures():
+    """Summaries of the stored captures without their function tables, newest first"""
+    directory = capture_dir()
+    if not os.path.isdir(directory):
+        return []
+    captures = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        summary = load_summary(name[:-len('.json')])
+        if summary is None:
+            continue
+        summary.pop('profile', None)
+        summary.pop('memory', None)
+        captures.append(summary)
+    return captures
@@ -0,0 +1,126 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Likes, follows and favorites are written far more often than story content;
+# keeping them in their own SQLite file gives them their own writer lock.
+ENGAGEMENT_MODELS = {
+    'storyapp.storylike',
+    'storyapp.storyfollow',
+    'storyapp.episodelike',
+    'accounts.profilefollow',
+    'accounts.favoritestory',
+}
+
+
+def engagement_db():
+    """Alias holding the engagement tables; falls back to the default database when not configured"""
+    alias = getattr(settings, 'ENGAGEMENT_DATABASE', 'engagement')
+    return alias if alias in settings.DATABASES else 'default'
+
+
+def is_engagement_model(model):
+    return model._meta.label_lower in ENGAGEMENT_MODELS
+
+
+class EngagementRouter:
+    """
+    Sends the engagement models to ENGAGEMENT_DATABASE and everything else
+    to the default database. Engagement rows reference content by id only
+    (db_constraint=False), so reads across the two must not use joins; see
+    storyapp.engagement for the bulk lookups.
+    """
+
+    def db_for_read(self, model, **hints):
+        if is_engagement_model(model):
+            return engagement_db()
+        return None
+
+    def db_for_write(self, model, **hints):
+        if is_engagement_model(model):
+            return engagement_db()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if is_engagement_model(type(obj1)) or is_engagement_model(type(obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        alias = getattr(settings, 'ENGAGEMENT_DATABASE', 'engagement')
+        if model_name is not None and f'{app_label}.{model_name}' in ENGAGEMENT_MODELS:
+            # On the default database these tables were created by the original
+            # auto-created many-to-many fields and are left as they are.
+            return db == alias
+        return db != alias
+
+
+class ReplicaState:
+    """How the current request may use the read replicas"""
+
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+
+
+_replica_state = ContextVar('replica_state', default=None)
+
+
+def replica_aliases():
+    return [alias for alias in getattr(settings, 'READ_REPLICAS', []) if alias in settings.DATABASES]
+
+
+def activate_replicas(use_replicas):
+    """Called by ReplicaRoutingMiddleware at the start of a request"""
+    state = ReplicaState(use_replicas)
+    _replica_state.set(state)
+    return state
+
+
+def deactivate_replicas():
+    _replica_state.set(None)
+
+
+def primary_db(model):
+    """
+    Alias that model is written to, for reads that must see the latest
+    writes. Unlike router.db_for_write it does not count as a write, so the
+    request keeps reading from the replicas.
+    """
+    return engagement_db() if is_engagement_model(model) else 'default'
+
+
+class ReplicaRouter:
+    """
+    Sends reads to one of READ_REPLICAS while ReplicaRoutingMiddleware marks
+    the request as safe (a GET or HEAD from a client not pinned to the
+    primary). Every write goes to the default database; once a request has
+    written, its remaining reads go there too. Outside a request, e.g. in
+    management commands, everything uses the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _replica_state.get()
+        if state is None or not state.use_replicas or state.wrote:
+            return 'default'
+        aliases = replica_aliases()
+        return random.choice(aliases) if aliases else 'default'
+
+    def db_for_write(self, model, **hints):
+        state = _replica_state.get()
+        if state is not None:
+            state.wrote = True
+        # Explicit, so objects loaded from a replica are saved to the primary
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        primary = {'default', *replica_aliases()}
+        if obj1._state.db in primary and obj2._state.db in primary:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in getattr(settings, 'READ_REPLICAS', []):
+            return False
+        return None
@@ -49,9 +49,16 @@ INSTALLED_APPS = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
-    ]
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'story_project.instrumentation.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 MIDDLEWARE = [
+    'story_project.middleware.MetricsMiddleware',
+    'story_project.middleware.RequestTimingMiddleware',
+    'story_project.middleware.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     "django.middleware.security.SecurityMiddleware",
@@ -61,10 +68,46 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    'story_project.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = "story_project.urls"
 
+# Per-request instrumentation (story_project.middleware.RequestTimingMiddleware).
+# Server-Timing headers expose query counts to clients, so keep them off in production.
+SERVER_TIMING_ENABLED = DEBUG
+SLOW_REQUEST_MS = 500
+SLOW_REQUEST_QUERIES = 50
+SLOW_REQUEST_LOGGED_QUERIES = 5
+# Slow request logs show statement fingerprints without values; this adds the
+# slowest statement of each with its parameters. Only honoured with DEBUG, as
+# the parameters can hold personal data.
+SLOW_REQUEST_LOG_SQL = False
+
+# On-demand profiling for admins (story_project.middleware.ProfilingMiddleware)
+PROFILE_CAPTURE_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILE_CAPTURE_LIMIT = 50
+PROFILE_SUMMARY_LINES = 30
+
+# Metrics registry (story_project.metrics). Every worker process writes its
+# values to METRICS_DIR from a background thread; the files of exited workers
+# are folded into a live one. /metrics answers staff users and scrapers sending
+# "Authorization: Bearer <METRICS_TOKEN>"; without a token only staff can read it.
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+METRICS_FLUSH_INTERVAL = 1.0
+METRICS_TOKEN = None
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "story_project": {"handlers": ["console"], "level": "INFO"},
+    },
+}
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -88,10 +131,122 @@ WSGI_APPLICATION = "story_project.wsgi.application"
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
+        # django.db.backends.sqlite3 plus WAL, tuned pragmas and lock retries;
+        # see story_project/sqlite_backend/base.py for the extra OPTIONS.
+        "ENGINE": "story_project.sqlite_backend",
+        "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 10,
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -65536,
+            "mmap_size": 268435456,
+            "temp_store": "MEMORY",
+            "lock_retries": 3,
+            "lock_retry_backoff": 0.05,
+        },
+    },
+    # Read-only connection to the primary file for GET/HEAD traffic
+    # (story_project.routers.ReplicaRouter). Point NAME at a copy kept fresh
+    # with `manage.py sync_sqlite_replica` to move reads off the primary file.
+    "replica": {
+        "ENGINE": "story_project.sqlite_backend",
         "NAME": BASE_DIR / "db.sqlite3",
-    }
+        "OPTIONS": {
+            "read_only": True,
+            "timeout": 10,
+            "cache_size": -65536,
+            "mmap_size": 268435456,
+            "temp_store": "MEMORY",
+        },
+        "TEST": {"MIRROR": "default"},
+    },
+    # Likes, follows and favorites (story_project.routers.EngagementRouter).
+    # Migrate it with `manage.py migrate --database engagement`.
+    "engagement": {
+        "ENGINE": "story_project.sqlite_backend",
+        "NAME": BASE_DIR / "engagement.sqlite3",
+        "OPTIONS": {
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 10,
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -16384,
+            "mmap_size": 67108864,
+            "temp_store": "MEMORY",
+            "lock_retries": 3,
+            "lock_retry_backoff": 0.05,
+        },
+    },
 }
+ENGAGEMENT_DATABASE = "engagement"
+READ_REPLICAS = ["replica"]
+# Seconds a client reads from the primary after writing
+REPLICA_PIN_SECONDS = 5
+DATABASE_ROUTERS = [
+    "story_project.routers.EngagementRouter",
+    "story_project.routers.ReplicaRouter",
+]
+# Store branched episodes as diffs against their parent (storyapp.deltas)
+EPISODE_DELTA_STORAGE = False
+# Longest chain of diffs before a full copy is stored again
+EPISODE_DELTA_SNAPSHOT_INTERVAL = 8
+# Rebuilt episode bodies kept in memory per process
+EPISODE_BODY_CACHE_SIZE = 512
+# How long computed episode diffs stay in the cache
+EPISODE_DIFF_CACHE_SECONDS = 3600
+# Episode event streams (storyapp.events): how often a stream checks the
+# database for events from other processes, how often it sends a keepalive
+# when idle, and how long one connection lasts before the client reconnects
+EPISODE_EVENT_POLL_SECONDS = 2
+EPISODE_EVENT_HEARTBEAT_SECONDS = 15
+EPISODE_EVENT_STREAM_SECONDS = 300
+# Events older than this are removed by prune_episode_events
+EPISODE_EVENT_RETENTION_DAYS = 7
+# Notification fan-out (storyapp.notifications): recipients written per
+# bulk insert, and how long a worker's claim on an outbox entry holds before
+# another worker may take it over. Entries are delivered by a separate
+# `manage.py deliver_notifications --interval 1` worker, which has to run for
+# notifications to arrive. NOTIFICATION_FANOUT_IN_PROCESS instead starts a
+# delivery thread in every web process; only meant for a single-process setup
+# such as runserver.
+NOTIFICATION_FANOUT_CHUNK_SIZE = 500
+NOTIFICATION_CLAIM_SECONDS = 300
+NOTIFICATION_FANOUT_IN_PROCESS = False
+# Write-behind for likes, follows and favorites (storyapp.writebehind): changes
+# are journaled to ENGAGEMENT_JOURNAL_DIR and written in batches every
+# ENGAGEMENT_FLUSH_SECONDS, or once ENGAGEMENT_FLUSH_MAX_PENDING are waiting
+ENGAGEMENT_WRITE_BEHIND = False
+ENGAGEMENT_JOURNAL_DIR = os.path.join(BASE_DIR, 'engagement-journal')
+ENGAGEMENT_FLUSH_SECONDS = 1.0
+ENGAGEMENT_FLUSH_MAX_PENDING = 1000
+# Trending stories (storyapp.trending): each like, follow, new episode and
+# read adds its weight to the story's score, which then halves every
+# TRENDING_HALF_LIFE_HOURS. Events are summed in memory and written after a
+# response, at most every TRENDING_FLUSH_SECONDS. Run renormalize_trending daily.
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_WEIGHTS = {'like': 1.0, 'follow': 3.0, 'episode': 5.0, 'read': 0.1}
+TRENDING_FLUSH_SECONDS = 10
+# Background deletion (storyapp.deletion): stories, users and organizations
+# are tombstoned at once and their rows deleted DELETION_CHUNK_SIZE at a
+# time by a separate `manage.py run_deletion_jobs --interval 5` worker, which
+# has to run for the rows to go. DELETION_IN_PROCESS instead starts a deletion
+# thread in every web process; only meant for a single-process setup such as
+# runserver. A claim older than DELETION_CLAIM_SECONDS is taken over.
+DELETION_CHUNK_SIZE = 500
+DELETION_IN_PROCESS = False
+DELETION_CLAIM_SECONDS = 600
+# Categories are kept in memory per process (storyapp.categories); saving one
+# reloads them in that process, others reload after this many seconds
+CATEGORY_REGISTRY_SECONDS = 300
+# Related stories (storyapp.recommendations), rebuilt offline by
+# build_related_stories from co-engagement: likes, follows and favorites count
+# with these weights, and the RELATED_STORIES_TOP_N most similar stories are
+# kept per story. The build needs numpy and scipy.
+RELATED_STORIES_WEIGHTS = {'like': 1.0, 'follow': 2.0, 'favorite': 2.0}
+RELATED_STORIES_TOP_N = 20
+RELATED_STORIES_CHUNK_SIZE = 1000
 # Replace it with your DATABASES.
 '''DATABASES = {
     'default': dj_database_url.config(
@@ -0,0 +1,127 @@
+"""
+SQLite backend tuned for a web workload with concurrent writers.
+
+On top of django.db.backends.sqlite3 it accepts these extra OPTIONS:
+
+    journal_mode        WAL lets readers run alongside the single writer (default 'WAL')
+    synchronous         'NORMAL' is durable across application crashes in WAL mode (default 'NORMAL')
+    cache_size          page cache; negative values are KiB (default -65536, i.e. 64 MiB)
+    mmap_size           bytes of the database file to memory-map (default 256 MiB)
+    temp_store          where temporary tables and indexes live (default 'MEMORY')
+    lock_retries        times a statement that failed with "database is locked" is retried (default 3)
+    lock_retry_backoff  seconds before the first retry, doubled on each attempt (default 0.05)
+    read_only           open the file with mode=ro, for read replica aliases (default False)
+
+The busy timeout is the standard ``timeout`` option (seconds). Use it with
+``transaction_mode: 'IMMEDIATE'``: deferred transactions that upgrade from
+read to write fail straight away when another writer holds the lock instead
+of waiting for it.
+"""
+import random
+import time
+from urllib.parse import quote
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base as sqlite3_base
+
+Database = sqlite3_base.Database
+
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+PRAGMA_DEFAULTS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -65536,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+PRAGMA_CHOICES = {
+    'journal_mode': {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'},
+    'synchronous': {'OFF', 'NORMAL', 'FULL', 'EXTRA'},
+    'temp_store': {'DEFAULT', 'FILE', 'MEMORY'},
+}
+
+
+def is_lock_error(exc):
+    code = getattr(exc, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in (SQLITE_BUSY, SQLITE_LOCKED)
+    return 'locked' in str(exc) or 'busy' in str(exc)
+
+
+class RetryingCursorWrapper(sqlite3_base.SQLiteCursorWrapper):
+    """
+    Retries statements that failed on lock contention, but only when no
+    transaction is open afterwards: an autocommit statement or the BEGIN of
+    an atomic block failed as a whole and can run again, whereas a statement
+    inside a transaction can only be retried by replaying the transaction.
+    """
+    lock_retries = 0
+    lock_retry_backoff = 0.0
+
+    def execute(self, query, params=None):
+        return self._retry(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        param_list = list(param_list)
+        return self._retry(super().executemany, query, param_list)
+
+    def _retry(self, method, *args):
+        attempt = 0
+        while True:
+            try:
+                return method(*args)
+            except Database.OperationalError as exc:
+                if attempt >= self.lock_retries or not is_lock_error(exc) or self.connection.in_transaction:
+                    raise
+            delay = self.lock_retry_backoff * (2 ** attempt)
+            time.sleep(random.uniform(delay / 2, delay))
+            attempt += 1
+
+
+class DatabaseWrapper(sqlite3_base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        pragmas = {name: kwargs.pop(name, default) for name, default in PRAGMA_DEFAULTS.items()}
+        for name, choices in PRAGMA_CHOICES.items():
+            if pragmas[name] is not None and str(pragmas[name]).upper() not in choices:
+                raise ImproperlyConfigured(
+                    f"settings.DATABASES[{self.alias!r}]['OPTIONS'][{name!r}] is improperly configured "
+                    f"to {pragmas[name]!r}. Use one of {', '.join(sorted(choices))}, or None."
+                )
+        for name in ('cache_size', 'mmap_size'):
+            if pragmas[name] is not None and not isinstance(pragmas[name], int):
+                raise ImproperlyConfigured(
+                    f"settings.DATABASES[{self.alias!r}]['OPTIONS'][{name!r}] must be an integer."
+                )
+        self.pragmas = {name: value for name, value in pragmas.items() if value is not None}
+        self.lock_retries = kwargs.pop('lock_retries', 3)
+        self.lock_retry_backoff = kwargs.pop('lock_retry_backoff', 0.05)
+        self.read_only = kwargs.pop('read_only', False)
+        if self.read_only and not self.is_in_memory_db():
+            # Changing the journal mode is a write; the primary sets it.
+            self.pragmas.pop('journal_mode', None)
+            kwargs['database'] = self._read_only_uri(kwargs['database'])
+        return kwargs
+
+    @staticmethod
+    def _read_only_uri(name):
+        name = str(name)
+        if name.startswith('file:'):
+            return f"{name}{'&' if '?' in name else '?'}mode=ro"
+        return f'file:{quote(name)}?mode=ro'
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            # Values are validated above; PRAGMA does not accept parameters.
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=RetryingCursorWrapper)
+        cursor.lock_retries = self.lock_retries
+        cursor.lock_retry_backoff = self.lock_retry_backoff
+        return cursor
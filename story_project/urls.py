@@ -4,10 +4,13 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.views.static import serve
 
+from .views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/stories/', include('storyapp.urls')),
     path('api/accounts/', include('accounts.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
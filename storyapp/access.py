@@ -0,0 +1,113 @@
+"""
+Who may see which stories regardless of visibility.
+
+A StoryAccess row grants one user one story, for one reason: they created
+it, they accepted an invite to it, or they are the subadmin its creator is
+assigned to. The rows are kept in step by storyapp.signals whenever a
+story, an invite, a user or a profile is saved, so listing the stories a
+user can see is a union of the visibility filter with one indexed lookup of
+their grants, the same query for every role.
+
+rebuild_story_access recomputes the table from scratch; with --check it
+only reports rows that are missing or should not be there.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from .engagement import CHUNK_SIZE
+from .models import Story, StoryAccess, StoryInvite
+
+
+def _expected(story_ids=None, user_ids=None):
+    """
+    {(user_id, story_id, reason)} the grants should hold, limited to the
+    given stories and/or grantees
+    """
+    stories = Story.objects.all()
+    invites = StoryInvite.objects.filter(accepted=True)
+    if story_ids is not None:
+        stories = stories.filter(pk__in=story_ids)
+        invites = invites.filter(story_id__in=story_ids)
+
+    creators = stories
+    managed = stories.filter(creator__profile__assigned_to__profile__role='subadmin')
+    if user_ids is not None:
+        creators = creators.filter(creator_id__in=user_ids)
+        managed = managed.filter(creator__profile__assigned_to__in=user_ids)
+        emails = User.objects.filter(pk__in=user_ids).exclude(email='').values_list('email', flat=True)
+        invites = invites.filter(
+            Q(invited_user__in=user_ids) |
+            Q(invited_user__isnull=True, normalized_email__in=[StoryInvite.normalize_email(email) for email in emails])
+        )
+
+    grants = {
+        (user_id, story_id, StoryAccess.CREATOR)
+        for story_id, user_id in creators.values_list('id', 'creator_id')
+    }
+    grants.update(
+        (user_id, story_id, StoryAccess.MANAGER)
+        for story_id, user_id in managed.values_list('id', 'creator__profile__assigned_to')
+    )
+
+    # An accepted invite grants the user who accepted it; older invites
+    # without one go to the account with the invited address
+    by_email = {}
+    for story_id, user_id, email in invites.values_list('story_id', 'invited_user_id', 'normalized_email'):
+        if user_id is not None:
+            grants.add((user_id, story_id, StoryAccess.INVITE))
+        else:
+            by_email.setdefault(email, []).append(story_id)
+    emails = list(by_email)
+    for start in range(0, len(emails), CHUNK_SIZE):
+        accounts = User.objects.annotate(email_lower=Lower('email')).filter(
+            email_lower__in=emails[start:start + CHUNK_SIZE]
+        )
+        if user_ids is not None:
+            accounts = accounts.filter(pk__in=user_ids)
+        for user_id, email in accounts.values_list('id', 'email_lower'):
+            grants.update((user_id, story_id, StoryAccess.INVITE) for story_id in by_email[email])
+    return grants
+
+
+def _sync(existing, expected, dry_run=False):
+    """Brings ``existing`` (a StoryAccess queryset) to ``expected``; returns (added, removed)"""
+    with transaction.atomic():
+        rows = {
+            (user_id, story_id, reason): pk
+            for pk, user_id, story_id, reason in existing.values_list('id', 'user_id', 'story_id', 'reason')
+        }
+        missing = expected - rows.keys()
+        extra = [pk for grant, pk in rows.items() if grant not in expected]
+        if not dry_run:
+            for start in range(0, len(extra), CHUNK_SIZE):
+                StoryAccess.objects.filter(pk__in=extra[start:start + CHUNK_SIZE]).delete()
+            StoryAccess.objects.bulk_create(
+                [StoryAccess(user_id=user_id, story_id=story_id, reason=reason) for user_id, story_id, reason in missing],
+                ignore_conflicts=True,
+                batch_size=500,
+            )
+    return len(missing), len(extra)
+
+
+def sync_stories(story_ids):
+    story_ids = list(story_ids)
+    return _sync(StoryAccess.objects.filter(story_id__in=story_ids), _expected(story_ids=story_ids))
+
+
+def sync_user(user_id):
+    """The grants of one user, and those of the stories they created, whose manager may have changed"""
+    _sync(StoryAccess.objects.filter(user_id=user_id), _expected(user_ids=[user_id]))
+    created = Story.objects.filter(creator_id=user_id).values('id')
+    _sync(StoryAccess.objects.filter(story__in=created), _expected(story_ids=created))
+
+
+def rebuild(dry_run=False):
+    """Recomputes every grant; returns (added, removed), or what would be with ``dry_run``"""
+    return _sync(StoryAccess.objects.all(), _expected(), dry_run)
+
+
+def visible_to(user_id):
+    """Ids of the stories ``user_id`` is granted, as a subquery"""
+    return StoryAccess.objects.filter(user_id=user_id).values('story_id')
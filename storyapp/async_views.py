@@ -0,0 +1,157 @@
+"""
+Async variants of the public read endpoints, for deployments served through
+story_project.asgi.
+
+DRF 3.14 views are sync only, so these are plain Django async views. They
+run the same querysets as the DRF views with the async ORM and render them
+with the same serializers, whose list serializers load a page in a handful
+of bulk queries; that sync part runs in one sync_to_async call per
+response. storyapp.tests checks they match the DRF views. Only JSON is
+rendered.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+
+from story_project.instrumentation import TimedJSONRenderer
+from . import categories, events, trending
+from .engagement import EngagementLookup
+from .models import Episode, Story
+from .serializers import (
+    CategorySerializer, EpisodeSummarySerializer, StorySerializer, STORY_RELATIONS, SUMMARY_RELATIONS,
+)
+from .views import PublicStoryDetailView, PublicStoryListView
+
+
+async def episode_payloads(episodes, lookup):
+    """
+    Episodes as EpisodeSummarySerializer renders them, by the serializer
+    itself: its bulk lookups run in one sync_to_async call. ``episodes``
+    must have SUMMARY_RELATIONS loaded.
+    """
+    def render():
+        return EpisodeSummarySerializer(episodes, many=True, context={'engagement': lookup}).data
+    return await sync_to_async(render)()
+
+
+async def story_payloads(stories, request, lookup):
+    """
+    Stories as StorySerializer renders them, by the serializer itself: its
+    StoryPage loads the versions and episodes of all of them in one
+    sync_to_async call
+    """
+    def render():
+        context = {'request': Request(request), 'engagement': lookup}
+        return StorySerializer(stories, many=True, context=context).data
+    return await sync_to_async(render)()
+
+
+class AsyncReadView(View):
+    """
+    Base for the async endpoints: authenticates DRF tokens the way
+    TokenAuthentication does and renders JSON with the project renderer.
+    """
+
+    http_method_names = ['get', 'head', 'options']
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            result = await sync_to_async(TokenAuthentication().authenticate)(request)
+        except AuthenticationFailed as exc:
+            return self.render({'detail': exc.detail}, status=exc.status_code, headers={'WWW-Authenticate': 'Token'})
+        request.user = result[0] if result else AnonymousUser()
+        return await super().dispatch(request, *args, **kwargs)
+
+    @staticmethod
+    def render(data, status=200, headers=None):
+        return HttpResponse(
+            TimedJSONRenderer().render(data),
+            status=status,
+            content_type='application/json',
+            headers=headers,
+        )
+
+    def not_found(self):
+        return self.render({'detail': 'Not found.'}, status=404)
+
+
+class AsyncPublicStoryListView(AsyncReadView):
+    """Async PublicStoryListView"""
+
+    async def get(self, request):
+        queryset = PublicStoryListView(request=request).get_queryset()
+        stories = [story async for story in queryset.select_related(*STORY_RELATIONS)]
+        return self.render(await story_payloads(stories, request, EngagementLookup(request.user)))
+
+
+class AsyncPublicStoryDetailView(AsyncReadView):
+    """Async PublicStoryDetailView"""
+
+    async def get(self, request, pk):
+        queryset = PublicStoryDetailView(request=request).get_queryset()
+        try:
+            story = await queryset.select_related(*STORY_RELATIONS).aget(pk=pk)
+        except Story.DoesNotExist:
+            return self.not_found()
+        payloads = await story_payloads([story], request, EngagementLookup(request.user))
+        await sync_to_async(trending.record_read)(story.id)
+        return self.render(payloads[0])
+
+
+class AsyncEpisodesByStoryView(AsyncReadView):
+    """Async EpisodeViewSet.by_story"""
+
+    async def get(self, request, story_id):
+        queryset = Episode.objects.filter(version__story_id=story_id).defer('content')
+        episodes = [episode async for episode in queryset.select_related(*SUMMARY_RELATIONS)]
+        return self.render(await episode_payloads(episodes, EngagementLookup(request.user)))
+
+
+class AsyncCategoryListView(AsyncReadView):
+    """Async CategoryViewSet.list"""
+
+    async def get(self, request):
+        return self.render(CategorySerializer(await sync_to_async(categories.registry.all)(), many=True).data)
+
+
+class AsyncCategoryDetailView(AsyncReadView):
+    """Async CategoryViewSet.retrieve"""
+
+    async def get(self, request, pk):
+        category = await sync_to_async(categories.registry.get)(pk)
+        if category is None:
+            return self.not_found()
+        return self.render(CategorySerializer(category).data)
+
+
+class AsyncEpisodeEventStreamView(AsyncReadView):
+    """
+    Server-sent events for new episodes, new branches and status changes on
+    the stories the user follows and the public stories of the authors they
+    follow; see storyapp.events. Only useful under ASGI: a WSGI worker would
+    be held for the whole stream.
+    """
+
+    http_method_names = ['get', 'options']
+
+    async def get(self, request):
+        if not request.user.is_authenticated:
+            return self.render(
+                {'detail': 'Authentication credentials were not provided.'},
+                status=401,
+                headers={'WWW-Authenticate': 'Token'},
+            )
+        last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            return self.render({'error': 'Last-Event-ID must be an event id'}, status=400)
+        return StreamingHttpResponse(
+            events.stream(request.user, last_event_id),
+            content_type='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
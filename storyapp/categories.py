@@ -0,0 +1,94 @@
+"""
+Categories, held in memory.
+
+There are few categories and they rarely change, yet most story lists
+filter by one and every story write names one. ``registry`` keeps all of
+them per process, by id and by key: the name with whitespace collapsed and
+case folded (Category.normalize), which has a unique index. A category
+filter becomes a category_id equality and a story write names a category
+without a query.
+
+Saving or deleting a category clears the registry of this process once the
+transaction commits (storyapp.signals); other processes reload it after
+CATEGORY_REGISTRY_SECONDS. A name or id the registry does not know is looked
+up in the database before it counts as unknown, so a category created by
+another process is found at once.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from story_project import routers
+
+from .models import Category
+
+
+def _primary():
+    # Not a replica: a category created a moment ago has to be found
+    return Category.objects.using(routers.primary_db(Category))
+
+
+class CategoryRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (loaded at, categories by name, by id, by key)
+        self._snapshot = None
+
+    def _current(self):
+        snapshot = self._snapshot
+        max_age = getattr(settings, 'CATEGORY_REGISTRY_SECONDS', 300)
+        if snapshot is not None and time.monotonic() - snapshot[0] < max_age:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or time.monotonic() - snapshot[0] >= max_age:
+                categories = list(_primary().order_by('name'))
+                snapshot = (
+                    time.monotonic(),
+                    categories,
+                    {category.pk: category for category in categories},
+                    {category.key: category for category in categories},
+                )
+                self._snapshot = snapshot
+        return snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def _missed(self, **lookup):
+        category = _primary().filter(**lookup).first()
+        if category is not None:
+            self.invalidate()
+        return category
+
+    def all(self):
+        """Every category, by name. The instances are shared: do not modify them."""
+        return list(self._current()[1])
+
+    def get(self, pk):
+        return self._current()[2].get(pk) or self._missed(pk=pk)
+
+    def by_name(self, name):
+        key = Category.normalize(name)
+        return self._current()[3].get(key) or self._missed(key=key)
+
+    def resolve(self, value):
+        """The category named by an id or a name, or None"""
+        return self.get(int(value)) if value.isdigit() else self.by_name(value)
+
+    def get_or_create(self, name):
+        category = self.by_name(name)
+        if category is None:
+            category, _ = Category.objects.get_or_create(
+                key=Category.normalize(name), defaults={'name': ' '.join(name.split())}
+            )
+        return category
+
+
+registry = CategoryRegistry()
+
+
+def changed():
+    transaction.on_commit(registry.invalidate)
@@ -0,0 +1,208 @@
+"""
+Deleting stories, users and organizations in the background.
+
+Deleting a story through the ORM makes Django's collector load every
+version, episode, report, invite and grant under it before it deletes
+anything, in one transaction. For a prolific user that is a long SQLite
+write lock and a lot of worker memory. Instead the delete views only
+tombstone the object and queue a DeletionJob, in one short transaction:
+
+- a story gets deleted_at, which the default managers of stories and
+  versions filter out, and its episodes get a copy for Episode.objects;
+- an organization likewise;
+- a user is deactivated, so they can no longer authenticate, and their
+  stories and the organizations they created are tombstoned with them, as
+  are the episodes they wrote in other people's stories.
+
+An organization has nothing else to hide: its memberships are read
+through its default manager. For a user, what the tombstone does not hide
+stays visible until the job reaches it: their reports and invites are still
+listed, and their likes and follows count until the user row itself, the
+last one, is deleted and its signal clears them from the engagement
+database. None of it is content the user wrote.
+
+The job then deletes from the leaves up: for every DELETION_CHUNK_SIZE rows
+of a table, the rows that cascade from them go first, chunk by chunk, then
+the rows themselves with an ordinary delete that finds nothing left to
+collect and still sends the signals that clean up the engagement database.
+Each chunk is its own transaction and moves the job's progress. Jobs run in
+a run_deletion_jobs worker, or with DELETION_IN_PROCESS (off by default) on
+a background thread of the web process once the tombstone commits; an
+interrupted job is taken over after DELETION_CLAIM_SECONDS and carries on
+where it stopped.
+"""
+from datetime import timedelta
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections, models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from accounts.models import Organization
+from story_project import metrics
+from .models import DeletionJob, Episode, Story
+
+logger = logging.getLogger('storyapp.deletion')
+
+TARGETS = {
+    DeletionJob.STORY: Story,
+    DeletionJob.USER: User,
+    DeletionJob.ORGANIZATION: Organization,
+}
+
+deleted_rows = metrics.registry.counter(
+    'deletion_rows_total', 'Rows removed by background deletion jobs, by job kind', ('kind',)
+)
+
+
+def pending_jobs():
+    return DeletionJob.objects.filter(finished_at__isnull=True).count()
+
+
+metrics.registry.register_gauge('deletion_jobs_pending', 'Deletion jobs not finished yet', pending_jobs)
+
+
+def _enqueue(kind, object_id, label, requested_by):
+    job = DeletionJob.objects.create(kind=kind, object_id=object_id, label=label, requested_by=requested_by)
+    if getattr(settings, 'DELETION_IN_PROCESS', False):
+        transaction.on_commit(worker.kick)
+    return job
+
+
+def delete_story(story, requested_by=None):
+    now = timezone.now()
+    with transaction.atomic():
+        Story.objects.filter(pk=story.pk).update(deleted_at=now)
+        Episode._base_manager.filter(version__story_id=story.pk).update(deleted_at=now)
+        return _enqueue(DeletionJob.STORY, story.pk, story.title, requested_by)
+
+
+def delete_organization(organization, requested_by=None):
+    with transaction.atomic():
+        Organization.objects.filter(pk=organization.pk).update(deleted_at=timezone.now())
+        return _enqueue(DeletionJob.ORGANIZATION, organization.pk, organization.name, requested_by)
+
+
+def delete_user(user, requested_by=None):
+    now = timezone.now()
+    with transaction.atomic():
+        User.objects.filter(pk=user.pk).update(is_active=False)
+        Story.objects.filter(creator_id=user.pk).update(deleted_at=now)
+        Episode._base_manager.filter(Q(creator_id=user.pk) | Q(version__story__creator_id=user.pk)).update(
+            deleted_at=now
+        )
+        Organization.objects.filter(created_by_id=user.pk).update(deleted_at=now)
+        return _enqueue(DeletionJob.USER, user.pk, user.username, requested_by)
+
+
+def _cascades(model):
+    """
+    The relations pointing at ``model``, as the collector finds them: hidden
+    ones and auto-created many-to-many tables included
+    """
+    return [
+        field for field in model._meta.get_fields(include_hidden=True)
+        if field.auto_created and not field.concrete and (field.one_to_one or field.one_to_many)
+    ]
+
+
+def _progress(job, model, count):
+    DeletionJob.objects.filter(pk=job.pk).update(
+        deleted_rows=F('deleted_rows') + count, current_table=model._meta.db_table, claimed_at=timezone.now()
+    )
+    deleted_rows.inc(count, kind=job.kind)
+
+
+def _drain(job, model, queryset, size):
+    """Deletes every row of ``queryset``, ``size`` at a time, with what cascades from each chunk first"""
+    # Newest first: episodes stored as diffs point at older ones, and
+    # deleting those first would rebuild the newer texts for nothing
+    while True:
+        ids = list(queryset.order_by('-pk').values_list('pk', flat=True)[:size])
+        if not ids:
+            return
+        for relation in _cascades(model):
+            related, field = relation.related_model, relation.field
+            if field.remote_field.on_delete is models.CASCADE and related is not model:
+                _drain(job, related, related._base_manager.filter(**{f'{field.name}__in': ids}), size)
+        # SET_NULL and the rest are left to the collector, after pre_delete
+        # signals such as the one materializing diff-stored episodes
+        count, _ = model._base_manager.filter(pk__in=ids).delete()
+        _progress(job, model, count)
+
+
+def run(job):
+    """Deletes the target of a claimed job and everything under it, then marks it finished"""
+    model = TARGETS[job.kind]
+    _drain(job, model, model._base_manager.filter(pk=job.object_id), getattr(settings, 'DELETION_CHUNK_SIZE', 500))
+    DeletionJob.objects.filter(pk=job.pk).update(finished_at=timezone.now(), current_table='', error='')
+
+
+def _claimable():
+    stale = timezone.now() - timedelta(seconds=getattr(settings, 'DELETION_CLAIM_SECONDS', 600))
+    return DeletionJob.objects.filter(finished_at__isnull=True).filter(
+        Q(claimed_at__isnull=True) | Q(claimed_at__lt=stale)
+    )
+
+
+def claim(job_id):
+    return _claimable().filter(pk=job_id).update(claimed_at=timezone.now()) == 1
+
+
+def drain():
+    """Runs deletion jobs until none are left to claim; returns how many finished"""
+    finished = 0
+    tried = set()
+    while True:
+        ids = list(_claimable().exclude(pk__in=tried).order_by('id').values_list('id', flat=True)[:10])
+        if not ids:
+            return finished
+        for job_id in ids:
+            tried.add(job_id)
+            if not claim(job_id):
+                continue
+            job = DeletionJob.objects.get(pk=job_id)
+            try:
+                run(job)
+            except Exception as exc:
+                # Left claimed: it is retried once the claim goes stale
+                logger.exception('Deletion job %s failed', job_id)
+                DeletionJob.objects.filter(pk=job_id).update(error=str(exc))
+                continue
+            finished += 1
+
+
+class DeletionWorker:
+    """Background thread that runs deletion jobs for the web process whenever it is kicked"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pending = False
+
+    def kick(self):
+        with self._lock:
+            self._pending = True
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='deletion-jobs', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+                self._pending = False
+            try:
+                drain()
+            except Exception:
+                logger.exception('Deletion jobs failed')
+            finally:
+                connections.close_all()
+
+
+worker = DeletionWorker()
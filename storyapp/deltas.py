@@ -0,0 +1,153 @@
+"""
+Delta storage for branched episode content.
+
+With EPISODE_DELTA_STORAGE enabled, an episode created with a parent_episode
+can be stored as a diff against its parent's body: ``content`` is left empty,
+``content_delta`` holds the diff and ``delta_base`` points at the parent. A
+full snapshot is written instead whenever the chain of diffs would grow past
+EPISODE_DELTA_SNAPSHOT_INTERVAL, or when the diff would not save at least
+half the space, so rebuilding a body never reads more than that many rows.
+
+Rebuilt bodies are kept in a per-process LRU of EPISODE_BODY_CACHE_SIZE
+entries. Entries are keyed by the episode and its diff, and the diffs an
+entry depends on are never rewritten in place, so the cache needs no
+invalidation across processes.
+
+Code reads and writes ``Episode.body``; ``Episode.content`` is only the
+stored column.
+"""
+from collections import OrderedDict
+from difflib import SequenceMatcher
+import json
+import re
+import threading
+
+from django.conf import settings
+
+# Store a diff only if it is at most this fraction of the full text
+MAX_DELTA_RATIO = 0.5
+
+_TOKEN_RE = re.compile(r'\s+|\S+')
+
+
+def enabled():
+    return getattr(settings, 'EPISODE_DELTA_STORAGE', False)
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text)
+
+
+def encode(base, text):
+    """A diff that rebuilds ``text`` from ``base``: base token ranges and literal strings"""
+    base_tokens, tokens = tokenize(base), tokenize(text)
+    ops = []
+    matcher = SequenceMatcher(None, base_tokens, tokens, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(''.join(tokens[j1:j2]))
+    return json.dumps(ops, ensure_ascii=False, separators=(',', ':'))
+
+
+def apply(base, delta):
+    tokens = tokenize(base)
+    return ''.join(
+        ''.join(tokens[op[0]:op[1]]) if isinstance(op, list) else op
+        for op in json.loads(delta)
+    )
+
+
+class BodyCache:
+    """Thread-safe LRU of rebuilt episode bodies"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        size = getattr(settings, 'EPISODE_BODY_CACHE_SIZE', 512)
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+body_cache = BodyCache()
+
+
+def _stored(model, pk):
+    return model._base_manager.only('content', 'content_delta', 'delta_base', 'delta_depth').get(pk=pk)
+
+
+def body(episode):
+    """The full text of ``episode``, rebuilding it from its diff chain if needed"""
+    if episode.content_delta is None:
+        return episode.content
+    rebuilt = getattr(episode, '_rebuilt', None)
+    if rebuilt is not None and rebuilt[0] == episode.content_delta:
+        return rebuilt[1]
+    key = (episode.pk, episode.content_delta)
+    text = body_cache.get(key)
+    if text is None:
+        base = _stored(type(episode), episode.delta_base_id)
+        text = apply(body(base), episode.content_delta)
+        body_cache.put(key, text)
+    return text
+
+
+def compress(episode):
+    """
+    Called from Episode.save() while ``episode.content`` holds the new full
+    text: switches the episode to a diff against its parent when that is
+    allowed and worthwhile.
+    """
+    if not enabled() or not episode.parent_episode_id:
+        return
+    base = _stored(type(episode), episode.parent_episode_id)
+    depth = base.delta_depth + 1
+    if depth > getattr(settings, 'EPISODE_DELTA_SNAPSHOT_INTERVAL', 8):
+        return
+    text = episode.content
+    delta = encode(body(base), text)
+    if len(delta) > len(text) * MAX_DELTA_RATIO:
+        return
+    episode.content = ''
+    episode.content_delta = delta
+    episode.delta_base_id = base.pk
+    episode.delta_depth = depth
+    # The instance may not have a primary key yet; it remembers its own text
+    episode._rebuilt = (delta, text)
+
+
+def materialize_dependents(episode):
+    """
+    Stores every episode diffed against ``episode`` in full. Must run while
+    the stored body of ``episode`` is still the old one: before it is edited
+    or deleted.
+    """
+    model = type(episode)
+    dependents = list(model._base_manager.filter(delta_base_id=episode.pk).only('content_delta'))
+    if not dependents:
+        return
+    base = body(_stored(model, episode.pk))
+    for dependent in dependents:
+        model._base_manager.filter(pk=dependent.pk).update(
+            content=apply(base, dependent.content_delta),
+            content_delta=None,
+            delta_base=None,
+            delta_depth=0,
+        )
@@ -0,0 +1,132 @@
+"""
+Diffs between two episodes of the same branch tree, cached per pair.
+
+Cached results are keyed by both episode ids and by a revision token per
+episode. Saving or deleting an episode replaces its token
+(storyapp.signals), so every cached diff involving it is missed from then
+on and simply expires.
+"""
+from difflib import SequenceMatcher, unified_diff
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from story_project import metrics
+from .deltas import tokenize
+from .models import Episode
+
+GRANULARITIES = ('word', 'line')
+STYLES = ('json', 'unified')
+
+# Longest parent_episode chain followed when looking for a common root
+MAX_LINEAGE_DEPTH = 1000
+
+
+def _revision_key(episode_id):
+    return f'episode-revision:{episode_id}'
+
+
+def bump_revision(episode_id):
+    cache.set(_revision_key(episode_id), uuid.uuid4().hex, None)
+
+
+def _revisions(ids):
+    keys = [_revision_key(pk) for pk in ids]
+    found = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in found}
+    if missing:
+        # add() keeps a token another process set in the meantime
+        for key, token in missing.items():
+            cache.add(key, token, None)
+        found.update(cache.get_many(list(missing)))
+    return [found[key] for key in keys]
+
+
+class LineageError(ValueError):
+    """The two episodes are not branches of the same episode"""
+
+
+def lineage_root(episode_id):
+    """The episode at the top of the parent_episode chain above ``episode_id``"""
+    current = episode_id
+    for _ in range(MAX_LINEAGE_DEPTH):
+        parent = Episode._base_manager.filter(pk=current).values_list('parent_episode_id', flat=True).first()
+        if parent is None:
+            return current
+        current = parent
+    return current
+
+
+def _split(text, granularity):
+    return text.splitlines(keepends=True) if granularity == 'line' else tokenize(text)
+
+
+def changes(old, new, granularity):
+    """Structured diff: runs of equal, deleted and inserted text, in reading order"""
+    old_parts, new_parts = _split(old, granularity), _split(new, granularity)
+    runs = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_parts, new_parts, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            runs.append({'op': 'equal', 'text': ''.join(old_parts[i1:i2])})
+            continue
+        if i2 > i1:
+            runs.append({'op': 'delete', 'text': ''.join(old_parts[i1:i2])})
+        if j2 > j1:
+            runs.append({'op': 'insert', 'text': ''.join(new_parts[j1:j2])})
+    return runs
+
+
+def _describe(episode):
+    return {
+        'id': episode.id,
+        'title': episode.title,
+        'version': episode.version_id,
+        'version_number': episode.version.version_number,
+    }
+
+
+def build_diff(old, new, granularity, style):
+    if lineage_root(old.id) != lineage_root(new.id):
+        raise LineageError(f'Episodes {old.id} and {new.id} are not in the same lineage')
+    result = {
+        'from': _describe(old),
+        'to': _describe(new),
+        'granularity': granularity if style == 'json' else 'line',
+        'style': style,
+    }
+    old_text, new_text = old.body, new.body
+    if style == 'unified':
+        result['diff'] = ''.join(unified_diff(
+            old_text.splitlines(keepends=True),
+            new_text.splitlines(keepends=True),
+            fromfile=f'episode/{old.id}',
+            tofile=f'episode/{new.id}',
+        ))
+        return result
+
+    runs = changes(old_text, new_text, granularity)
+    result['stats'] = {
+        'deleted': sum(len(_split(run['text'], granularity)) for run in runs if run['op'] == 'delete'),
+        'inserted': sum(len(_split(run['text'], granularity)) for run in runs if run['op'] == 'insert'),
+    }
+    result['changes'] = runs
+    return result
+
+
+def cached_diff(old, new, granularity, style):
+    """
+    build_diff, served from the cache while neither episode has changed.
+    Only a miss loads the texts or walks the lineage; a change of parent is
+    a save, so it also replaces the revision.
+    """
+    old_revision, new_revision = _revisions([old.id, new.id])
+    if style == 'unified':
+        granularity = 'line'
+    key = f'episode-diff:{old.id}:{old_revision}:{new.id}:{new_revision}:{granularity}:{style}'
+    result = cache.get(key)
+    metrics.record_cache('episode_diff', result is not None)
+    if result is None:
+        result = build_diff(old, new, granularity, style)
+        cache.set(key, result, getattr(settings, 'EPISODE_DIFF_CACHE_SECONDS', 3600))
+    return result
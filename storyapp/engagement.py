@@ -0,0 +1,282 @@
+"""
+Reads of likes, follows and favorites.
+
+These tables live in the engagement database (story_project.routers), so
+they cannot be joined against stories, episodes or users. Everything here
+queries them on their own, by id and in bulk, and hands back plain ids and
+counts for the content queries to use.
+"""
+from django.db import connections, models, router
+from django.db.models import Count
+from rest_framework import serializers
+
+from accounts.models import FavoriteStory, ProfileFollow
+from . import writebehind
+from .models import EpisodeLike, StoryFollow, StoryLike
+
+# Stay well below SQLite's limit on bound parameters
+CHUNK_SIZE = 500
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def _pending(model):
+    """Buffered changes not yet written (storyapp.writebehind): {(target, owner): engaged}"""
+    return writebehind.buffer.overlay(model) if writebehind.enabled() else {}
+
+
+def _counts(model, field, ids):
+    counts = dict.fromkeys(ids, 0)
+    for chunk in _chunks(counts):
+        rows = model.objects.filter(**{f'{field}__in': chunk}).values(field).annotate(total=Count('id'))
+        counts.update((row[field], row['total']) for row in rows)
+    for (target, owner), engaged in _pending(model).items():
+        if target in counts:
+            counts[target] += 1 if engaged else -1
+    return counts
+
+
+def _grouped(model, field, value_field, ids):
+    """Owners per target, oldest first; ``field`` is the target and ``value_field`` the owner"""
+    grouped = {pk: [] for pk in ids}
+    for chunk in _chunks(grouped):
+        rows = model.objects.filter(**{f'{field}__in': chunk}).order_by('id').values_list(field, value_field)
+        for key, value in rows:
+            grouped[key].append(value)
+    for (target, owner), engaged in _pending(model).items():
+        owners = grouped.get(target)
+        if owners is None:
+            continue
+        if engaged and owner not in owners:
+            owners.append(owner)
+        elif not engaged and owner in owners:
+            owners.remove(owner)
+    return grouped
+
+
+def _members(model, field, ids, **owner):
+    """Which targets in ``ids`` have a row for the one owner given as a filter"""
+    found = set()
+    for chunk in _chunks(set(ids)):
+        found.update(model.objects.filter(**{f'{field}__in': chunk}, **owner).values_list(field, flat=True))
+    return _overlay_owner(model, found, owner, set(ids))
+
+
+def _overlay_owner(model, found, owner, ids=None):
+    (owner_id,) = owner.values()
+    for (target, pending_owner), engaged in _pending(model).items():
+        if pending_owner != owner_id or (ids is not None and target not in ids):
+            continue
+        if engaged:
+            found.add(target)
+        else:
+            found.discard(target)
+    return found
+
+
+def story_liker_ids(story_ids):
+    """User ids that liked each story, in the order they liked it"""
+    return _grouped(StoryLike, 'story_id', 'user_id', story_ids)
+
+
+def story_follower_ids(story_ids):
+    """User ids following each story, in the order they followed it"""
+    return _grouped(StoryFollow, 'story_id', 'user_id', story_ids)
+
+
+def liked_story_ids(user, story_ids):
+    return _members(StoryLike, 'story_id', story_ids, user_id=user.id)
+
+
+def followed_story_ids_among(user, story_ids):
+    """Which of ``story_ids`` the user follows"""
+    return _members(StoryFollow, 'story_id', story_ids, user_id=user.id)
+
+
+def favorite_story_ids_among(profile, story_ids):
+    """Which of ``story_ids`` are among the profile's favorites"""
+    return _members(FavoriteStory, 'story_id', story_ids, profile_id=profile.id)
+
+
+def episode_like_counts(episode_ids):
+    return _counts(EpisodeLike, 'episode_id', episode_ids)
+
+
+def liked_episode_ids(user, episode_ids):
+    return _members(EpisodeLike, 'episode_id', episode_ids, user_id=user.id)
+
+
+def followed_story_ids(user):
+    found = set(StoryFollow.objects.filter(user_id=user.id).values_list('story_id', flat=True))
+    return list(_overlay_owner(StoryFollow, found, {'user_id': user.id}))
+
+
+def favorite_story_ids(profile):
+    found = set(FavoriteStory.objects.filter(profile_id=profile.id).values_list('story_id', flat=True))
+    return list(_overlay_owner(FavoriteStory, found, {'profile_id': profile.id}))
+
+
+def following_user_ids(profile):
+    return list(ProfileFollow.objects.filter(profile_id=profile.id).values_list('user_id', flat=True))
+
+
+def follower_counts(user_ids):
+    """Followers per user id"""
+    return _counts(ProfileFollow, 'user_id', user_ids)
+
+
+def following_counts(profile_ids):
+    """Followed users per profile id"""
+    return _counts(ProfileFollow, 'profile_id', profile_ids)
+
+
+def set_engaged(model, field, object_id, owner_id, engaged, owner_field='user'):
+    """
+    Adds or removes the (object, owner) row of a like, follow or favorite
+    table with a single statement, without reading the relation first, or
+    buffers the change when write-behind is on (storyapp.writebehind).
+    Returns whether anything changed and the object's new total.
+    """
+    target = {field: object_id, owner_field: owner_id}
+    if writebehind.enabled():
+        changed = writebehind.buffer.record(
+            model, object_id, owner_id, engaged, lambda: model.objects.filter(**target).exists()
+        )
+    elif engaged:
+        # The (object, owner) pair is unique, so a repeat is a no-op insert
+        connection = connections[router.db_for_write(model)]
+        quote = connection.ops.quote_name
+        columns = [model._meta.get_field(name).column for name in (field, owner_field)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(model._meta.db_table)} ({quote(columns[0])}, {quote(columns[1])}) '
+                f'VALUES (%s, %s) ON CONFLICT DO NOTHING',
+                [object_id, owner_id],
+            )
+            changed = cursor.rowcount == 1
+    else:
+        deleted, _ = model.objects.filter(**target).delete()
+        changed = deleted > 0
+    column = model._meta.get_field(field).column
+    return changed, _counts(model, column, [object_id])[object_id]
+
+
+class EngagementLookup:
+    """
+    Per-response cache of engagement figures for serializers. List
+    serializers prime it with the ids of the whole page so every count costs
+    one query per page instead of one per object; anything not primed is
+    loaded on first use.
+    """
+
+    def __init__(self, user=None):
+        self.user = user if user is not None and user.is_authenticated else None
+        self._values = {}
+
+    def _get(self, kind, key, loader):
+        values = self._values.setdefault(kind, {})
+        if key not in values:
+            self.prime(kind, [key], loader)
+        return values[key]
+
+    def prime(self, kind, keys, loader):
+        values = self._values.setdefault(kind, {})
+        missing = [key for key in dict.fromkeys(keys) if key not in values]
+        if missing:
+            values.update(loader(missing))
+
+    def _user_members(self, lookup):
+        def load(ids):
+            found = lookup(self.user, ids) if self.user is not None else set()
+            return {pk: pk in found for pk in ids}
+        return load
+
+    def prime_stories(self, story_ids):
+        self.prime('story_likers', story_ids, story_liker_ids)
+        self.prime('story_followers', story_ids, story_follower_ids)
+
+    def _profile_members(self, lookup):
+        def load(ids):
+            profile = getattr(self.user, 'profile', None) if self.user is not None else None
+            found = lookup(profile, ids) if profile is not None else set()
+            return {pk: pk in found for pk in ids}
+        return load
+
+    def prime_story_status(self, story_ids):
+        """Whether the user likes, follows and favorited each story: one query each"""
+        self.prime('story_liked', story_ids, self._user_members(liked_story_ids))
+        self.prime('story_followed', story_ids, self._user_members(followed_story_ids_among))
+        self.prime('story_favorited', story_ids, self._profile_members(favorite_story_ids_among))
+
+    def prime_episode_status(self, episode_ids):
+        self.prime('episode_liked', episode_ids, self._user_members(liked_episode_ids))
+
+    def prime_episodes(self, episode_ids):
+        self.prime('episode_likes', episode_ids, episode_like_counts)
+        self.prime_episode_status(episode_ids)
+
+    def prime_users(self, users):
+        users = list(users)
+        self.prime('followers', [user.id for user in users], follower_counts)
+        profile_ids = [user.profile.id for user in users if hasattr(user, 'profile')]
+        self.prime('following', profile_ids, following_counts)
+
+    def story_likers(self, story):
+        return self._get('story_likers', story.pk, story_liker_ids)
+
+    def story_followers(self, story):
+        return self._get('story_followers', story.pk, story_follower_ids)
+
+    def status(self, kind, pk):
+        """A primed flag by object id: story_liked, story_followed, story_favorited or episode_liked"""
+        return self._values[kind][pk]
+
+    def story_liked(self, story):
+        return self._get('story_liked', story.pk, self._user_members(liked_story_ids))
+
+    def story_followed(self, story):
+        return self._get('story_followed', story.pk, self._user_members(followed_story_ids_among))
+
+    def story_favorited(self, story):
+        return self._get('story_favorited', story.pk, self._profile_members(favorite_story_ids_among))
+
+    def episode_likes(self, episode):
+        return self._get('episode_likes', episode.pk, episode_like_counts)
+
+    def episode_liked(self, episode):
+        return self._get('episode_liked', episode.pk, self._user_members(liked_episode_ids))
+
+    def followers(self, user):
+        return self._get('followers', user.pk, follower_counts)
+
+    def following(self, user):
+        if not hasattr(user, 'profile'):
+            return 0
+        return self._get('following', user.profile.pk, following_counts)
+
+
+def engagement_lookup(context):
+    """The EngagementLookup shared by every serializer rendering one response"""
+    lookup = context.get('engagement')
+    if lookup is None:
+        request = context.get('request')
+        lookup = EngagementLookup(getattr(request, 'user', None))
+        context['engagement'] = lookup
+    return lookup
+
+
+class EngagementListSerializer(serializers.ListSerializer):
+    """
+    list_serializer_class for serializers that show engagement figures: it
+    primes the lookup with the whole list before the items are serialized.
+    The child serializer implements ``prime_engagement(lookup, items)``.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.child.prime_engagement(engagement_lookup(self.context), items)
+        return super().to_representation(items)
@@ -0,0 +1,219 @@
+"""
+Episode events for followers: new episodes, new branches and status changes
+on the stories a user follows and on the public stories of the authors they
+follow.
+
+Every event is an EpisodeEvent row, written in the transaction that saves the
+episode (storyapp.signals). Once that transaction commits, the event is also
+handed to the streams open in the same process through ``bus``, so they see
+it at once. Streams poll the table every EPISODE_EVENT_POLL_SECONDS for
+everything else, which covers events saved by other worker processes and any
+event a slow stream dropped. The row id is the SSE event id, so a client
+reconnecting with Last-Event-ID picks up where it left off.
+"""
+import asyncio
+from datetime import timedelta
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import engagement
+from .models import Episode, EpisodeEvent, Story, Version
+
+# Events a stream may have waiting before further ones are left to polling
+QUEUE_SIZE = 256
+# How often a stream reloads what the user follows
+FOLLOW_REFRESH_SECONDS = 60
+
+_datetime = serializers.DateTimeField()
+
+
+def payload(event):
+    """The compact form sent to clients"""
+    return {
+        'id': event.id,
+        'kind': event.kind,
+        'episode': event.episode_id,
+        'story': event.story_id,
+        'version': event.version_id,
+        'creator': event.creator_id,
+        'title': event.title,
+        'status': event.status,
+        'previous_status': event.previous_status or None,
+        'created_at': _datetime.to_representation(event.created_at),
+    }
+
+
+class EventBus:
+    """In-process fan-out of committed events to the streams of this process"""
+
+    def __init__(self):
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self._queues[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._queues.pop(queue, None)
+
+    def publish(self, event):
+        with self._lock:
+            queues = list(self._queues.items())
+        for queue, loop in queues:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # The stream's event loop has closed
+                self.unsubscribe(queue)
+
+    @staticmethod
+    def _offer(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+
+bus = EventBus()
+
+
+def record(episode, created):
+    """
+    Called on every episode save: writes the event the save amounts to, if
+    any, and publishes it once the transaction commits.
+    """
+    previous = episode._saved_status
+    if created:
+        if episode.status != Episode.PUBLIC:
+            # Pending and private episodes are announced when they go public
+            return
+        kind = EpisodeEvent.BRANCH if episode.parent_episode_id else EpisodeEvent.NEW_EPISODE
+        previous = ''
+    elif previous is not None and previous != episode.status:
+        kind = EpisodeEvent.STATUS
+    else:
+        return
+
+    story_id, visibility = Version.objects.filter(pk=episode.version_id).values_list(
+        'story_id', 'story__visibility'
+    ).get()
+    event = EpisodeEvent.objects.create(
+        kind=kind,
+        episode_id=episode.pk,
+        story_id=story_id,
+        version_id=episode.version_id,
+        creator_id=episode.creator_id,
+        title=episode.title,
+        status=episode.status,
+        previous_status=previous,
+        public_story=visibility == Story.PUBLIC,
+    )
+    transaction.on_commit(lambda: bus.publish(event))
+
+
+def prune():
+    """Deletes events older than EPISODE_EVENT_RETENTION_DAYS; returns how many"""
+    cutoff = timezone.now() - timedelta(days=getattr(settings, 'EPISODE_EVENT_RETENTION_DAYS', 7))
+    deleted, _ = EpisodeEvent.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
+
+
+def encode(event):
+    data = json.dumps(payload(event), separators=(',', ':'))
+    return f'id: {event.id}\nevent: {event.kind}\ndata: {data}\n\n'
+
+
+class Follows:
+    """What one user follows, reloaded every FOLLOW_REFRESH_SECONDS"""
+
+    def __init__(self, user):
+        self.user = user
+        self.story_ids = set()
+        self.author_ids = set()
+        self.loaded_at = None
+
+    async def refresh(self, loop_time):
+        if self.loaded_at is not None and loop_time - self.loaded_at < FOLLOW_REFRESH_SECONDS:
+            return
+        self.story_ids, self.author_ids = await sync_to_async(self._load)()
+        self.loaded_at = loop_time
+
+    def _load(self):
+        profile = getattr(self.user, 'profile', None)
+        authors = engagement.following_user_ids(profile) if profile is not None else []
+        return set(engagement.followed_story_ids(self.user)), set(authors)
+
+    def wants(self, event):
+        if event.story_id in self.story_ids:
+            return True
+        return event.public_story and event.creator_id in self.author_ids
+
+    def filter(self, queryset):
+        return queryset.filter(
+            Q(story_id__in=self.story_ids) | Q(creator_id__in=self.author_ids, public_story=True)
+        )
+
+
+async def stream(user, last_event_id=None):
+    """
+    Server-sent events for ``user``: ``retry`` first, then events as they
+    happen and a comment line whenever nothing was sent for
+    EPISODE_EVENT_HEARTBEAT_SECONDS. Ends after EPISODE_EVENT_STREAM_SECONDS;
+    the client reconnects with Last-Event-ID.
+    """
+    poll_seconds = getattr(settings, 'EPISODE_EVENT_POLL_SECONDS', 2)
+    heartbeat_seconds = getattr(settings, 'EPISODE_EVENT_HEARTBEAT_SECONDS', 15)
+    loop = asyncio.get_running_loop()
+    ends_at = loop.time() + getattr(settings, 'EPISODE_EVENT_STREAM_SECONDS', 300)
+    follows = Follows(user)
+
+    queue = bus.subscribe()
+    try:
+        if last_event_id is None:
+            latest = await EpisodeEvent.objects.using('default').order_by('-id').values_list('id', flat=True).afirst()
+            last_event_id = latest or 0
+        # Everything up to cursor has been polled; sent holds later ids that
+        # already went out through the bus
+        cursor, sent = last_event_id, set()
+        yield f'retry: {int(poll_seconds * 1000)}\n\n'
+        next_poll = last_sent = loop.time()
+
+        while loop.time() < ends_at:
+            if loop.time() >= next_poll:
+                await follows.refresh(loop.time())
+                # The primary, not a replica: a replica is only as fresh as its last sync
+                events = follows.filter(EpisodeEvent.objects.using('default').filter(id__gt=cursor)).order_by('id')
+                async for event in events:
+                    cursor = event.id
+                    if event.id not in sent:
+                        last_sent = loop.time()
+                        yield encode(event)
+                sent = {pk for pk in sent if pk > cursor}
+                next_poll = loop.time() + poll_seconds
+
+            if loop.time() - last_sent >= heartbeat_seconds:
+                last_sent = loop.time()
+                yield ': keepalive\n\n'
+
+            wait = min(next_poll, last_sent + heartbeat_seconds, ends_at) - loop.time()
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=max(wait, 0))
+            except asyncio.TimeoutError:
+                continue
+            if event.id > cursor and event.id not in sent and follows.wants(event):
+                sent.add(event.id)
+                last_sent = loop.time()
+                yield encode(event)
+    finally:
+        bus.unsubscribe(queue)
@@ -0,0 +1,225 @@
+from django.core.asgi import get_asgi_application
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.contrib.auth.models import User
+from django.db.models import Count
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from rest_framework.authtoken.models import Token
+from storyapp.models import Story
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import io
+import logging
+import sys
+import threading
+import time
+
+from .benchmark_endpoints import percentile
+
+
+def wsgi_get(application, path, query, headers):
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    environ.update(('HTTP_' + name.upper().replace('-', '_'), value) for name, value in headers.items())
+    status = []
+    body = application(environ, lambda line, response_headers, exc_info=None: status.append(line))
+    try:
+        b''.join(body)
+    finally:
+        body.close()
+    return int(status[0].split()[0])
+
+
+async def asgi_get(application, path, query, headers):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'localhost')] + [
+            (name.lower().encode(), value.encode()) for name, value in headers.items()
+        ],
+        'client': ('127.0.0.1', 50000),
+        'server': ('localhost', 80),
+    }
+    request_sent = False
+    disconnected = asyncio.Event()
+    status = []
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The handler listens for a disconnect while it works; never send one
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares concurrent-client throughput of the public read endpoints served three ways: '
+        'the DRF views under WSGI, the same views under ASGI, and the async views under ASGI. '
+        'Runs in process against a test database seeded with populate_db.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0, help='populate_db scale for the dataset')
+        parser.add_argument('--seed', type=int, default=1234, help='populate_db seed for the dataset')
+        parser.add_argument('--clients', type=int, default=16, help='Concurrent clients')
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per endpoint and mode')
+        parser.add_argument('--warmup', type=int, default=4, help='Untimed requests per endpoint and mode')
+
+    def handle(self, *args, **options):
+        if options['clients'] < 1 or options['requests'] < 1:
+            raise CommandError('--clients and --requests must be at least 1')
+
+        # Both handlers rerun django.setup(), which reconfigures logging, so
+        # build them before quieting the slow request log that the DRF
+        # views would otherwise fill with hundreds of entries.
+        applications = {'wsgi': get_wsgi_application(), 'asgi': get_asgi_application()}
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        request_logger = logging.getLogger('story_project.requests')
+        old_level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            self.stdout.write(f'Seeding dataset (scale {options["scale"]}, seed {options["seed"]})...')
+            call_command('populate_db', scale=options['scale'], seed=options['seed'], verbosity=0, stdout=io.StringIO())
+            results = self._run(applications, options)
+        finally:
+            request_logger.setLevel(old_level)
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(f'{"endpoint":<28}{"mode":<12}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}')
+        for name, modes in results.items():
+            for mode, result in modes.items():
+                self.stdout.write(
+                    f'{name:<28}{mode:<12}{result["throughput"]:>10.1f}'
+                    f'{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}'
+                )
+            if modes['wsgi']['throughput']:
+                self.stdout.write(
+                    f'{"":<28}async views vs WSGI: {modes["asgi-async"]["throughput"] / modes["wsgi"]["throughput"]:.2f}x'
+                )
+
+    def _endpoints(self):
+        """(name, DRF path, async path, query, authenticated) for the fixed dataset"""
+        story = Story.objects.filter(visibility=Story.PUBLIC).annotate(
+            version_count=Count('versions')
+        ).order_by('-version_count', 'id').first()
+        if story is None:
+            raise CommandError('The seeded dataset has no public stories; increase --scale')
+        return [
+            ('public_stories', '/api/stories/public/stories/', '/api/stories/async/public/stories/', '', False),
+            (
+                'story_detail_all_versions',
+                f'/api/stories/public/stories/{story.id}/',
+                f'/api/stories/async/public/stories/{story.id}/',
+                'all_versions=true',
+                True,
+            ),
+            ('episodes_by_story', f'/api/stories/{story.id}/episodes/', f'/api/stories/async/{story.id}/episodes/', '', True),
+            ('categories', '/api/stories/categories/', '/api/stories/async/categories/', '', False),
+        ]
+
+    def _run(self, applications, options):
+        reader = User.objects.filter(profile__role='user').order_by('id').first()
+        if reader is None:
+            raise CommandError('The seeded dataset has no regular users; increase --scale')
+        token, _ = Token.objects.get_or_create(user=reader)
+        wsgi_application, asgi_application = applications['wsgi'], applications['asgi']
+
+        results = {}
+        for name, sync_path, async_path, query, authenticated in self._endpoints():
+            headers = {'Authorization': f'Token {token.key}'} if authenticated else {}
+            results[name] = {
+                'wsgi': self._measure_threads(
+                    lambda: wsgi_get(wsgi_application, sync_path, query, headers), name, options
+                ),
+                'asgi-sync': asyncio.run(self._measure_tasks(
+                    lambda: asgi_get(asgi_application, sync_path, query, headers), name, options
+                )),
+                'asgi-async': asyncio.run(self._measure_tasks(
+                    lambda: asgi_get(asgi_application, async_path, query, headers), name, options
+                )),
+            }
+        return results
+
+    def _summary(self, name, statuses, latencies, elapsed):
+        failed = [code for code in statuses if code != 200]
+        if failed:
+            raise CommandError(f'{name}: {len(failed)} requests failed (status {failed[0]})')
+        return {
+            'throughput': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 0.50),
+            'p95_ms': percentile(latencies, 0.95),
+        }
+
+    def _measure_threads(self, get, name, options):
+        for _ in range(options['warmup']):
+            get()
+        remaining = iter(range(options['requests']))
+        lock = threading.Lock()
+        statuses, latencies = [], []
+
+        def client():
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                started = time.perf_counter()
+                code = get()
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses.append(code)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['clients']) as executor:
+            for future in [executor.submit(client) for _ in range(options['clients'])]:
+                future.result()
+        return self._summary(name, statuses, latencies, time.perf_counter() - started)
+
+    async def _measure_tasks(self, get, name, options):
+        for _ in range(options['warmup']):
+            await get()
+        remaining = iter(range(options['requests']))
+        statuses, latencies = [], []
+
+        async def client():
+            while next(remaining, None) is not None:
+                started = time.perf_counter()
+                code = await get()
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses.append(code)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options['clients'])))
+        return self._summary(name, statuses, latencies, time.perf_counter() - started)
@@ -0,0 +1,207 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models import Count
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from rest_framework.test import APIClient
+from storyapp.models import Story, StoryFollow
+from contextlib import ExitStack
+import io
+import json
+import math
+import os
+import platform
+import time
+import tracemalloc
+
+import django
+
+
+class QueryCounter:
+    """execute_wrapper that counts statements; unlike CaptureQueriesContext it is not capped at 9000"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the hot API endpoints in process against a test database seeded '
+        'with populate_db, and compares latency, query counts and memory to a JSON baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=2.0, help='populate_db scale for the dataset')
+        parser.add_argument('--seed', type=int, default=1234, help='populate_db seed for the dataset')
+        parser.add_argument('--iterations', type=int, default=10, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per endpoint before measuring')
+        parser.add_argument(
+            '--baseline',
+            default=os.path.join(settings.BASE_DIR, 'benchmarks', 'endpoints.json'),
+            help='Path of the JSON baseline file'
+        )
+        parser.add_argument('--update-baseline', action='store_true', help='Write the results as the new baseline')
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.25,
+            help='Allowed relative increase in p95 latency and peak memory before failing'
+        )
+        parser.add_argument(
+            '--latency-slack-ms',
+            type=float,
+            default=5.0,
+            help='Latency increases smaller than this are treated as noise'
+        )
+        parser.add_argument(
+            '--query-tolerance',
+            type=int,
+            default=0,
+            help='Allowed increase in SQL queries per request before failing'
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.stdout.write(f'Seeding dataset (scale {options["scale"]}, seed {options["seed"]})...')
+            call_command('populate_db', scale=options['scale'], seed=options['seed'], verbosity=0, stdout=io.StringIO())
+            results = self._run(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        self._report(results)
+        report = {
+            'dataset': {'scale': options['scale'], 'seed': options['seed']},
+            'iterations': options['iterations'],
+            'environment': {'python': platform.python_version(), 'django': django.get_version()},
+            'endpoints': results,
+        }
+
+        if options['update_baseline'] or not os.path.exists(options['baseline']):
+            os.makedirs(os.path.dirname(os.path.abspath(options['baseline'])), exist_ok=True)
+            with open(options['baseline'], 'w') as baseline_file:
+                json.dump(report, baseline_file, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {options["baseline"]}'))
+            return
+
+        with open(options['baseline']) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('dataset') != report['dataset']:
+            raise CommandError(
+                f'Baseline was recorded with dataset {baseline.get("dataset")}, not {report["dataset"]}; '
+                'rerun with matching --scale/--seed or --update-baseline'
+            )
+        regressions = self._compare(baseline['endpoints'], results, options)
+        if regressions:
+            for line in regressions:
+                self.stderr.write(line)
+            raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+        self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
+
+    def _endpoints(self):
+        """Resolve the fixed dataset to concrete (name, user, url) requests"""
+        admin = User.objects.get(username='admin')
+        # Follows are in the engagement database, so rank readers there
+        regular_users = set(User.objects.filter(profile__role='user').values_list('id', flat=True))
+        follows = StoryFollow.objects.values('user_id').annotate(followed=Count('id')).order_by('-followed', 'user_id')
+        reader_id = next((row['user_id'] for row in follows if row['user_id'] in regular_users), None)
+        reader = User.objects.filter(id=reader_id).first()
+        story = Story.objects.filter(visibility=Story.PUBLIC).annotate(
+            version_count=Count('versions')
+        ).order_by('-version_count', 'id').first()
+        if reader is None or story is None:
+            raise CommandError('The seeded dataset has no regular users or public stories; increase --scale')
+
+        return [
+            ('public_stories', None, '/api/stories/public/stories/'),
+            ('story_detail_all_versions', reader, f'/api/stories/stories/{story.id}/?all_versions=true'),
+            ('episodes_by_story', reader, f'/api/stories/{story.id}/episodes/'),
+            ('feed', reader, '/api/stories/stories/feed/'),
+            ('moderation_queue', admin, '/api/stories/admin/episodes/pending-review/'),
+            ('user_activity_stats', admin, '/api/accounts/stats/user-activity/'),
+        ]
+
+    def _run(self, options):
+        results = {}
+        for name, user, url in self._endpoints():
+            client = APIClient()
+            if user is not None:
+                client.force_authenticate(user=user)
+
+            for _ in range(options['warmup']):
+                self._get(client, name, url)
+
+            timings = []
+            for _ in range(options['iterations']):
+                counter = QueryCounter()
+                with ExitStack() as stack:
+                    for connection in connections.all():
+                        stack.enter_context(connection.execute_wrapper(counter))
+                    started = time.perf_counter()
+                    self._get(client, name, url)
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries = counter.count
+
+            # Memory is measured on a separate request; tracemalloc slows
+            # everything down and would skew the timings above.
+            tracemalloc.start()
+            try:
+                self._get(client, name, url)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+            results[name] = {
+                'url': url,
+                'p50_ms': round(percentile(timings, 0.50), 3),
+                'p95_ms': round(percentile(timings, 0.95), 3),
+                'queries': queries,
+                'peak_kb': round(peak / 1024, 1),
+            }
+        return results
+
+    def _get(self, client, name, url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f'{name}: GET {url} returned {response.status_code}')
+        return response
+
+    def _report(self, results):
+        self.stdout.write(f'{"endpoint":<28}{"p50 ms":>10}{"p95 ms":>10}{"queries":>10}{"peak KiB":>12}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<28}{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}'
+                f'{result["queries"]:>10}{result["peak_kb"]:>12.1f}'
+            )
+
+    def _compare(self, baseline, results, options):
+        regressions = []
+        limit = 1 + options['tolerance']
+        for name, result in results.items():
+            previous = baseline.get(name)
+            if previous is None:
+                continue
+            if result['queries'] > previous['queries'] + options['query_tolerance']:
+                regressions.append(f'{name}: {result["queries"]} queries (baseline {previous["queries"]})')
+            if result['p95_ms'] > max(previous['p95_ms'] * limit, previous['p95_ms'] + options['latency_slack_ms']):
+                regressions.append(f'{name}: p95 {result["p95_ms"]:.2f} ms (baseline {previous["p95_ms"]:.2f} ms)')
+            if result['peak_kb'] > previous['peak_kb'] * limit:
+                regressions.append(f'{name}: peak memory {result["peak_kb"]:.1f} KiB (baseline {previous["peak_kb"]:.1f} KiB)')
+        return regressions
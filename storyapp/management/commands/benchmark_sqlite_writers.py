@@ -0,0 +1,156 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.db import connections, transaction, OperationalError
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from .benchmark_endpoints import percentile
+
+
+STOCK = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'OPTIONS': {},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs concurrent like/report style write transactions against a scratch SQLite file, '
+        'once with the stock sqlite3 backend and once with the project backend settings, '
+        'and compares throughput, latency and "database is locked" failures.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Concurrent writer threads')
+        parser.add_argument('--readers', type=int, default=2, help='Concurrent reader threads')
+        parser.add_argument('--transactions', type=int, default=200, help='Write transactions per writer')
+        parser.add_argument('--rows', type=int, default=5000, help='Rows preloaded into the scratch table')
+
+    def handle(self, *args, **options):
+        if options['writers'] < 1 or options['transactions'] < 1:
+            raise CommandError('--writers and --transactions must be at least 1')
+
+        tuned = {
+            'ENGINE': settings.DATABASES['default']['ENGINE'],
+            'OPTIONS': dict(settings.DATABASES['default'].get('OPTIONS', {})),
+        }
+        directory = tempfile.mkdtemp(prefix='sqlite-bench-')
+        try:
+            results = [
+                self._run('stock', STOCK, directory, options),
+                self._run('tuned', tuned, directory, options),
+            ]
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        self.stdout.write(
+            f'{"backend":<8}{"commits/s":>12}{"failed":>9}{"p50 ms":>10}{"p95 ms":>10}{"reads/s":>12}'
+        )
+        for result in results:
+            self.stdout.write(
+                f'{result["name"]:<8}{result["commits_per_s"]:>12.1f}{result["failed"]:>9}'
+                f'{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}{result["reads_per_s"]:>12.1f}'
+            )
+        stock, tuned = results
+        if stock['commits_per_s']:
+            self.stdout.write(f'Write throughput change: {tuned["commits_per_s"] / stock["commits_per_s"]:.2f}x')
+
+    def _run(self, name, config, directory, options):
+        alias = f'sqlite_bench_{name}'
+        database = dict(config, NAME=os.path.join(directory, f'{name}.sqlite3'))
+        connections.settings[alias] = connections.configure_settings({'default': database})['default']
+        try:
+            self._prepare(alias, options['rows'])
+            return self._measure(name, alias, options)
+        finally:
+            connections[alias].close()
+            del connections.settings[alias]
+
+    def _prepare(self, alias, rows):
+        with connections[alias].cursor() as cursor:
+            cursor.execute(
+                'CREATE TABLE bench_story (id integer PRIMARY KEY, likes integer NOT NULL, reports integer NOT NULL)'
+            )
+            cursor.execute(
+                'CREATE TABLE bench_like (id integer PRIMARY KEY, story_id integer NOT NULL, user_id integer NOT NULL)'
+            )
+            cursor.executemany(
+                'INSERT INTO bench_story (id, likes, reports) VALUES (%s, 0, 0)',
+                [(story_id,) for story_id in range(1, rows + 1)]
+            )
+
+    def _measure(self, name, alias, options):
+        rows = options['rows']
+        latencies = []
+        failures = []
+        reads = []
+        stop = threading.Event()
+        start_barrier = threading.Barrier(options['writers'] + options['readers'] + 1)
+
+        def writer(worker):
+            rng = random.Random(worker)
+            local_latencies, local_failures = [], 0
+            start_barrier.wait()
+            for _ in range(options['transactions']):
+                story_id = rng.randint(1, rows)
+                started = time.perf_counter()
+                try:
+                    # Read-then-write, as the like/report views do
+                    with transaction.atomic(using=alias):
+                        with connections[alias].cursor() as cursor:
+                            cursor.execute('SELECT likes FROM bench_story WHERE id = %s', [story_id])
+                            cursor.fetchone()
+                            cursor.execute(
+                                'INSERT INTO bench_like (story_id, user_id) VALUES (%s, %s)', [story_id, worker]
+                            )
+                            cursor.execute('UPDATE bench_story SET likes = likes + 1 WHERE id = %s', [story_id])
+                except OperationalError:
+                    local_failures += 1
+                    continue
+                local_latencies.append((time.perf_counter() - started) * 1000)
+            latencies.extend(local_latencies)
+            failures.append(local_failures)
+            connections[alias].close()
+
+        def reader(worker):
+            rng = random.Random(-worker)
+            count = 0
+            start_barrier.wait()
+            while not stop.is_set():
+                try:
+                    with connections[alias].cursor() as cursor:
+                        cursor.execute(
+                            'SELECT COUNT(*) FROM bench_like WHERE story_id = %s', [rng.randint(1, rows)]
+                        )
+                        cursor.fetchone()
+                    count += 1
+                except OperationalError:
+                    pass
+            reads.append(count)
+            connections[alias].close()
+
+        writers = [threading.Thread(target=writer, args=(n,)) for n in range(options['writers'])]
+        readers = [threading.Thread(target=reader, args=(n,)) for n in range(options['readers'])]
+        for thread in writers + readers:
+            thread.start()
+        start_barrier.wait()
+        started = time.perf_counter()
+        for thread in writers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for thread in readers:
+            thread.join()
+
+        return {
+            'name': name,
+            'commits_per_s': len(latencies) / elapsed,
+            'failed': sum(failures),
+            'p50_ms': percentile(latencies, 0.50) if latencies else 0.0,
+            'p95_ms': percentile(latencies, 0.95) if latencies else 0.0,
+            'reads_per_s': sum(reads) / elapsed,
+        }
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from storyapp import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the related stories of every story from likes, follows and favorites '
+        '(cosine similarity of their engaged users) and replaces the RelatedStory table. '
+        'Needs numpy and scipy. Run it offline, e.g. nightly.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, help='Neighbours kept per story (default RELATED_STORIES_TOP_N)')
+        parser.add_argument('--chunk-size', type=int, help='Stories per similarity block (default RELATED_STORIES_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        for option in ('top', 'chunk_size'):
+            if options[option] is not None and options[option] < 1:
+                raise CommandError(f'--{option.replace("_", "-")} must be at least 1')
+        try:
+            stories, rows = recommendations.build(options['top'], options['chunk_size'])
+        except ImportError as exc:
+            raise CommandError(f'build_related_stories needs numpy and scipy: {exc}')
+        self.stdout.write(self.style.SUCCESS(f'Stored {rows} related stories for {stories} stories'))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.apps import apps
+from django.db import connections
+from story_project.routers import ENGAGEMENT_MODELS, engagement_db
+
+
+class Command(BaseCommand):
+    help = (
+        'Copies likes, follows and favorites from the tables left in the default database '
+        'into the engagement database. Rows already present are skipped, so it can be rerun.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows inserted per statement')
+        parser.add_argument(
+            '--delete-source',
+            action='store_true',
+            help='Empty the tables in the default database once everything is copied'
+        )
+
+    def handle(self, *args, **options):
+        target = engagement_db()
+        if target == 'default':
+            raise CommandError('No engagement database is configured; the tables are already in the default database')
+
+        models = [apps.get_model(label) for label in sorted(ENGAGEMENT_MODELS)]
+        source = connections['default']
+        for model in models:
+            table = source.ops.quote_name(model._meta.db_table)
+            columns = [field.column for field in model._meta.concrete_fields if not field.primary_key]
+            copied = 0
+            with source.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT {", ".join(source.ops.quote_name(column) for column in columns)} FROM {table} ORDER BY id'
+                )
+                while True:
+                    rows = cursor.fetchmany(options['batch_size'])
+                    if not rows:
+                        break
+                    model.objects.using(target).bulk_create(
+                        [model(**dict(zip(columns, row))) for row in rows],
+                        ignore_conflicts=True,
+                    )
+                    copied += len(rows)
+            self.stdout.write(f'{model._meta.label}: {copied} rows copied to {target}')
+
+        if options['delete_source']:
+            with source.cursor() as cursor:
+                for model in models:
+                    cursor.execute(f'DELETE FROM {source.ops.quote_name(model._meta.db_table)}')
+            self.stdout.write('Emptied the source tables in the default database')
+        self.stdout.write(self.style.SUCCESS('Engagement data copied'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from storyapp import notifications
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Delivers queued notification fan-outs. Run it with --interval as a worker next to the web '
+        'processes, which only queue them unless NOTIFICATION_FANOUT_IN_PROCESS is on; entries a crashed '
+        'worker claimed are taken over after NOTIFICATION_CLAIM_SECONDS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running and check the outbox every N seconds (default: drain once)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            delivered = notifications.drain()
+            if delivered or options['interval'] <= 0:
+                self.stdout.write(f'Delivered {delivered} fan-outs in {time.perf_counter() - started:.2f}s')
+            if options['interval'] <= 0:
+                break
+            time.sleep(options['interval'])
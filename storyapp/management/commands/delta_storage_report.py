@@ -0,0 +1,99 @@
+from django.core.management.base import BaseCommand, CommandError
+from storyapp import deltas
+from storyapp.models import Episode
+
+
+def _size(text):
+    return len(text.encode('utf-8')) if text else 0
+
+
+class Command(BaseCommand):
+    help = (
+        'Reports the space episode content takes with delta storage: bytes stored versus the full text, '
+        'how many episodes are diffs and how long the diff chains are. Can also estimate or apply the '
+        'savings for branched episodes that are still stored in full.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--estimate',
+            action='store_true',
+            help='Diff branched episodes stored in full against their parent to estimate further savings'
+        )
+        parser.add_argument(
+            '--compress',
+            action='store_true',
+            help='Rewrite branched episodes stored in full as diffs where allowed (needs EPISODE_DELTA_STORAGE)'
+        )
+
+    def handle(self, *args, **options):
+        if options['compress'] and not deltas.enabled():
+            raise CommandError('EPISODE_DELTA_STORAGE is off; enable it before compressing')
+
+        totals = {'episodes': 0, 'diffs': 0, 'branched_full': 0, 'stored': 0, 'text': 0}
+        depths = {}
+        candidates = {'count': 0, 'before': 0, 'after': 0}
+        compressed = 0
+        branched = []
+
+        episodes = Episode._base_manager.only(
+            'id', 'content', 'content_delta', 'delta_base', 'delta_depth', 'parent_episode'
+        ).order_by('id')
+        for episode in episodes.iterator(chunk_size=500):
+            text = deltas.body(episode)
+            totals['episodes'] += 1
+            totals['text'] += _size(text)
+            totals['stored'] += _size(episode.content) + _size(episode.content_delta)
+            depths[episode.delta_depth] = depths.get(episode.delta_depth, 0) + 1
+            if episode.content_delta is not None:
+                totals['diffs'] += 1
+                continue
+            if not episode.parent_episode_id:
+                continue
+            totals['branched_full'] += 1
+
+            if options['compress']:
+                branched.append(episode.pk)
+            elif options['estimate']:
+                parent = Episode._base_manager.only('content', 'content_delta', 'delta_base').get(
+                    pk=episode.parent_episode_id
+                )
+                delta = deltas.encode(deltas.body(parent), text)
+                if len(delta) <= len(text) * deltas.MAX_DELTA_RATIO:
+                    candidates['count'] += 1
+                    candidates['before'] += _size(text)
+                    candidates['after'] += _size(delta)
+
+        # Rewritten after the scan: SQLite gives no isolation between the
+        # iterator's cursor and writes to the same table on one connection
+        for pk in branched:
+            episode = episodes.get(pk=pk)
+            text = episode.content
+            deltas.compress(episode)
+            if episode.content_delta is None:
+                continue
+            episode.save(update_fields=['content', 'content_delta', 'delta_base', 'delta_depth'])
+            compressed += 1
+            totals['diffs'] += 1
+            totals['stored'] += _size(episode.content_delta) - _size(text)
+            depths[0] -= 1
+            depths[episode.delta_depth] = depths.get(episode.delta_depth, 0) + 1
+
+        self.stdout.write(f'Episodes:                  {totals["episodes"]}')
+        self.stdout.write(f'Stored as diffs:           {totals["diffs"]}')
+        self.stdout.write(f'Branched, stored in full:  {totals["branched_full"] - compressed}')
+        self.stdout.write(f'Full text:                 {totals["text"]:,} bytes')
+        self.stdout.write(f'Stored:                    {totals["stored"]:,} bytes')
+        if totals['text']:
+            saved = 1 - totals['stored'] / totals['text']
+            self.stdout.write(f'Saved by delta storage:    {totals["text"] - totals["stored"]:,} bytes ({saved:.1%})')
+        self.stdout.write('Diff chain depth:          ' + ', '.join(
+            f'{depth}: {count}' for depth, count in sorted(depths.items()) if count
+        ))
+        if options['compress']:
+            self.stdout.write(self.style.SUCCESS(f'Compressed {compressed} episodes'))
+        elif options['estimate'] and candidates['count']:
+            self.stdout.write(
+                f'Could compress {candidates["count"]} more episodes: '
+                f'{candidates["before"]:,} -> {candidates["after"]:,} bytes before snapshot limits'
+            )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from storyapp import writebehind
+
+
+class Command(BaseCommand):
+    help = (
+        'Writes the engagement changes left in the write-behind journals of processes that are no longer '
+        'running, then removes those journals. Running processes replay them on their own when they '
+        'start buffering; use this after shutting all workers down or before turning write-behind off.'
+    )
+
+    def handle(self, *args, **options):
+        replayed = writebehind.recover()
+        self.stdout.write(self.style.SUCCESS(f'Replayed {replayed} journals from {writebehind.journal_dir()}'))
@@ -1,35 +1,273 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from django.db.models import Max
 from accounts.models import Profile, Organization
-from storyapp.models import Story, Version, Episode, StoryReport, EpisodeReport
+from storyapp.models import Story, Version, Episode, StoryReport, EpisodeReport, Category, StoryInvite, summarize_content
+from storyapp import access
 from django.utils import timezone
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+from multiprocessing import Pool
 import random
-from django.core.files.uploadedfile import SimpleUploadedFile
-import os
-from faker import Faker
-import logging
-from django.db import transaction
+import time
 
-class Command(BaseCommand):
-    help = 'Populates the database with sample data'
+# Vocabulary for generated text. Faker is far too slow for millions of rows and
+# its output depends on the installed locale data, so text is built from this
+# fixed list instead.
+WORDS = (
+    'the', 'a', 'and', 'of', 'to', 'in', 'was', 'her', 'his', 'they', 'that', 'with',
+    'night', 'river', 'city', 'forest', 'stranger', 'letter', 'door', 'storm', 'light',
+    'shadow', 'voice', 'road', 'castle', 'garden', 'ship', 'window', 'machine', 'secret',
+    'winter', 'summer', 'morning', 'silence', 'fire', 'stone', 'glass', 'memory', 'promise',
+    'walked', 'whispered', 'remembered', 'opened', 'waited', 'fell', 'ran', 'found', 'lost',
+    'watched', 'followed', 'burned', 'listened', 'carried', 'turned', 'smiled', 'forgot',
+    'quiet', 'ancient', 'broken', 'golden', 'empty', 'distant', 'narrow', 'bright', 'cold',
+    'strange', 'heavy', 'gentle', 'hidden', 'restless', 'slowly', 'suddenly', 'never',
+    'again', 'before', 'after', 'beneath', 'beyond', 'across', 'toward', 'without', 'once',
+)
+CATEGORIES = (
+    'Fantasy', 'Science Fiction', 'Mystery', 'Romance', 'Horror',
+    'Adventure', 'Drama', 'Comedy', 'Historical', 'Thriller',
+)
+STORY_VISIBILITIES = (Story.PUBLIC, Story.PRIVATE, Story.QUARANTINED, Story.REPORTED)
+STORY_VISIBILITY_WEIGHTS = (85, 11, 2, 2)
+REPORT_STATUSES = ('pending', 'approved', 'rejected')
+REPORT_STATUS_WEIGHTS = (60, 25, 15)
+
+BRANCH_PROBABILITY = 0.3    # chance of each further branch being forked off a story
+DEEPEN_PROBABILITY = 0.6    # chance a branch forks the newest version rather than any
+MAX_VERSIONS = 25
+MAX_EPISODES_PER_VERSION = 60
+EPISODE_REPORT_RATE = 0.02
+STORY_REPORT_RATE = 0.01
+DELETED_EPISODE_RATE = 0.005
+RESUBMITTED_RATE = 0.2      # quarantined episodes their creator sent back for approval
+STORY_AGE_DAYS = 365
+
+
+def _heavy_tail(rng, alpha, cap):
+    """Pareto-distributed count starting at zero, capped at ``cap``."""
+    return max(0, min(cap, int(rng.paretovariate(alpha)) - 1))
+
+
+def _sentence(rng, low=6, high=16):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high))).capitalize() + '.'
+
+
+def _paragraphs(rng, words):
+    # Draw all the words in one call and cut them into sentences; calling
+    # rng.choices per sentence dominates generation time on large runs.
+    pool = rng.choices(WORDS, k=words)
+    paragraphs, position = [], 0
+    while position < words:
+        sentences = []
+        for _ in range(rng.randint(3, 7)):
+            length = rng.randint(6, 16)
+            if position < words:
+                sentences.append(' '.join(pool[position:position + length]).capitalize() + '.')
+            position += length
+        paragraphs.append(' '.join(sentences))
+    return paragraphs
+
+
+def _branch_of(rng, paragraphs):
+    """A branch is mostly its parent's text with a few paragraphs rewritten."""
+    branched = list(paragraphs)
+    for _ in range(rng.randint(1, 3)):
+        position = rng.randrange(len(branched))
+        branched[position] = ' '.join(_sentence(rng) for _ in range(rng.randint(3, 7)))
+    if rng.random() < 0.5:
+        branched.append(' '.join(_sentence(rng) for _ in range(rng.randint(3, 7))))
+    return branched
+
+
+def build_story(task):
+    """
+    Generate one story with its versions, episodes and engagement as plain data.
+
+    Everything is derived from ``(seed, index)`` alone, so the result does not
+    depend on which worker process builds it or in what order. Users are
+    referenced by index and timestamps are offsets in seconds from the story's
+    creation; the command maps both to real values on insert.
+    """
+    seed, index, user_count, episode_words = task
+    rng = random.Random(f'{seed}:story:{index}')
+    creator = rng.randrange(user_count)
+    others = user_count - 1
+
+    def pick_users(count):
+        picked = rng.sample(range(user_count), min(count + 1, user_count))
+        return [user for user in picked if user != creator][:count]
+
+    def reports(rate, cap):
+        if rng.random() >= rate or not others:
+            return []
+        return [
+            (reporter, rng.choices(REPORT_STATUSES, REPORT_STATUS_WEIGHTS)[0], _sentence(rng))
+            for reporter in pick_users(1 + _heavy_tail(rng, 1.5, cap - 1))
+        ]
+
+    def episode(number, paragraphs, parent, created):
+        episode_reports = reports(EPISODE_REPORT_RATE, 20)
+        if rng.random() < DELETED_EPISODE_RATE:
+            status = Episode.DELETED
+        elif any(report_status == 'pending' for _, report_status, _ in episode_reports):
+            # Mirrors EpisodeReport.save, which quarantines on the first pending report.
+            status = Episode.PENDING if rng.random() < RESUBMITTED_RATE else Episode.QUARANTINED
+        else:
+            status = Episode.PUBLIC
+        return {
+            'title': f'Episode {number}: {_sentence(rng, 3, 7)[:-1]}',
+            'paragraphs': paragraphs,
+            'parent': parent,
+            'created': created,
+            'status': status,
+            'likers': pick_users(_heavy_tail(rng, 2.0, others)),
+            'reports': episode_reports,
+        }
+
+    def episode_words_sample():
+        return max(20, int(rng.lognormvariate(0, 0.6) * episode_words))
+
+    def continue_version(episodes, created, count):
+        for _ in range(count):
+            created += rng.uniform(3600, 7 * 86400)
+            episodes.append(episode(len(episodes) + 1, _paragraphs(rng, episode_words_sample()), None, created))
+        return created
+
+    age = rng.uniform(0, STORY_AGE_DAYS * 86400)
+    root = []
+    latest = continue_version(root, 0.0, min(1 + int(rng.expovariate(1 / 5)), MAX_EPISODES_PER_VERSION))
+    versions = [root]
+    children = {}
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.fake = Faker()
-        self.logger = logging.getLogger(__name__)
+    while rng.random() < BRANCH_PROBABILITY and len(versions) < MAX_VERSIONS:
+        source = len(versions) - 1 if rng.random() < DEEPEN_PROBABILITY else rng.randrange(len(versions))
+        parent = (source, rng.randrange(len(versions[source])))
+        # EpisodeViewSet.branch attaches new branches to the newest episode in the chain.
+        while parent in children:
+            parent = children[parent]
+        children[parent] = (len(versions), 0)
+        parent_episode = versions[parent[0]][parent[1]]
+        created = max(latest, parent_episode['created']) + rng.uniform(3600, 14 * 86400)
+        branch = [episode(1, _branch_of(rng, parent_episode['paragraphs']), parent, created)]
+        latest = max(latest, continue_version(branch, created, int(rng.expovariate(1 / 2))))
+        versions.append(branch)
+
+    # Same rule as storyapp.signals.check_episode_reports.
+    visibility = rng.choices(STORY_VISIBILITIES, STORY_VISIBILITY_WEIGHTS)[0]
+    if any(len(ep['reports']) >= 3 for version in versions for ep in version):
+        visibility = Story.QUARANTINED
+
+    invites = []
+    if visibility == Story.PRIVATE:
+        for invited in pick_users(rng.randint(0, 2)):
+            answer = rng.random()
+            invites.append((invited, answer < 0.6, 0.6 <= answer < 0.7))
+
+    for version in versions:
+        for ep in version:
+            ep['content'] = '\n\n'.join(ep.pop('paragraphs'))
+
+    return {
+        'title': f'{_sentence(rng, 2, 5)[:-1]} - Story {index + 1}',
+        'description': ' '.join(_sentence(rng) for _ in range(5)),
+        'creator': creator,
+        'visibility': visibility,
+        'category': rng.randrange(len(CATEGORIES)) if rng.random() < 0.85 else None,
+        'age': age,
+        'likers': pick_users(_heavy_tail(rng, 1.16, others)),
+        'followers': pick_users(_heavy_tail(rng, 1.5, others)),
+        'reports': reports(STORY_REPORT_RATE, 5),
+        'invites': invites,
+        'versions': versions,
+    }
+
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+@contextmanager
+def _explicit_timestamps(*models):
+    """
+    Let bulk_create keep the generated timestamps.
+
+    auto_now/auto_now_add fields overwrite whatever is assigned on insert; the
+    flags are switched off for the duration of the load and restored after.
+    """
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    flags = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in flags:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        'Populates the database with reproducible sample data. '
+        'Use --scale to grow the dataset and --seed to vary it.'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
             '--users',
             type=int,
             default=10,
-            help='Number of regular users to create'
+            help='Number of regular users to create at scale 1'
         )
         parser.add_argument(
             '--stories',
             type=int,
             default=15,
-            help='Number of stories to create'
+            help='Number of stories to create at scale 1'
+        )
+        parser.add_argument(
+            '--scale',
+            type=float,
+            default=1.0,
+            help='Multiplier applied to --users and --stories (e.g. 20000 for ~1M episodes)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed; the same seed and arguments always produce the same data'
+        )
+        parser.add_argument(
+            '--episode-words',
+            type=int,
+            default=200,
+            help='Median episode length in words'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of stories generated and written per transaction'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes generating story content'
         )
         parser.add_argument(
             '--clear',
@@ -37,282 +275,316 @@ class Command(BaseCommand):
             help='Clear existing data before populating'
         )
 
-    @transaction.atomic
     def handle(self, *args, **options):
-        self.stdout.write('Populating database...')
-        
-        # Clear existing data if requested
+        if options['scale'] <= 0:
+            raise CommandError('--scale must be positive')
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be at least 1')
+
+        self.seed = options['seed']
+        self.verbosity = options['verbosity']
+        self.batch_size = options['batch_size']
+        # Anchor generated timestamps to the start of the day so reruns on the
+        # same day produce identical rows.
+        self.now = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        started = time.monotonic()
+        user_count = max(1, round(options['users'] * options['scale']))
+        story_count = max(1, round(options['stories'] * options['scale']))
+
+        self.stdout.write(f'Populating database: {user_count} users, {story_count} stories (seed {self.seed})...')
+
         if options['clear']:
             self._clear_data()
-            
-        # Create users
-        admin_user = self._create_admin_user()
-        subadmins = self._create_subadmin_users()
-        users = self._create_regular_users(options['users'], subadmins)
-        
-        # Create organizations
-        organizations = self._create_organizations(subadmins, admin_user, users)
-        
-        # Create stories and related content
-        stories = self._create_stories(options['stories'], users, admin_user)
-        self._create_versions_and_episodes(stories)
-        self._create_reports(stories, users)
-        self._create_user_relationships(users)
-        
-        self.stdout.write(self.style.SUCCESS('Database population completed!'))
+
+        with transaction.atomic():
+            admin_user, subadmins, users = self._create_users(user_count)
+            self._create_organizations(subadmins or [admin_user], users)
+            categories = self._create_categories()
+
+        totals = self._create_stories(story_count, users, categories, options)
+
+        with transaction.atomic():
+            self._create_user_relationships(users, totals.pop('story_ids'))
+        self._reset_sequences()
+        # bulk_create skips the signals that keep story access grants in step
+        access.rebuild()
+
+        summary = ', '.join(f'{count} {name}' for name, count in totals.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Database population completed in {time.monotonic() - started:.1f}s: {summary}'
+        ))
 
     def _clear_data(self):
-        """Clear existing data before populating"""
+        """Clear existing story content and everything that references it"""
         self.stdout.write('Clearing existing data...')
-        # Only delete data created by this script, not all data
-        EpisodeReport.objects.all().delete()
-        StoryReport.objects.all().delete()
-        Episode.objects.all().delete()
-        Version.objects.all().delete()
-        Story.objects.all().delete()
-        # Don't delete users or profiles as they might be created by other means
+        # Only delete story content, not users or profiles as they might be
+        # created by other means. Rows are removed with one DELETE per table,
+        # dependents first, so the cascade collector never loads them. The
+        # engagement tables live in their own database, which needs its own
+        # transaction.
+        aliases = {model: router.db_for_write(model) for model in self._content_models()}
+        with ExitStack() as stack:
+            for alias in dict.fromkeys(aliases.values()):
+                stack.enter_context(transaction.atomic(using=alias))
+            for model, alias in aliases.items():
+                connection = connections[alias]
+                with connection.cursor() as cursor:
+                    cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)}')
         self.stdout.write(self.style.SUCCESS('Data cleared successfully'))
 
-    def _create_admin_user(self):
-        """Create admin user if it doesn't exist"""
-        if not User.objects.filter(username='admin').exists():
-            admin_user = User.objects.create_superuser(
-                username='admin',
-                email='admin@example.com',
-                password='adminpassword'
-            )
-            admin_user.profile.role = 'admin'
-            admin_user.profile.bio = self.fake.paragraph()
-            admin_user.profile.save()
-            self.stdout.write(self.style.SUCCESS(f'Created admin user: {admin_user.username}'))
-        else:
-            admin_user = User.objects.get(username='admin')
-            self.stdout.write('Admin user already exists')
-        return admin_user
-
-    def _create_subadmin_users(self, count=2):
-        """Create subadmin users"""
-        subadmins = []
-        for i in range(1, count + 1):
-            username = f'subadmin{i}'
-            if not User.objects.filter(username=username).exists():
-                subadmin = User.objects.create_user(
-                    username=username,
-                    email=f'subadmin{i}@example.com',
-                    password='subadminpassword'
-                )
-                subadmin.profile.role = 'subadmin'
-                subadmin.profile.bio = self.fake.paragraph()
-                subadmin.profile.save()
-                subadmins.append(subadmin)
-                self.stdout.write(self.style.SUCCESS(f'Created subadmin: {subadmin.username}'))
-            else:
-                subadmins.append(User.objects.get(username=username))
-                self.stdout.write(f'Subadmin {username} already exists')
-        return subadmins
-
-    def _create_regular_users(self, count, subadmins):
-        """Create regular users"""
-        users = []
-        for i in range(1, count + 1):
-            username = f'user{i}'
-            if not User.objects.filter(username=username).exists():
-                user = User.objects.create_user(
-                    username=username,
-                    email=f'user{i}@example.com',
-                    password='userpassword'
-                )
-                user.profile.bio = self.fake.paragraph()
-                
-                # Assign some users to subadmins
-                if i % 3 == 0 and subadmins:
-                    user.profile.assigned_to = random.choice(subadmins)
-                    user.profile.save()
-                    self.stdout.write(f'Assigned {user.username} to {user.profile.assigned_to.username}')
-                
-                users.append(user)
-                self.stdout.write(self.style.SUCCESS(f'Created user: {user.username}'))
-            else:
-                users.append(User.objects.get(username=username))
-                self.stdout.write(f'User {username} already exists')
-        return users
-
-    def _create_organizations(self, subadmins, admin_user, users, count=3):
+    def _content_models(self):
+        ordered, seen = [], set()
+
+        def visit(model):
+            if model in seen:
+                return
+            seen.add(model)
+            # Hidden relations too: related_name='+' ones such as story
+            # access grants and notifications hold foreign keys all the same
+            for related in model._meta.get_fields(include_hidden=True):
+                if related.auto_created and not related.concrete:
+                    visit(related.through if related.many_to_many else related.related_model)
+            for field in model._meta.local_many_to_many:
+                visit(field.remote_field.through)
+            ordered.append(model)
+
+        for model in (Story, Version, Episode):
+            visit(model)
+        return ordered
+
+    def _next_id(self, model):
+        # Past hidden and tombstoned rows too, which default managers leave out
+        return (model._base_manager.aggregate(top=Max('pk'))['top'] or 0) + 1
+
+    def _link(self, field, pairs):
+        """Bulk insert (source_id, target_id) rows into a many-to-many through table"""
+        through = field.remote_field.through
+        source, target = f'{field.m2m_field_name()}_id', f'{field.m2m_reverse_field_name()}_id'
+        through.objects.bulk_create(
+            [through(**{source: a, target: b}) for a, b in pairs],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+        return len(pairs)
+
+    def _create_users(self, count):
+        """Create the admin, subadmin and regular users together with their profiles"""
+        rng = random.Random(f'{self.seed}:users')
+        subadmin_count = max(2, count // 50)
+        hashes = {
+            role: make_password(f'{role}password', salt='populatedb')
+            for role in ('admin', 'subadmin', 'user')
+        }
+        specs = [('admin', 'admin')]
+        specs += [(f'subadmin{i}', 'subadmin') for i in range(1, subadmin_count + 1)]
+        specs += [(f'user{i}', 'user') for i in range(1, count + 1)]
+
+        existing = dict(User.objects.values_list('username', 'id'))
+        profiles = dict(Profile.objects.values_list('user_id', 'id'))
+        next_user, next_profile = self._next_id(User), self._next_id(Profile)
+        new_users, ids = [], {}
+        for username, role in specs:
+            if username in existing:
+                ids[username] = existing[username]
+                continue
+            joined = self.now - timedelta(seconds=rng.uniform(0, 120 * 86400))
+            last_login = None
+            if rng.random() < 0.7:
+                last_login = max(joined, self.now - timedelta(seconds=rng.uniform(0, 45 * 86400)))
+            ids[username] = next_user
+            new_users.append(User(
+                id=next_user,
+                username=username,
+                email=f'{username}@example.com',
+                password=hashes[role],
+                is_staff=role == 'admin',
+                is_superuser=role == 'admin',
+                date_joined=joined,
+                last_login=last_login,
+            ))
+            next_user += 1
+        User.objects.bulk_create(new_users, batch_size=500)
+
+        # bulk_create skips the post_save signal that normally creates profiles,
+        # so roles and subadmin assignments are written here in one pass.
+        subadmin_ids = [ids[username] for username, role in specs if role == 'subadmin']
+        new_profiles = []
+        for number, (username, role) in enumerate(specs):
+            user_id = ids[username]
+            if user_id in profiles:
+                continue
+            assigned_to = None
+            if role == 'user' and number % 3 == 0:
+                assigned_to = rng.choice(subadmin_ids)
+            profiles[user_id] = next_profile
+            new_profiles.append(Profile(
+                id=next_profile,
+                user_id=user_id,
+                role=role,
+                bio=_sentence(rng),
+                assigned_to_id=assigned_to,
+            ))
+            next_profile += 1
+        Profile.objects.bulk_create(new_profiles, batch_size=500)
+
+        self.profile_ids = profiles
+        self._log(f'Created {len(new_users)} users and {len(new_profiles)} profiles '
+                  f'({len(specs) - len(new_users)} already existed)')
+        return ids['admin'], subadmin_ids, [ids[username] for username, role in specs if role == 'user']
+
+    def _create_organizations(self, subadmins, users):
         """Create organizations and add members"""
-        organizations = []
-        for i in range(1, count + 1):
-            org_name = f'Organization {i}'
-            if not Organization.objects.filter(name=org_name).exists():
-                org = Organization.objects.create(
-                    name=org_name,
-                    description=self.fake.paragraph(),
-                    created_by=random.choice(subadmins) if subadmins else admin_user
-                )
-                
-                # Add members to organization
-                member_count = min(len(users), random.randint(3, 6))
-                selected_members = random.sample(users, member_count) if users else []
-                for member in selected_members:
-                    org.members.add(member)
-                
-                organizations.append(org)
-                self.stdout.write(self.style.SUCCESS(f'Created organization: {org.name} with {member_count} members'))
-            else:
-                organizations.append(Organization.objects.get(name=org_name))
-                self.stdout.write(f'Organization {org_name} already exists')
-        return organizations
-
-    def _create_stories(self, count, users, admin_user):
-        """Create stories with random attributes"""
-        stories = []
-        visibility_choices = ['public', 'private', 'followers']
-        
-        for i in range(1, count + 1):
-            title = f'{self.fake.catch_phrase()} - Story {i}'
-            if not Story.objects.filter(title=title).exists():
-                creator = random.choice(users) if users else admin_user
-                
-                story = Story.objects.create(
-                    title=title,
-                    description=self.fake.paragraph(nb_sentences=5),
-                    creator=creator,
-                    visibility=random.choice(visibility_choices)
-                )
-                
-                # Add likes and followers with more variability
-                like_count = random.randint(0, min(8, len(users)))
-                if users and like_count > 0:
-                    likers = random.sample(users, like_count)
-                    for liker in likers:
-                        if liker != creator:  # Avoid self-liking
-                            story.liked_by.add(liker)
-                
-                follower_count = random.randint(0, min(5, len(users)))
-                if users and follower_count > 0:
-                    followers = random.sample(users, follower_count)
-                    for follower in followers:
-                        if follower != creator:  # Avoid self-following
-                            story.followed_by.add(follower)
-                
-                stories.append(story)
-                self.stdout.write(self.style.SUCCESS(
-                    f'Created story: {story.title} with {like_count} likes and {follower_count} followers'
-                ))
-            else:
-                stories.append(Story.objects.get(title=title))
-                self.stdout.write(f'Story with title similar to {title} already exists')
-        return stories
-
-    def _create_versions_and_episodes(self, stories):
-        """Create versions and episodes for stories"""
-        for story in stories:
-            # Create at least one version for each story
-            if not Version.objects.filter(story=story).exists():
-                version = Version.objects.create(
-                    story=story,
-                    version_number='00001'  # First version
-                )
-                self.stdout.write(self.style.SUCCESS(f'Created version for story: {story.title}'))
-                
-                # Create episodes for this version with more realistic content
-                num_episodes = random.randint(1, 5)
-                for i in range(1, num_episodes + 1):
-                    episode = Episode.objects.create(
-                        version=version,
-                        title=f'Episode {i}: {self.fake.sentence()}',
-                        content=self.fake.paragraphs(nb=random.randint(3, 8)),
-                        creator=story.creator
-                    )
-                    self.stdout.write(self.style.SUCCESS(f'Created episode: {episode.title}'))
-                
-                # Create a second version for some stories
-                if random.random() > 0.7:
-                    version2 = Version.objects.create(
-                        story=story,
-                        version_number='00002'  # Second version
+        rng = random.Random(f'{self.seed}:organizations')
+        existing = set(Organization.objects.values_list('name', flat=True))
+        members = Organization.members.field
+        created = 0
+        for i in range(1, max(3, len(users) // 200) + 1):
+            name = f'Organization {i}'
+            if name in existing:
+                continue
+            org = Organization.objects.create(
+                name=name,
+                description=_sentence(rng),
+                created_by_id=rng.choice(subadmins),
+            )
+            picked = rng.sample(users, min(len(users), rng.randint(3, 50)))
+            self._link(members, [(org.id, user_id) for user_id in picked])
+            created += 1
+        self._log(f'Created {created} organizations')
+
+    def _create_categories(self):
+        categories = []
+        for name in CATEGORIES:
+            category, _ = Category.objects.get_or_create(name=name)
+            categories.append(category.id)
+        return categories
+
+    def _create_stories(self, count, users, categories, options):
+        """Generate stories (optionally in worker processes) and write them in batches"""
+        self.ids = {model: self._next_id(model) for model in (Story, Version, Episode, StoryReport, EpisodeReport, StoryInvite)}
+        totals = dict.fromkeys(('stories', 'versions', 'episodes', 'likes', 'follows', 'reports', 'invites'), 0)
+        totals['story_ids'] = []
+        tasks = ((self.seed, index, len(users), options['episode_words']) for index in range(count))
+
+        pool = Pool(options['workers']) if options['workers'] > 1 else None
+        try:
+            generated = pool.imap(build_story, tasks, chunksize=16) if pool else map(build_story, tasks)
+            for chunk in _chunked(generated, self.batch_size):
+                with transaction.atomic(), _explicit_timestamps(Story, Version, Episode, StoryReport, EpisodeReport, StoryInvite):
+                    self._insert_stories(chunk, users, categories, totals)
+                self._log(f'  {totals["stories"]}/{count} stories, {totals["episodes"]} episodes', level=2)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+        return totals
+
+    def _insert_stories(self, chunk, users, categories, totals):
+        objects = {model: [] for model in self.ids}
+        story_likes, story_follows, episode_likes = [], [], []
+
+        def new(model, **fields):
+            obj = model(id=self.ids[model], **fields)
+            self.ids[model] += 1
+            objects[model].append(obj)
+            return obj
+
+        for plan in chunk:
+            creator = users[plan['creator']]
+            created = self.now - timedelta(seconds=plan['age'])
+            story = new(
+                Story,
+                title=plan['title'],
+                description=plan['description'],
+                creator_id=creator,
+                visibility=plan['visibility'],
+                category_id=categories[plan['category']] if plan['category'] is not None else None,
+                created_at=created,
+                updated_at=created,
+            )
+            totals['story_ids'].append(story.id)
+            story_likes += [(story.id, users[user]) for user in plan['likers']]
+            story_follows += [(story.id, users[user]) for user in plan['followers']]
+            for reporter, status, reason in plan['reports']:
+                new(StoryReport, story_id=story.id, reported_by_id=users[reporter], reason=reason,
+                    status=status, created_at=created)
+            for invited, accepted, rejected in plan['invites']:
+                email = f'user{invited + 1}@example.com'
+                new(StoryInvite, story_id=story.id, invited_by_id=creator, invited_email=email,
+                    normalized_email=StoryInvite.normalize_email(email), invited_user_id=users[invited],
+                    accepted=accepted, rejected=rejected, created_at=created)
+
+            episode_ids = []
+            for number, version_plan in enumerate(plan['versions'], start=1):
+                first = created + timedelta(seconds=version_plan[0]['created'])
+                version = new(Version, story_id=story.id, version_number=str(number).zfill(5), created_at=first)
+                ids = []
+                for ep in version_plan:
+                    ep_created = created + timedelta(seconds=ep['created'])
+                    parent = episode_ids[ep['parent'][0]][ep['parent'][1]] if ep['parent'] else None
+                    # bulk_create bypasses Episode.save(), which fills these in
+                    excerpt, word_count = summarize_content(ep['content'])
+                    episode = new(
+                        Episode,
+                        title=ep['title'],
+                        content=ep['content'],
+                        excerpt=excerpt,
+                        word_count=word_count,
+                        version_id=version.id,
+                        parent_episode_id=parent,
+                        creator_id=creator,
+                        status=ep['status'],
+                        created_at=ep_created,
                     )
-                    self.stdout.write(self.style.SUCCESS(f'Created second version for story: {story.title}'))
-                    
-                    # Create episodes for second version with parent relationship
-                    first_version_episodes = Episode.objects.filter(version=version)
-                    num_episodes = min(len(first_version_episodes), random.randint(1, 3))
-                    
-                    for i in range(num_episodes):
-                        parent_episode = first_version_episodes[i] if i < len(first_version_episodes) else None
-                        
-                        episode = Episode.objects.create(
-                            version=version2,
-                            title=f'V2 Episode {i+1}: {self.fake.sentence()}',
-                            content=self.fake.paragraphs(nb=random.randint(3, 8)),
-                            creator=story.creator,
-                            parent_episode=parent_episode
-                        )
-                        self.stdout.write(self.style.SUCCESS(
-                            f'Created episode for version 2: {episode.title} with parent: {parent_episode.title if parent_episode else "None"}'
-                        ))
-            else:
-                self.stdout.write(f'Versions already exist for story: {story.title}')
-
-    def _create_reports(self, stories, users):
-        """Create story and episode reports"""
-        # Create some story reports
-        if stories and users:
-            for i in range(min(5, len(stories))):
-                story = random.choice(stories)
-                available_reporters = [user for user in users if user != story.creator]
-                
-                if available_reporters:
-                    reporter = random.choice(available_reporters)
-                    
-                    if not StoryReport.objects.filter(story=story, reported_by=reporter).exists():
-                        report = StoryReport.objects.create(
-                            story=story,
-                            reported_by=reporter,
-                            reason=self.fake.paragraph(),
-                            status=random.choice(['pending', 'approved', 'rejected'])
-                        )
-                        self.stdout.write(self.style.SUCCESS(
-                            f'Created story report by {reporter.username} for "{story.title}" with status: {report.status}'
-                        ))
-        
-        # Create some episode reports
-        episodes = Episode.objects.all()
-        if episodes and users:
-            for i in range(min(5, len(episodes))):
-                episode = random.choice(episodes)
-                available_reporters = [user for user in users if user != episode.creator]
-                
-                if available_reporters:
-                    reporter = random.choice(available_reporters)
-                    
-                    if not EpisodeReport.objects.filter(episode=episode, reported_by=reporter).exists():
-                        report = EpisodeReport.objects.create(
-                            episode=episode,
-                            reported_by=reporter,
-                            reason=self.fake.paragraph(),
-                            status=random.choice(['pending', 'approved', 'rejected'])
-                        )
-                        self.stdout.write(self.style.SUCCESS(
-                            f'Created episode report by {reporter.username} for "{episode.title}" with status: {report.status}'
-                        ))
-                        
-                        # Check if this triggered a status change
-                        if episode.status == Episode.QUARANTINED:
-                            self.stdout.write(self.style.WARNING(
-                                f'Episode "{episode.title}" has been quarantined due to multiple reports'
-                            ))
-
-    def _create_user_relationships(self, users):
-        """Create user relationships (followers)"""
-        if users:
-            for user in users:
-                # Each user follows 1-3 other users
-                available_users = [u for u in users if u != user and u not in user.profile.following.all()]
-                
-                if available_users:
-                    follow_count = min(len(available_users), random.randint(1, 3))
-                    users_to_follow = random.sample(available_users, follow_count)
-                    
-                    for user_to_follow in users_to_follow:
-                        user.profile.following.add(user_to_follow)
-                        self.stdout.write(f'{user.username} is now following {user_to_follow.username}')
\ No newline at end of file
+                    ids.append(episode.id)
+                    episode_likes += [(episode.id, users[user]) for user in ep['likers']]
+                    for reporter, status, reason in ep['reports']:
+                        new(EpisodeReport, episode_id=episode.id, reported_by_id=users[reporter], reason=reason,
+                            status=status, created_at=ep_created)
+                episode_ids.append(ids)
+
+        # Parents before children so foreign keys always point at existing rows.
+        for model in (Story, Version, Episode, StoryReport, EpisodeReport, StoryInvite):
+            model.objects.bulk_create(objects[model], batch_size=500)
+        totals['stories'] += len(objects[Story])
+        totals['versions'] += len(objects[Version])
+        totals['episodes'] += len(objects[Episode])
+        totals['reports'] += len(objects[StoryReport]) + len(objects[EpisodeReport])
+        totals['invites'] += len(objects[StoryInvite])
+        totals['likes'] += self._link(Story.liked_by.field, story_likes)
+        totals['likes'] += self._link(Episode.liked_by.field, episode_likes)
+        totals['follows'] += self._link(Story.followed_by.field, story_follows)
+
+    def _create_user_relationships(self, users, story_ids):
+        """Create user follows and favorite stories"""
+        following, favorites = [], []
+        for number, user_id in enumerate(users):
+            rng = random.Random(f'{self.seed}:user:{number}')
+            profile_id = self.profile_ids[user_id]
+            if len(users) > 1:
+                for other in rng.sample(users, min(len(users), 2 + _heavy_tail(rng, 2.0, 20))):
+                    if other != user_id:
+                        following.append((profile_id, other))
+            if story_ids:
+                for story_id in rng.sample(story_ids, min(len(story_ids), _heavy_tail(rng, 1.8, 10))):
+                    favorites.append((profile_id, story_id))
+        self._link(Profile.following.field, following)
+        self._link(Profile.favorite_stories.field, favorites)
+        self._log(f'Created {len(following)} user follows and {len(favorites)} favorites')
+
+    def _reset_sequences(self):
+        """Rows were inserted with explicit ids; bring database sequences in line"""
+        models = [User, Profile, Organization, Category, *self.ids]
+        for alias in {router.db_for_write(model) for model in models}:
+            connection = connections[alias]
+            statements = connection.ops.sequence_reset_sql(
+                no_style(), [model for model in models if router.db_for_write(model) == alias]
+            )
+            if statements:
+                with connection.cursor() as cursor:
+                    for sql in statements:
+                        cursor.execute(sql)
+
+    def _log(self, message, level=1):
+        if self.verbosity >= level:
+            self.stdout.write(message)
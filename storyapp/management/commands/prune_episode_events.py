@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from storyapp import events
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes episode events older than EPISODE_EVENT_RETENTION_DAYS. Clients reconnecting to the '
+        'event stream with an older Last-Event-ID simply resume from the oldest event kept.'
+    )
+
+    def handle(self, *args, **options):
+        deleted = events.prune()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} episode events'))
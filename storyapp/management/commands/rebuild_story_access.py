@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from storyapp import access
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the story access grants (creators, accepted invites, managing subadmins) and fixes '
+        'any row that is missing or stale. With --check, only reports them and fails if there are any.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Report differences without changing anything')
+
+    def handle(self, *args, **options):
+        missing, stale = access.rebuild(dry_run=options['check'])
+        if options['check']:
+            if missing or stale:
+                raise CommandError(f'Story access is out of date: {missing} grants missing, {stale} stale')
+            self.stdout.write(self.style.SUCCESS('Story access is consistent'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Added {missing} story access grants, removed {stale}'))
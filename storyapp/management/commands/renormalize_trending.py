@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from storyapp import trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves the trending epoch to now: rescales every stored score with one UPDATE and drops stories '
+        'whose score has decayed away. Rankings do not change. Run it about once a day.'
+    )
+
+    def handle(self, *args, **options):
+        rescaled, dropped = trending.renormalize()
+        self.stdout.write(self.style.SUCCESS(f'Rescaled {rescaled} trending scores, dropped {dropped}'))
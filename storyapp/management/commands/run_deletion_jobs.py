@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from storyapp import deletion
+from storyapp.models import DeletionJob
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes tombstoned stories, users and organizations chunk by chunk. Run it with --interval as a '
+        'worker next to the web processes, which only queue the jobs unless DELETION_IN_PROCESS is on; jobs '
+        'a crashed worker claimed are taken over after DELETION_CLAIM_SECONDS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running and check for jobs every N seconds (default: run pending jobs once)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            finished = deletion.drain()
+            if finished or options['interval'] <= 0:
+                self.stdout.write(f'Finished {finished} deletion jobs in {time.perf_counter() - started:.2f}s')
+                for job in DeletionJob.objects.filter(finished_at__isnull=True).order_by('id'):
+                    self.stdout.write(
+                        f'  {job.kind} {job.object_id} ({job.label}): {job.status}, '
+                        f'{job.deleted_rows} rows deleted{", " + job.error if job.error else ""}'
+                    )
+            if options['interval'] <= 0:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+import os
+import sqlite3
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Refreshes a read replica file from the primary SQLite database with the online backup API. '
+        'The copy is written next to the replica and swapped in atomically, so readers never see a partial file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='replica', help='Replica alias to refresh')
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running and refresh every N seconds (default: refresh once)'
+        )
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias not in getattr(settings, 'READ_REPLICAS', []):
+            raise CommandError(f'{alias!r} is not listed in READ_REPLICAS')
+        source = str(settings.DATABASES['default']['NAME'])
+        target = str(settings.DATABASES[alias]['NAME'])
+        if os.path.abspath(source) == os.path.abspath(target):
+            raise CommandError(f'{alias!r} opens the primary file read-only; there is nothing to sync')
+
+        while True:
+            started = time.perf_counter()
+            self._copy(source, target)
+            self.stdout.write(f'Refreshed {target} in {time.perf_counter() - started:.2f}s')
+            if options['interval'] <= 0:
+                break
+            time.sleep(options['interval'])
+
+    def _copy(self, source, target):
+        tmp_path = f'{target}.tmp'
+        primary = sqlite3.connect(source)
+        try:
+            copy = sqlite3.connect(tmp_path)
+            try:
+                primary.backup(copy)
+                # Replicas are opened with mode=ro, which cannot create the
+                # -wal/-shm files a WAL database needs.
+                copy.execute('PRAGMA journal_mode = DELETE')
+            finally:
+                copy.close()
+        finally:
+            primary.close()
+        os.replace(tmp_path, target)
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storyapp', '0017_storyinvite_rejected'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # The through models reuse the tables of the auto-created many-to-many
+    # fields. story_project.routers.EngagementRouter only lets CreateModel run
+    # on the engagement database; on the default database the existing tables
+    # are left in place (copy_engagement_data moves their rows).
+    operations = [
+        migrations.CreateModel(
+            name='EpisodeLike',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('episode', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='storyapp.episode')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'storyapp_episode_liked_by',
+                'unique_together': {('episode', 'user')},
+            },
+        ),
+        # The tables already exist; only the model state gains the through model.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='episode',
+                    name='liked_by',
+                    field=models.ManyToManyField(blank=True, related_name='liked_episodes', through='storyapp.EpisodeLike', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StoryFollow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('story', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='storyapp.story')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'storyapp_story_followed_by',
+                'unique_together': {('story', 'user')},
+            },
+        ),
+        # The tables already exist; only the model state gains the through model.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='story',
+                    name='followed_by',
+                    field=models.ManyToManyField(blank=True, related_name='followed_stories', through='storyapp.StoryFollow', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StoryLike',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('story', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='storyapp.story')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'storyapp_story_liked_by',
+                'unique_together': {('story', 'user')},
+            },
+        ),
+        # The tables already exist; only the model state gains the through model.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='story',
+                    name='liked_by',
+                    field=models.ManyToManyField(blank=True, related_name='liked_stories', through='storyapp.StoryLike', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:24
+
+from django.db import migrations, models
+
+EXCERPT_LENGTH = 280
+
+
+def summarize_content(content):
+    # Frozen copy of storyapp.models.summarize_content
+    words = content.split()
+    excerpt = ' '.join(words[:EXCERPT_LENGTH])
+    if len(excerpt) > EXCERPT_LENGTH:
+        excerpt = excerpt[:EXCERPT_LENGTH].rsplit(' ', 1)[0] + '\u2026'
+    return excerpt, len(words)
+
+
+def backfill_summaries(apps, schema_editor):
+    Episode = apps.get_model('storyapp', 'Episode')
+    episodes = Episode.objects.using(schema_editor.connection.alias).only('id', 'content').order_by('id')
+    batch = []
+    for episode in episodes.iterator(chunk_size=500):
+        episode.excerpt, episode.word_count = summarize_content(episode.content)
+        batch.append(episode)
+        if len(batch) == 500:
+            Episode.objects.using(schema_editor.connection.alias).bulk_update(batch, ['excerpt', 'word_count'])
+            batch = []
+    if batch:
+        Episode.objects.using(schema_editor.connection.alias).bulk_update(batch, ['excerpt', 'word_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storyapp', '0018_engagement_through_models'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='episode',
+            name='excerpt',
+            field=models.CharField(blank=True, default='', max_length=281),
+        ),
+        migrations.AddField(
+            model_name='episode',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storyapp', '0019_episode_excerpt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='episode',
+            name='content_delta',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='episode',
+            name='delta_base',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='delta_dependents', to='storyapp.episode'),
+        ),
+        migrations.AddField(
+            model_name='episode',
+            name='delta_depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
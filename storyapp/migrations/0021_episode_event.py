@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storyapp', '0020_episode_delta_storage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EpisodeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('episode', 'New episode'), ('branch', 'New branch'), ('status', 'Status change')], max_length=10)),
+                ('title', models.CharField(max_length=200)),
+                ('status', models.CharField(choices=[('public', 'Public'), ('private', 'Private'), ('quarantined', 'Quarantined'), ('reported', 'Reported'), ('pending', 'Pending'), ('deleted', 'Deleted')], max_length=15)),
+                ('previous_status', models.CharField(blank=True, choices=[('public', 'Public'), ('private', 'Private'), ('quarantined', 'Quarantined'), ('reported', 'Reported'), ('pending', 'Pending'), ('deleted', 'Deleted')], max_length=15)),
+                ('public_story', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('creator', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='episode_events', to=settings.AUTH_USER_MODEL)),
+                ('episode', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='storyapp.episode')),
+                ('story', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='episode_events', to='storyapp.story')),
+                ('version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='episode_events', to='storyapp.version')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['story', 'id'], name='episodeevent_story_id'), models.Index(fields=['creator', 'id'], name='episodeevent_creator_id')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:43
+
+import time
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_state(apps, schema_editor):
+    TrendingState = apps.get_model('storyapp', 'TrendingState')
+    TrendingState.objects.using(schema_editor.connection.alias).get_or_create(pk=1, defaults={'epoch': time.time()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storyapp', '0022_notifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('epoch', models.FloatField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StoryTrend',
+            fields=[
+                ('story', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend', serialize=False, to='storyapp.story')),
+                ('score', models.FloatField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='storyapp.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-score'], name='storytrend_score'), models.Index(fields=['category', '-score'], name='storytrend_category_score')],
+            },
+        ),
+        migrations.RunPython(create_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storyapp', '0023_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedStory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='storyapp.story')),
+                ('story', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='storyapp.story')),
+            ],
+            options={
+                'unique_together': {('story', 'rank')},
+            },
+        ),
+    ]
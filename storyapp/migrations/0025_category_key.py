@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-19 02:10
+
+from django.db import migrations, models
+
+
+def fill_keys(apps, schema_editor):
+    """
+    Sets every category's key. Names that only differ in case or spacing
+    get the same key; those categories are merged into the oldest one.
+    """
+    alias = schema_editor.connection.alias
+    Category = apps.get_model('storyapp', 'Category')
+    Story = apps.get_model('storyapp', 'Story')
+    StoryTrend = apps.get_model('storyapp', 'StoryTrend')
+    kept = {}
+    for category in Category.objects.using(alias).order_by('id'):
+        key = ' '.join(category.name.split()).casefold()
+        if key in kept:
+            Story.objects.using(alias).filter(category_id=category.pk).update(category_id=kept[key])
+            StoryTrend.objects.using(alias).filter(category_id=category.pk).update(category_id=kept[key])
+            category.delete()
+            continue
+        kept[key] = category.pk
+        category.key = key
+        category.save(update_fields=['key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storyapp', '0024_related_stories'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='key',
+            field=models.CharField(editable=False, max_length=100, null=True),
+        ),
+        migrations.RunPython(fill_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='category',
+            name='key',
+            field=models.CharField(editable=False, max_length=100, unique=True),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def grant_existing(apps, schema_editor):
+    """The grants storyapp.access would compute, written once for existing stories"""
+    alias = schema_editor.connection.alias
+    Story = apps.get_model('storyapp', 'Story')
+    StoryInvite = apps.get_model('storyapp', 'StoryInvite')
+    StoryAccess = apps.get_model('storyapp', 'StoryAccess')
+    Profile = apps.get_model('accounts', 'Profile')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    creators = list(Story.objects.using(alias).values_list('id', 'creator_id'))
+    grants = {(user_id, story_id, 'creator') for story_id, user_id in creators}
+    managers = dict(
+        Profile.objects.using(alias).filter(assigned_to__profile__role='subadmin').values_list('user_id', 'assigned_to_id')
+    )
+    grants.update(
+        (managers[creator_id], story_id, 'manager')
+        for story_id, creator_id in creators
+        if creator_id in managers
+    )
+    accounts = {}
+    for user_id, email in User.objects.using(alias).exclude(email='').values_list('id', 'email'):
+        accounts.setdefault(email.lower(), user_id)
+    for story_id, user_id, email in StoryInvite.objects.using(alias).filter(accepted=True).values_list(
+        'story_id', 'invited_user_id', 'invited_email'
+    ):
+        user_id = user_id or accounts.get(email.lower())
+        if user_id is not None:
+            grants.add((user_id, story_id, 'invite'))
+    StoryAccess.objects.using(alias).bulk_create(
+        [StoryAccess(user_id=user_id, story_id=story_id, reason=reason) for user_id, story_id, reason in grants],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storyapp', '0025_category_key'),
+        ('accounts', '0008_engagement_through_models'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoryAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(choices=[('creator', 'Creator'), ('invite', 'Accepted invite'), ('manager', 'Managing subadmin')], max_length=10)),
+                ('story', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='storyapp.story')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'story', 'reason')},
+            },
+        ),
+        migrations.RunPython(grant_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def fill_normalized_email(apps, schema_editor):
+    """Sets normalized_email on existing invites, BATCH_SIZE rows per update"""
+    StoryInvite = apps.get_model('storyapp', 'StoryInvite')
+    invites = StoryInvite.objects.using(schema_editor.connection.alias)
+    last_id = 0
+    while True:
+        batch = list(invites.filter(pk__gt=last_id).order_by('pk').only('pk', 'invited_email')[:BATCH_SIZE])
+        if not batch:
+            return
+        for invite in batch:
+            invite.normalized_email = (invite.invited_email or '').strip().lower()
+        invites.bulk_update(batch, ['normalized_email'])
+        last_id = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storyapp', '0026_story_access'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storyinvite',
+            name='normalized_email',
+            field=models.CharField(default='', editable=False, max_length=254),
+        ),
+        migrations.RunPython(fill_normalized_email, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='storyinvite',
+            index=models.Index(fields=['normalized_email', 'accepted', 'rejected'], name='storyinvite_email'),
+        ),
+    ]
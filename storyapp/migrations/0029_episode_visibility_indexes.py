@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-19 01:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storyapp', '0028_deletion_jobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='episode',
+            index=models.Index(condition=models.Q(('status', 'public')), fields=['version', 'created_at', 'id'], name='episode_visible_order'),
+        ),
+        migrations.AddIndex(
+            model_name='episode',
+            index=models.Index(condition=models.Q(('status', 'public')), fields=['parent_episode'], name='episode_visible_children'),
+        ),
+        migrations.AddIndex(
+            model_name='episode',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['id'], name='episode_pending'),
+        ),
+        migrations.AddIndex(
+            model_name='episode',
+            index=models.Index(condition=models.Q(('status', 'quarantined')), fields=['creator'], name='episode_quarantined'),
+        ),
+    ]
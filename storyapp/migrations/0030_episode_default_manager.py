@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-19 01:36
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storyapp', '0029_episode_visibility_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='episode',
+            options={'default_manager_name': 'objects'},
+        ),
+    ]
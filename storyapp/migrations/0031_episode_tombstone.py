@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-19 01:53
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_story_tombstones(apps, schema_editor):
+    """Tombstones the episodes of stories already waiting for background deletion"""
+    Episode = apps.get_model('storyapp', 'Episode')
+    Story = apps.get_model('storyapp', 'Story')
+    alias = schema_editor.connection.alias
+    tombstoned = Story.objects.using(alias).filter(deleted_at__isnull=False)
+    Episode.objects.using(alias).filter(version__story__in=tombstoned).update(
+        deleted_at=Subquery(tombstoned.filter(versions=OuterRef('version')).values('deleted_at')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storyapp', '0030_episode_default_manager'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='episode',
+            name='episode_visible_order',
+        ),
+        migrations.RemoveIndex(
+            model_name='episode',
+            name='episode_visible_children',
+        ),
+        migrations.AddField(
+            model_name='episode',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(copy_story_tombstones, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='episode',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('status', 'public')), fields=['version', 'created_at', 'id'], name='episode_live_order'),
+        ),
+        migrations.AddIndex(
+            model_name='episode',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('status', 'public')), fields=['parent_episode'], name='episode_live_children'),
+        ),
+    ]
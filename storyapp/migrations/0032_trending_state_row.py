@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-19 02:10
+
+import time
+
+from django.db import migrations
+
+
+def create_state(apps, schema_editor):
+    """The epoch row storyapp.trending reads, so reading it never has to write"""
+    TrendingState = apps.get_model('storyapp', 'TrendingState')
+    TrendingState.objects.using(schema_editor.connection.alias).get_or_create(pk=1, defaults={'epoch': time.time()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storyapp', '0031_episode_tombstone'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_state, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,39 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.mail import send_mail
+import math
+
+from . import deltas
+
+# Episode lists show a plain-text excerpt instead of the full content
+EXCERPT_LENGTH = 280
+READING_WORDS_PER_MINUTE = 200
+
+
+def summarize_content(content):
+    """The (excerpt, word count) stored next to an episode's content"""
+    words = content.split()
+    excerpt = ' '.join(words[:EXCERPT_LENGTH])
+    if len(excerpt) > EXCERPT_LENGTH:
+        excerpt = excerpt[:EXCERPT_LENGTH].rsplit(' ', 1)[0] + '\u2026'
+    return excerpt, len(words)
+
+class LiveManager(models.Manager):
+    """
+    Default manager of models deleted in the background (storyapp.deletion):
+    leaves out tombstoned rows. _base_manager still sees them.
+    """
+    # Set on tombstoned rows; subclasses follow a relation to it
+    tombstone = 'deleted_at'
+
+    def get_queryset(self):
+        return super().get_queryset().filter(**{f'{self.tombstone}__isnull': True})
+
+
+class LiveVersionManager(LiveManager):
+    """Leaves out the versions of tombstoned stories"""
+    tombstone = 'story__deleted_at'
+
 
 class Organization(models.Model):
     name = models.CharField(max_length=255)
@@ -11,6 +44,20 @@ class Organization(models.Model):
         return self.name
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
+    # The name with whitespace collapsed and case folded; lookups by name
+    # go through this (storyapp.categories)
+    key = models.CharField(max_length=100, unique=True, editable=False)
+
+    @staticmethod
+    def normalize(name):
+        return ' '.join(name.split()).casefold()
+
+    def save(self, *args, **kwargs):
+        self.key = self.normalize(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'key'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -30,8 +77,10 @@ class Story(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
     creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stories')
-    liked_by = models.ManyToManyField(User, related_name='liked_stories', blank=True)
-    followed_by = models.ManyToManyField(User, related_name='followed_stories', blank=True)
+    # Engagement rows live in the engagement database (story_project.routers);
+    # read them through storyapp.engagement, not with joins.
+    liked_by = models.ManyToManyField(User, related_name='liked_stories', blank=True, through='StoryLike')
+    followed_by = models.ManyToManyField(User, related_name='followed_stories', blank=True, through='StoryFollow')
     visibility = models.CharField(max_length=15, choices=VISIBILITY_CHOICES, default=PUBLIC)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -39,6 +88,10 @@ class Story(models.Model):
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='stories')
 
     organization = models.ForeignKey(Organization, on_delete=models.SET_NULL, null=True, blank=True, related_name='stories')
+    # Tombstone: set when the story is deleted, its rows go in the background
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager()
 
     def __str__(self):
         return self.title
@@ -49,6 +102,8 @@ class Version(models.Model):
     version_number = models.CharField(max_length=10)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = LiveVersionManager()
+
     def __str__(self):
         return f"{self.story.title} - v{self.version_number}"
 
@@ -69,6 +124,50 @@ class Version(models.Model):
         super().save(*args, **kwargs)
 
 
+class EpisodeQuerySet(models.QuerySet):
+    def visible(self):
+        # An equality, not status__in: SQLite only matches a partial index
+        # condition against bound parameters compared with =
+        return self.filter(status=Episode.PUBLIC)
+
+
+class EpisodeManager(LiveManager.from_queryset(EpisodeQuerySet)):
+    """
+    Default manager of Episode: only the public episodes readers see, so a
+    list or lookup cannot show a deleted, quarantined or pending one by
+    forgetting a filter. Moderation and the creator's own lists start from
+    with_hidden(), or from one hidden status. Neither has episodes waiting
+    for background deletion: storyapp.deletion copies the tombstone of their
+    story or creator onto them, so both filters are on episode columns and
+    the partial indexes, which share them, serve reads without a join.
+
+    Being the default manager, it also decides what Django finds through
+    Episode without naming a manager, for moderators and creators alike:
+    reverse relations (version.episodes, user.episodes,
+    episode.child_episodes), the related fields DRF builds for foreign keys
+    to Episode, and get_object_or_404(Episode, ...). Code that must reach
+    hidden episodes that way names with_hidden() explicitly, as
+    EpisodeReportSerializer.episode does. Forward relations such as
+    episode.parent_episode use the plain base manager and, like deletion and
+    delta storage, see every episode.
+    """
+
+    def get_queryset(self):
+        return self.with_hidden().visible()
+
+    def with_hidden(self):
+        return super().get_queryset()
+
+    def only_pending(self):
+        return self.with_hidden().filter(status=Episode.PENDING)
+
+    def only_quarantined(self):
+        return self.with_hidden().filter(status=Episode.QUARANTINED)
+
+    def only_deleted(self):
+        return self.with_hidden().filter(status=Episode.DELETED)
+
+
 class Episode(models.Model):
     PUBLIC = 'public'
     PRIVATE = 'private'
@@ -92,11 +191,130 @@ class Episode(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='episodes',null=True)
     status = models.CharField(max_length=15, choices=STATUS_CHOICES, default=PUBLIC)
-    liked_by = models.ManyToManyField(User, related_name='liked_episodes', blank=True)
+    liked_by = models.ManyToManyField(User, related_name='liked_episodes', blank=True, through='EpisodeLike')
+    # Derived from content on save, so lists never have to load the full text
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH + 1, blank=True, default='')
+    word_count = models.PositiveIntegerField(default=0)
+    # Delta storage (storyapp.deltas): when content_delta is set, content is
+    # empty and the text is rebuilt from delta_base's body
+    content_delta = models.TextField(null=True, blank=True, editable=False)
+    delta_base = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='delta_dependents'
+    )
+    delta_depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Tombstone of a background deletion (storyapp.deletion), copied from the
+    # story or creator; unrelated to the moderation status DELETED
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = EpisodeManager()
+
+    _body_changed = False
+    # Status as last loaded or saved; storyapp.signals compares against it
+    _saved_status = None
     
+    class Meta:
+        # Deliberate: see EpisodeManager. _base_manager stays the plain one.
+        default_manager_name = 'objects'
+        indexes = [
+            # Reading order within a version, and next/previous
+            models.Index(
+                fields=['version', 'created_at', 'id'], name='episode_live_order',
+                condition=models.Q(status='public', deleted_at__isnull=True),
+            ),
+            # Other versions of an episode
+            models.Index(
+                fields=['parent_episode'], name='episode_live_children',
+                condition=models.Q(status='public', deleted_at__isnull=True),
+            ),
+            models.Index(fields=['id'], name='episode_pending', condition=models.Q(status='pending')),
+            models.Index(fields=['creator'], name='episode_quarantined', condition=models.Q(status='quarantined')),
+        ]
+
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        episode = super().from_db(db, field_names, values)
+        episode._saved_status = episode.__dict__.get('status')
+        return episode
+
+    @property
+    def reading_time(self):
+        """Estimated reading time in minutes"""
+        return math.ceil(self.word_count / READING_WORDS_PER_MINUTE)
+
+    @property
+    def body(self):
+        """The full text. Read and write this rather than content, which may only be a diff."""
+        return deltas.body(self)
+
+    @body.setter
+    def body(self, text):
+        if self.pk is not None and not self._body_changed and text == self.body:
+            return
+        self.content = text
+        self.content_delta = None
+        self.delta_base = None
+        self.delta_depth = 0
+        self._body_changed = True
+
+    def save(self, *args, **kwargs):
+        # Only full text in hand is summarized and stored: copies loaded with
+        # defer('content') and untouched diff-stored episodes keep theirs
+        if not self.get_deferred_fields() & {'content', 'content_delta'} and self.content_delta is None:
+            self.excerpt, self.word_count = summarize_content(self.content)
+            if self._body_changed and not self._state.adding:
+                deltas.materialize_dependents(self)
+            if self._body_changed or self._state.adding:
+                deltas.compress(self)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'content' in update_fields:
+                kwargs['update_fields'] = {
+                    *update_fields, 'excerpt', 'word_count', 'content_delta', 'delta_base', 'delta_depth'
+                }
+        super().save(*args, **kwargs)
+        self._body_changed = False
+
+
+class EpisodeEvent(models.Model):
+    """
+    A change to an episode that followers are told about (storyapp.events):
+    a new episode, a new branch or a change of status. Rows are written in
+    the transaction that saves the episode and pruned after
+    EPISODE_EVENT_RETENTION_DAYS.
+    """
+    NEW_EPISODE = 'episode'
+    BRANCH = 'branch'
+    STATUS = 'status'
+    KIND_CHOICES = [
+        (NEW_EPISODE, 'New episode'),
+        (BRANCH, 'New branch'),
+        (STATUS, 'Status change'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    episode = models.ForeignKey(Episode, on_delete=models.CASCADE, related_name='events')
+    story = models.ForeignKey(Story, on_delete=models.CASCADE, related_name='episode_events')
+    version = models.ForeignKey(Version, on_delete=models.CASCADE, related_name='episode_events')
+    creator = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='episode_events')
+    title = models.CharField(max_length=200)
+    status = models.CharField(max_length=15, choices=Episode.STATUS_CHOICES)
+    previous_status = models.CharField(max_length=15, choices=Episode.STATUS_CHOICES, blank=True)
+    # Whether the story was public when the event happened: followers of the
+    # author only hear about public stories
+    public_story = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['story', 'id'], name='episodeevent_story_id'),
+            models.Index(fields=['creator', 'id'], name='episodeevent_creator_id'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} event for episode {self.episode_id}"
+
 
 class StoryReport(models.Model):
     PENDING = 'pending'
@@ -165,7 +383,25 @@ class StoryInvite(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     accepted = models.BooleanField(default=False)
     rejected = models.BooleanField(default=False) 
+    # invited_email as normalize_email leaves it; every lookup by address
+    # goes through this, so it is an index seek
+    normalized_email = models.CharField(max_length=254, editable=False, default='')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['normalized_email', 'accepted', 'rejected'], name='storyinvite_email'),
+        ]
+
+    @staticmethod
+    def normalize_email(email):
+        return (email or '').strip().lower()
+
+    def save(self, *args, **kwargs):
+        self.normalized_email = self.normalize_email(self.invited_email)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'invited_email' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'normalized_email'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.invited_email} invited to {self.story.title}"
@@ -179,3 +415,197 @@ class StoryInvite(models.Model):
         """
         send_mail(subject, message, 'no-reply@yourplatform.com', [self.invited_email])
 
+
+
+class StoryTrend(models.Model):
+    """
+    A story's trending score (storyapp.trending). Scores are stored scaled
+    to the shared TrendingState epoch, so ranking by the stored value ranks
+    by the decayed score without rewriting every row as time passes.
+    """
+    story = models.OneToOneField(Story, on_delete=models.CASCADE, primary_key=True, related_name='trend')
+    # Copied from the story so per-category rankings read a single index
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    score = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score'], name='storytrend_score'),
+            models.Index(fields=['category', '-score'], name='storytrend_category_score'),
+        ]
+
+    def __str__(self):
+        return f"{self.story_id}: {self.score}"
+
+
+class TrendingState(models.Model):
+    """Single row holding the time, in Unix seconds, that stored trending scores are scaled to"""
+    epoch = models.FloatField()
+
+
+class RelatedStory(models.Model):
+    """
+    One of a story's nearest neighbours by co-engagement, precomputed by
+    build_related_stories (storyapp.recommendations). Rank 0 is the closest.
+    """
+    story = models.ForeignKey(Story, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Story, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = [('story', 'rank')]
+
+    def __str__(self):
+        return f"{self.story_id} -> {self.related_id}: {self.score}"
+
+
+class Notification(models.Model):
+    """An entry in a user's inbox, written by the fan-out in storyapp.notifications"""
+    NEW_EPISODE = 'new_episode'
+    INVITE = 'invite'
+    KIND_CHOICES = [
+        (NEW_EPISODE, 'New episode'),
+        (INVITE, 'Story invite'),
+    ]
+
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    story = models.ForeignKey(Story, on_delete=models.CASCADE, null=True, related_name='+')
+    episode = models.ForeignKey(Episode, on_delete=models.CASCADE, null=True, related_name='+')
+    invite = models.ForeignKey(StoryInvite, on_delete=models.CASCADE, null=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The inbox, newest first
+            models.Index(fields=['recipient', '-id'], name='notification_inbox'),
+            # Unread counts read only the unread rows of one recipient
+            models.Index(
+                fields=['recipient'], condition=models.Q(read_at__isnull=True), name='notification_unread'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} for {self.recipient_id}"
+
+
+class NotificationOutbox(models.Model):
+    """
+    A notification still to be fanned out to its recipients. Written in the
+    transaction that creates the episode or invite; ``cursor`` is the last
+    recipient user id delivered, so an interrupted fan-out resumes there.
+    """
+    kind = models.CharField(max_length=20, choices=Notification.KIND_CHOICES)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    story = models.ForeignKey(Story, on_delete=models.CASCADE, null=True, related_name='+')
+    episode = models.ForeignKey(Episode, on_delete=models.CASCADE, null=True, related_name='+')
+    invite = models.ForeignKey(StoryInvite, on_delete=models.CASCADE, null=True, related_name='+')
+    cursor = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set by the worker delivering the entry; stale claims are taken over
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} fan-out {self.pk}"
+
+
+# Engagement tables. They are routed to the engagement database, so their
+# foreign keys carry no database constraint and do not cascade; rows are
+# cleaned up by the post_delete handlers in storyapp.signals instead.
+
+class StoryLike(models.Model):
+    story = models.ForeignKey(Story, on_delete=models.DO_NOTHING, db_constraint=False)
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
+
+    class Meta:
+        db_table = 'storyapp_story_liked_by'
+        unique_together = [('story', 'user')]
+
+
+class StoryFollow(models.Model):
+    story = models.ForeignKey(Story, on_delete=models.DO_NOTHING, db_constraint=False)
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
+
+    class Meta:
+        db_table = 'storyapp_story_followed_by'
+        unique_together = [('story', 'user')]
+
+
+class EpisodeLike(models.Model):
+    episode = models.ForeignKey(Episode, on_delete=models.DO_NOTHING, db_constraint=False)
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
+
+    class Meta:
+        db_table = 'storyapp_episode_liked_by'
+        unique_together = [('episode', 'user')]
+
+
+class StoryAccess(models.Model):
+    """
+    A user allowed to see a story whatever its visibility, maintained by
+    storyapp.access. One row per reason, so revoking one leaves the others.
+    """
+    CREATOR = 'creator'
+    INVITE = 'invite'
+    MANAGER = 'manager'
+    REASON_CHOICES = [
+        (CREATOR, 'Creator'),
+        (INVITE, 'Accepted invite'),
+        (MANAGER, 'Managing subadmin'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    story = models.ForeignKey(Story, on_delete=models.CASCADE, related_name='+')
+    reason = models.CharField(max_length=10, choices=REASON_CHOICES)
+
+    class Meta:
+        # Leads with user: listing reads a user's story ids off this index
+        unique_together = [('user', 'story', 'reason')]
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.story_id} ({self.reason})"
+
+
+class DeletionJob(models.Model):
+    """
+    A tombstoned story, user or organization whose rows storyapp.deletion
+    removes in chunks. Points at its target by id: the row goes before the job.
+    """
+    STORY = 'story'
+    USER = 'user'
+    ORGANIZATION = 'organization'
+    KIND_CHOICES = [
+        (STORY, 'Story'),
+        (USER, 'User'),
+        (ORGANIZATION, 'Organization'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    # What was deleted, for reporting once the row is gone
+    label = models.CharField(max_length=255)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Progress: rows deleted so far and the table being worked on
+    deleted_rows = models.PositiveBigIntegerField(default=0)
+    current_table = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], name='deletionjob_unfinished', condition=models.Q(finished_at__isnull=True)),
+        ]
+
+    @property
+    def status(self):
+        if self.finished_at is not None:
+            return 'done'
+        return 'failed' if self.error else ('running' if self.claimed_at else 'pending')
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} ({self.status})"
@@ -0,0 +1,170 @@
+"""
+Notification fan-out.
+
+Publishing an episode or sending an invite only writes one NotificationOutbox
+row, in the same transaction. Delivering it to every recipient happens
+afterwards, in a deliver_notifications worker, or with
+NOTIFICATION_FANOUT_IN_PROCESS (off by default) on a background thread of
+the web process once the transaction commits. A delivery claims its entry, reads the story's followers from the
+engagement database in id order and writes their notifications with one
+bulk insert per NOTIFICATION_FANOUT_CHUNK_SIZE recipients, moving the entry's
+cursor in the same transaction, so a story with tens of thousands of
+followers costs the request one insert and an interrupted delivery resumes
+where it stopped.
+"""
+from datetime import timedelta
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from story_project import metrics
+from .models import Episode, Notification, NotificationOutbox, StoryFollow, Version
+
+logger = logging.getLogger('storyapp.notifications')
+
+# Outbox entries a drain claims per query
+CLAIM_BATCH = 50
+
+notifications_delivered = metrics.registry.counter(
+    'notifications_delivered_total', 'Notifications written by the fan-out, by kind', ('kind',)
+)
+
+
+def outbox_depth():
+    return NotificationOutbox.objects.count()
+
+
+metrics.registry.register_gauge(
+    'notification_outbox_depth', 'Notification fan-outs waiting to be delivered', outbox_depth
+)
+
+
+def episode_created(episode):
+    """Queues a notification for the followers of the story of a newly published episode"""
+    if episode.status != Episode.PUBLIC:
+        return
+    story_id = Version.objects.filter(pk=episode.version_id).values_list('story_id', flat=True).get()
+    followers = StoryFollow.objects.filter(story_id=story_id)
+    if episode.creator_id is not None:
+        followers = followers.exclude(user_id=episode.creator_id)
+    if not followers.exists():
+        return
+    _enqueue(kind=Notification.NEW_EPISODE, story_id=story_id, episode_id=episode.pk, actor_id=episode.creator_id)
+
+
+def invite_sent(invite):
+    """Queues a notification for the invited user, if they have an account"""
+    if invite.invited_user_id is None:
+        return
+    _enqueue(kind=Notification.INVITE, story_id=invite.story_id, invite_id=invite.pk, actor_id=invite.invited_by_id)
+
+
+def _enqueue(**fields):
+    NotificationOutbox.objects.create(**fields)
+    if getattr(settings, 'NOTIFICATION_FANOUT_IN_PROCESS', False):
+        transaction.on_commit(worker.kick)
+
+
+def _recipients(entry, after, limit):
+    """Up to ``limit`` recipient user ids above ``after``, in ascending order"""
+    if entry.kind == Notification.INVITE:
+        user_id = entry.invite.invited_user_id
+        return [user_id] if user_id is not None and user_id > after else []
+    followers = StoryFollow.objects.filter(story_id=entry.story_id, user_id__gt=after)
+    if entry.actor_id is not None:
+        followers = followers.exclude(user_id=entry.actor_id)
+    return list(followers.order_by('user_id').values_list('user_id', flat=True)[:limit])
+
+
+def _claimable():
+    stale = timezone.now() - timedelta(seconds=getattr(settings, 'NOTIFICATION_CLAIM_SECONDS', 300))
+    return NotificationOutbox.objects.filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=stale))
+
+
+def claim(entry_id):
+    return _claimable().filter(pk=entry_id).update(claimed_at=timezone.now()) == 1
+
+
+def deliver(entry):
+    """Writes the notifications of a claimed outbox entry, then removes it"""
+    size = getattr(settings, 'NOTIFICATION_FANOUT_CHUNK_SIZE', 500)
+    while True:
+        recipients = _recipients(entry, entry.cursor, size)
+        if not recipients:
+            break
+        with transaction.atomic():
+            moved = NotificationOutbox.objects.filter(pk=entry.pk).update(
+                cursor=recipients[-1], claimed_at=timezone.now()
+            )
+            if not moved:
+                # Deleted along with its episode, story or invite
+                return
+            Notification.objects.bulk_create([
+                Notification(
+                    recipient_id=user_id,
+                    kind=entry.kind,
+                    actor_id=entry.actor_id,
+                    story_id=entry.story_id,
+                    episode_id=entry.episode_id,
+                    invite_id=entry.invite_id,
+                )
+                for user_id in recipients
+            ])
+        entry.cursor = recipients[-1]
+        notifications_delivered.inc(len(recipients), kind=entry.kind)
+        if len(recipients) < size:
+            break
+    entry.delete()
+
+
+def drain():
+    """Delivers outbox entries until none are left to claim; returns how many were delivered"""
+    delivered = 0
+    while True:
+        ids = list(_claimable().order_by('id').values_list('id', flat=True)[:CLAIM_BATCH])
+        if not ids:
+            return delivered
+        for entry_id in ids:
+            if not claim(entry_id):
+                continue
+            entry = NotificationOutbox.objects.select_related('invite').filter(pk=entry_id).first()
+            if entry is not None:
+                deliver(entry)
+                delivered += 1
+
+
+class FanoutWorker:
+    """Background thread that drains the outbox for the web process whenever it is kicked"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pending = False
+
+    def kick(self):
+        with self._lock:
+            self._pending = True
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='notification-fanout', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+                self._pending = False
+            try:
+                drain()
+            except Exception:
+                logger.exception('Notification fan-out failed')
+            finally:
+                connections.close_all()
+
+
+worker = FanoutWorker()
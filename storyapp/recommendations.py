@@ -0,0 +1,113 @@
+"""
+Related stories from co-engagement.
+
+build_related_stories reads every like, follow and favorite from the
+engagement database into a sparse story x user matrix, each cell holding
+the summed RELATED_STORIES_WEIGHTS of what that user did to that story. Rows
+are scaled to unit length, so the product of a block of rows with the
+transposed matrix is the cosine similarity of those stories with every
+other one. Blocks of RELATED_STORIES_CHUNK_SIZE stories keep the product,
+which stays sparse, small. The RELATED_STORIES_TOP_N most similar stories
+per story replace the RelatedStory table in one transaction.
+
+The table is read as is. Visibility is not stored with it but applied when
+the neighbours are served, so a story that went private since the last
+build is simply left out.
+
+NumPy and SciPy are only needed by the build and are imported there.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from accounts.models import FavoriteStory, Profile
+from .models import RelatedStory, Story, StoryFollow, StoryLike
+
+DEFAULT_WEIGHTS = {'like': 1.0, 'follow': 2.0, 'favorite': 2.0}
+
+# Rows per bulk insert when the table is replaced
+WRITE_BATCH = 1000
+
+
+def weight(kind):
+    return getattr(settings, 'RELATED_STORIES_WEIGHTS', DEFAULT_WEIGHTS).get(kind, DEFAULT_WEIGHTS[kind])
+
+
+def _engagements():
+    """(story_id, user_id, weight) for every like, follow and favorite"""
+    for model, kind in ((StoryLike, 'like'), (StoryFollow, 'follow')):
+        amount = weight(kind)
+        for story_id, user_id in model.objects.values_list('story_id', 'user_id').iterator(chunk_size=WRITE_BATCH):
+            yield story_id, user_id, amount
+    # Favorites are owned by profiles, which live with the content
+    users = dict(Profile.objects.values_list('id', 'user_id'))
+    amount = weight('favorite')
+    for story_id, profile_id in FavoriteStory.objects.values_list('story_id', 'profile_id').iterator(
+        chunk_size=WRITE_BATCH
+    ):
+        if profile_id in users:
+            yield story_id, users[profile_id], amount
+
+
+def build(top_n=None, chunk_size=None):
+    """
+    Recomputes the RelatedStory table; returns (stories with neighbours,
+    rows written). Raises ImportError without NumPy and SciPy.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    top_n = top_n or getattr(settings, 'RELATED_STORIES_TOP_N', 20)
+    chunk_size = chunk_size or getattr(settings, 'RELATED_STORIES_CHUNK_SIZE', 1000)
+
+    existing = set(Story.objects.values_list('id', flat=True))
+    # Engagement rows reference stories by id only and may outlive them
+    rows = [row for row in _engagements() if row[0] in existing]
+    if not rows:
+        with transaction.atomic():
+            RelatedStory.objects.all().delete()
+        return 0, 0
+
+    story_col, user_col, weights = (np.array(column) for column in zip(*rows))
+    story_ids, story_index = np.unique(story_col, return_inverse=True)
+    user_ids, user_index = np.unique(user_col, return_inverse=True)
+    # Duplicates sum: a user who liked and followed a story counts both
+    matrix = sparse.csr_matrix(
+        (weights.astype(np.float64), (story_index, user_index)), shape=(len(story_ids), len(user_ids))
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    matrix = sparse.diags(1.0 / norms) @ matrix
+    transposed = matrix.T.tocsr()
+
+    entries = []
+    for start in range(0, len(story_ids), chunk_size):
+        block = (matrix[start:start + chunk_size] @ transposed).tocsr()
+        for offset in range(block.shape[0]):
+            row = start + offset
+            begin, end = block.indptr[offset], block.indptr[offset + 1]
+            columns, scores = block.indices[begin:end], block.data[begin:end]
+            keep = columns != row
+            columns, scores = columns[keep], scores[keep]
+            if len(scores) > top_n:
+                nearest = np.argpartition(-scores, top_n - 1)[:top_n]
+                columns, scores = columns[nearest], scores[nearest]
+            # Highest score first, ties by story id so rebuilds are stable
+            order = np.lexsort((story_ids[columns], -scores))
+            story_id = int(story_ids[row])
+            entries.extend(
+                RelatedStory(
+                    story_id=story_id, related_id=int(story_ids[columns[i]]), score=float(scores[i]), rank=rank
+                )
+                for rank, i in enumerate(order)
+            )
+
+    with transaction.atomic():
+        RelatedStory.objects.all().delete()
+        RelatedStory.objects.bulk_create(entries, batch_size=WRITE_BATCH)
+    return len({entry.story_id for entry in entries}), len(entries)
+
+
+def neighbours(story_id):
+    """[(related story id, score)] for ``story_id``, closest first, as last built"""
+    return list(
+        RelatedStory.objects.filter(story_id=story_id).order_by('rank').values_list('related_id', 'score')
+    )
@@ -1,8 +1,14 @@
+from bisect import bisect_left, bisect_right
+
+from django.db import models
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
 from .models import Story, Version, Episode, StoryReport, Organization,EpisodeReport
 from django.contrib.auth.models import User
 from rest_framework import serializers
-from .models import Story, Episode, Version, StoryReport, EpisodeReport,Category,StoryInvite
+from .models import Story, Episode, Version, StoryReport, EpisodeReport,Category,StoryInvite,Notification,DeletionJob
+from .engagement import CHUNK_SIZE, EngagementListSerializer, engagement_lookup
+from . import categories
 class OrganizationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Organization
@@ -26,6 +32,8 @@ class EpisodeSerializer(serializers.ModelSerializer):
     reporting_users = serializers.SerializerMethodField()
     likes_count = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
+    # body rebuilds delta-stored text; content itself may only be a diff
+    content = serializers.CharField(source='body', style={'base_template': 'textarea.html'})
     class Meta:
         model = Episode
         fields = ['id', 'title', 'content', 'version', 'parent_episode', 'created_at', 
@@ -34,14 +42,16 @@ class EpisodeSerializer(serializers.ModelSerializer):
                  'creator', 'creator_username', 'creator_admin', 'is_reported', 'story_title', 
                  'story_id', 'status', 'reports_count','reporting_users','likes_count', 'is_liked']
         read_only_fields = ['version', 'parent_episode', 'creator']
+        list_serializer_class = EngagementListSerializer
+
+    def prime_engagement(self, lookup, episodes):
+        lookup.prime_episodes([episode.pk for episode in episodes])
+
     def get_likes_count(self, obj):
-        return obj.liked_by.count()
+        return engagement_lookup(self.context).episode_likes(obj)
         
     def get_is_liked(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.liked_by.filter(id=request.user.id).exists()
-        return False
+        return engagement_lookup(self.context).episode_liked(obj)
     def get_reporting_users(self, obj):
         return list(obj.reports.values_list('reported_by__username', flat=True))
     def get_story_title(self, obj):
@@ -73,7 +83,7 @@ class EpisodeSerializer(serializers.ModelSerializer):
         next_episode = Episode.objects.filter(
             version=obj.version,
             created_at__gt=obj.created_at
-        ).order_by('created_at').first()
+        ).order_by('created_at').values_list('id', flat=True).first()
         return next_episode is not None
     
     def get_has_previous(self, obj):
@@ -81,24 +91,22 @@ class EpisodeSerializer(serializers.ModelSerializer):
         previous_episode = Episode.objects.filter(
             version=obj.version,
             created_at__lt=obj.created_at
-        ).order_by('-created_at').first()
+        ).order_by('-created_at').values_list('id', flat=True).first()
         return previous_episode is not None
         
     def get_next_id(self, obj):
         # Check if there's a next episode in the same version
-        next_episode = Episode.objects.filter(
+        return Episode.objects.filter(
             version=obj.version,
             created_at__gt=obj.created_at
-        ).order_by('created_at').first()
-        return next_episode.id if next_episode else None
+        ).order_by('created_at').values_list('id', flat=True).first()
     
     def get_previous_id(self, obj):
         # Check if there's a previous episode in the same version
-        previous_episode = Episode.objects.filter(
+        return Episode.objects.filter(
             version=obj.version,
             created_at__lt=obj.created_at
-        ).order_by('-created_at').first()
-        return previous_episode.id if previous_episode else None
+        ).order_by('-created_at').values_list('id', flat=True).first()
     
     def get_has_other_version(self, obj):
         # Check if this episode has a parent or children in other versions
@@ -115,8 +123,7 @@ class EpisodeSerializer(serializers.ModelSerializer):
             return obj.parent_episode.id
         
         # Otherwise, return the ID of the first child episode (if any)
-        child_episode = Episode.objects.filter(parent_episode=obj.id).first()
-        return child_episode.id if child_episode else None
+        return Episode.objects.filter(parent_episode=obj.id).values_list('id', flat=True).first()
     
     def get_previous_version(self, obj):
         # If this episode has a parent, that's the previous version
@@ -131,7 +138,7 @@ class EpisodeSerializer(serializers.ModelSerializer):
     
     def get_next_version(self, obj):
         # Find child episodes (newer versions of this episode)
-        child_episode = Episode.objects.filter(parent_episode=obj.id).first()
+        child_episode = Episode.objects.filter(parent_episode=obj.id).select_related('version').defer('content').first()
         if child_episode:
             return {
                 'id': child_episode.id,
@@ -141,36 +148,332 @@ class EpisodeSerializer(serializers.ModelSerializer):
             }
         return None
 
+# The creator and the admin they are assigned to, as creator_admin shows them
+USER_RELATIONS = 'creator__profile__assigned_to__profile'
+# What querysets rendered with EpisodeSummarySerializer should select_related
+SUMMARY_RELATIONS = ('version__story', USER_RELATIONS)
+# What StorySerializer shows of related rows; StoryPage loads them for a list
+STORY_RELATIONS = ('category', USER_RELATIONS)
+
+
+def creator_admin(user):
+    """The subadmin or admin ``user`` is assigned to, as the serializers show it"""
+    profile = getattr(user, 'profile', None)
+    if profile is None or profile.assigned_to is None:
+        return None
+    admin = profile.assigned_to
+    admin_profile = getattr(admin, 'profile', None)
+    return {
+        'id': admin.id,
+        'username': admin.username,
+        'role': admin_profile.role if admin_profile is not None else None,
+    }
+
+
+class Ordering:
+    """(id, key) pairs in key order, then id order, for finding the ids around a key"""
+
+    def __init__(self, items):
+        self.items = sorted(items, key=lambda item: (item[1], item[0]))
+        self.keys = [key for _, key in self.items]
+
+    def around(self, key):
+        """The ids of the first item before ``key`` and the first after it, or None"""
+        before = bisect_left(self.keys, key) - 1
+        after = bisect_right(self.keys, key)
+        return (
+            self.items[before][0] if before >= 0 else None,
+            self.items[after][0] if after < len(self.items) else None,
+        )
+
+
+def _chunked(queryset, field, ids):
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield from queryset.filter(**{f'{field}__in': ids[start:start + CHUNK_SIZE]})
+
+
+def _version_link(episode):
+    return {
+        'id': episode['id'],
+        'title': episode['title'],
+        'version': episode['version_id'],
+        'version_number': episode['version__version_number'],
+    }
+
+
+class SummaryLinks:
+    """
+    What episode summaries show about other rows, loaded for a whole list in
+    one query each: the episode before and after in the version, the other
+    versions of the episode and who reported it. The per-episode lookups of
+    EpisodeSerializer made a list of n episodes cost about 6n queries.
+    """
+
+    def __init__(self, episodes):
+        ids = [episode.pk for episode in episodes]
+        fields = ('id', 'parent_episode_id', 'title', 'version_id', 'version__version_number')
+
+        # Next and previous among the visible episodes of the version, also
+        # for a hidden episode, which is not one of them
+        siblings = {episode.version_id: [] for episode in episodes}
+        for pk, version_id, created_at in _chunked(
+            Episode.objects.values_list('id', 'version_id', 'created_at'), 'version_id', siblings
+        ):
+            siblings[version_id].append((pk, created_at))
+        orderings = {version_id: Ordering(items) for version_id, items in siblings.items()}
+        self.neighbours = {episode.pk: orderings[episode.version_id].around(episode.created_at) for episode in episodes}
+
+        # The first visible child, and the parent whatever its status, as
+        # Episode.objects and the parent_episode relation find them
+        self.children = {}
+        for child in _chunked(Episode.objects.values(*fields).order_by('id'), 'parent_episode_id', ids):
+            self.children.setdefault(child['parent_episode_id'], child)
+        parent_ids = {episode.parent_episode_id for episode in episodes if episode.parent_episode_id}
+        self.parents = {parent['id']: parent for parent in _chunked(Episode._base_manager.values(*fields), 'id', parent_ids)}
+
+        self.reporters = {pk: [] for pk in ids}
+        reports = EpisodeReport.objects.values_list('episode_id', 'reported_by__username').order_by('id')
+        for episode_id, username in _chunked(reports, 'episode_id', ids):
+            self.reporters[episode_id].append(username)
+
+
+class EpisodeSummaryListSerializer(EngagementListSerializer):
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.child.links = SummaryLinks(items)
+        return super().to_representation(items)
+
+
+class EpisodeSummarySerializer(serializers.ModelSerializer):
+    """
+    Episodes in lists: an excerpt, word count and reading time in place of
+    the content, and the fields of EpisodeSerializer about other rows filled
+    in from SummaryLinks. Select SUMMARY_RELATIONS on the queryset.
+    """
+    has_next = serializers.SerializerMethodField()
+    has_previous = serializers.SerializerMethodField()
+    next_id = serializers.SerializerMethodField()
+    previous_id = serializers.SerializerMethodField()
+    has_other_version = serializers.SerializerMethodField()
+    other_version_id = serializers.SerializerMethodField()
+    previous_version = serializers.SerializerMethodField()
+    next_version = serializers.SerializerMethodField()
+    creator_username = serializers.ReadOnlyField(source='creator.username')
+    creator_admin = serializers.SerializerMethodField()
+    is_reported = serializers.SerializerMethodField()
+    story_title = serializers.ReadOnlyField(source='version.story.title')
+    story_id = serializers.ReadOnlyField(source='version.story_id')
+    reports_count = serializers.SerializerMethodField()
+    reporting_users = serializers.SerializerMethodField()
+    likes_count = serializers.SerializerMethodField()
+    is_liked = serializers.SerializerMethodField()
+    reading_time = serializers.ReadOnlyField()
+
+    class Meta:
+        model = Episode
+        fields = ['id', 'title', 'excerpt', 'word_count', 'reading_time', 'version', 'parent_episode', 'created_at',
+                 'has_next', 'has_previous', 'next_id', 'previous_id', 
+                 'has_other_version', 'other_version_id', 'previous_version', 'next_version',
+                 'creator', 'creator_username', 'creator_admin', 'is_reported', 'story_title', 
+                 'story_id', 'status', 'reports_count','reporting_users','likes_count', 'is_liked']
+        read_only_fields = fields
+        list_serializer_class = EpisodeSummaryListSerializer
+
+    links = None
+
+    def prime_engagement(self, lookup, episodes):
+        lookup.prime_episodes([episode.pk for episode in episodes])
+
+    def _links(self, obj):
+        if self.links is None or obj.pk not in self.links.reporters:
+            # Rendered on its own rather than in a list
+            self.links = SummaryLinks([obj])
+        return self.links
+
+    def get_has_next(self, obj):
+        return self.get_next_id(obj) is not None
+
+    def get_has_previous(self, obj):
+        return self.get_previous_id(obj) is not None
+
+    def get_next_id(self, obj):
+        return self._links(obj).neighbours[obj.pk][1]
+
+    def get_previous_id(self, obj):
+        return self._links(obj).neighbours[obj.pk][0]
+
+    def _other(self, obj):
+        links = self._links(obj)
+        return links.parents.get(obj.parent_episode_id) or links.children.get(obj.pk)
+
+    def get_has_other_version(self, obj):
+        return self._other(obj) is not None
+
+    def get_other_version_id(self, obj):
+        other = self._other(obj)
+        return other['id'] if other else None
+
+    def get_previous_version(self, obj):
+        parent = self._links(obj).parents.get(obj.parent_episode_id)
+        return _version_link(parent) if parent else None
+
+    def get_next_version(self, obj):
+        child = self._links(obj).children.get(obj.pk)
+        return _version_link(child) if child else None
+
+    def get_creator_admin(self, obj):
+        return creator_admin(obj.creator)
+
+    def get_reporting_users(self, obj):
+        return self._links(obj).reporters[obj.pk]
+
+    def get_reports_count(self, obj):
+        return len(self.get_reporting_users(obj))
+
+    def get_is_reported(self, obj):
+        return self.get_reports_count(obj) >= 3
+
+    def get_likes_count(self, obj):
+        return engagement_lookup(self.context).episode_likes(obj)
+
+    def get_is_liked(self, obj):
+        return engagement_lookup(self.context).episode_liked(obj)
+
+def selected_versions(versions, params):
+    """
+    The versions StorySerializer shows of one story's versions, given in id
+    order: the one ?version or ?versions names by id or version number, all
+    of them with ?all_versions=true, else the root version
+    """
+    version_param = params.get('version') or params.get('versions')
+    if version_param:
+        try:
+            version_id = int(version_param)
+        except ValueError:
+            version_number = version_param
+        else:
+            matches = [version for version in versions if version.id == version_id]
+            if matches:
+                return matches
+            version_number = str(version_id).zfill(5)
+        return [version for version in versions if version.version_number == version_number][:1]
+
+    if params.get('all_versions', '').lower() == 'true':
+        return versions
+    return sorted(versions, key=lambda version: (version.version_number, version.id))[:1]
+
+
+class StoryPage:
+    """
+    What StorySerializer shows beyond the story rows, loaded for a whole list
+    in a fixed number of queries: creators and categories, every version for
+    the next and previous links, and the episodes of the versions shown,
+    rendered as one list of summaries. Stories rendered one at a time cost
+    about a dozen queries each.
+    """
+
+    def __init__(self, stories, context):
+        request = context.get('request')
+        params = request.query_params if request is not None else {}
+        prefetch_related_objects(stories, *STORY_RELATIONS)
+        stories_by_id = {story.pk: story for story in stories}
+
+        versions_by_story = {pk: [] for pk in stories_by_id}
+        for version in _chunked(Version.objects.order_by('id'), 'story_id', stories_by_id):
+            version.story = stories_by_id[version.story_id]
+            versions_by_story[version.story_id].append(version)
+        self.neighbours = {}
+        self.shown = {}
+        for story_id, versions in versions_by_story.items():
+            ordering = Ordering([(version.id, version.version_number) for version in versions])
+            self.neighbours.update((version.id, ordering.around(version.version_number)) for version in versions)
+            self.shown[story_id] = selected_versions(versions, params)
+
+        shown = {version.id: version for versions in self.shown.values() for version in versions}
+        episodes = list(_chunked(
+            Episode.objects.select_related(USER_RELATIONS).defer('content').order_by('id'), 'version_id', shown
+        ))
+        for episode in episodes:
+            episode.version = shown[episode.version_id]
+        self.episodes = {pk: [] for pk in shown}
+        rendered = EpisodeSummarySerializer(episodes, many=True, context=context).data
+        for episode, data in zip(episodes, rendered):
+            self.episodes[episode.version_id].append(data)
+
+
+class StoryListSerializer(EngagementListSerializer):
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.child.page = StoryPage(items, self.context)
+        return super().to_representation(items)
+
+
+class ReaderEpisodeSerializer(serializers.ModelSerializer):
+    """An episode as the version reader shows it: full text plus its reading position"""
+    position = serializers.IntegerField(read_only=True)
+    content = serializers.CharField(source='body', read_only=True)
+    creator_username = serializers.ReadOnlyField(source='creator.username')
+    reading_time = serializers.ReadOnlyField()
+    likes_count = serializers.SerializerMethodField()
+    is_liked = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Episode
+        fields = ['id', 'position', 'title', 'content', 'word_count', 'reading_time', 'created_at',
+                  'creator', 'creator_username', 'status', 'likes_count', 'is_liked']
+        read_only_fields = fields
+        list_serializer_class = EngagementListSerializer
+
+    def prime_engagement(self, lookup, episodes):
+        lookup.prime_episodes([episode.pk for episode in episodes])
+
+    def get_likes_count(self, obj):
+        return engagement_lookup(self.context).episode_likes(obj)
+
+    def get_is_liked(self, obj):
+        return engagement_lookup(self.context).episode_liked(obj)
+
+class ReaderSummarySerializer(serializers.ModelSerializer):
+    """What the version reader prefetches for the page after the current one"""
+    position = serializers.IntegerField(read_only=True)
+    reading_time = serializers.ReadOnlyField()
+
+    class Meta:
+        model = Episode
+        fields = ['id', 'position', 'title', 'excerpt', 'word_count', 'reading_time']
+        read_only_fields = fields
+
 class VersionSerializer(serializers.ModelSerializer):
     has_next = serializers.SerializerMethodField()
     has_previous = serializers.SerializerMethodField()
     next_id = serializers.SerializerMethodField()
     previous_id = serializers.SerializerMethodField()
-    episodes = EpisodeSerializer(many=True, read_only=True)
+    episodes = serializers.SerializerMethodField()
     
     class Meta:
         model = Version
         fields = ['id', 'story', 'version_number', 'created_at', 'has_next', 'has_previous', 'next_id', 'previous_id', 'episodes']
-    
-    
+
+    # The StoryPage the versions were loaded with, when StorySerializer renders them
+    page = None
+
+    def get_episodes(self, obj):
+        if self.page is not None:
+            return self.page.episodes[obj.pk]
+        # Summaries only; the full text is served by the episode detail endpoint
+        episodes = obj.episodes.select_related(*SUMMARY_RELATIONS).defer('content')
+        return EpisodeSummarySerializer(episodes, many=True, context=self.context).data
 
     def get_has_next(self, obj):
-        # Check if there's a next version in the same story
-        next_version = Version.objects.filter(
-            story=obj.story,
-            version_number__gt=obj.version_number
-        ).order_by('version_number').first()
-        return next_version is not None
+        return self.get_next_id(obj) is not None
     
     def get_has_previous(self, obj):
-        # Check if there's a previous version in the same story
-        previous_version = Version.objects.filter(
-            story=obj.story,
-            version_number__lt=obj.version_number
-        ).order_by('-version_number').first()
-        return previous_version is not None
+        return self.get_previous_id(obj) is not None
     
     def get_next_id(self, obj):
+        if self.page is not None:
+            return self.page.neighbours[obj.pk][1]
         try:
             # No need to convert to int first, string comparison will work with padded numbers
             next_version = Version.objects.filter(
@@ -183,6 +486,8 @@ class VersionSerializer(serializers.ModelSerializer):
             return None
     
     def get_previous_id(self, obj):
+        if self.page is not None:
+            return self.page.neighbours[obj.pk][0]
         previous_version = Version.objects.filter(
             story=obj.story,
             version_number__lt=obj.version_number
@@ -191,8 +496,10 @@ class VersionSerializer(serializers.ModelSerializer):
 
 class StorySerializer(serializers.ModelSerializer):
     versions = serializers.SerializerMethodField()
-    likes_count = serializers.IntegerField(source='liked_by.count', read_only=True)
-    followers_count = serializers.IntegerField(source='followed_by.count', read_only=True)
+    likes_count = serializers.SerializerMethodField()
+    followers_count = serializers.SerializerMethodField()
+    liked_by = serializers.SerializerMethodField()
+    followed_by = serializers.SerializerMethodField()
     creator_username = serializers.ReadOnlyField(source='creator.username')
     cover_image = serializers.ImageField(required=False)
     creator_admin = serializers.SerializerMethodField()
@@ -201,8 +508,27 @@ class StorySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Story
-        fields = '__all__'
+        # The tombstone of a background deletion is not part of the API
+        exclude = ['deleted_at']
         read_only_fields = ['creator']
+        list_serializer_class = StoryListSerializer
+
+    page = None
+
+    def prime_engagement(self, lookup, stories):
+        lookup.prime_stories([story.pk for story in stories])
+
+    def get_liked_by(self, obj):
+        return engagement_lookup(self.context).story_likers(obj)
+
+    def get_followed_by(self, obj):
+        return engagement_lookup(self.context).story_followers(obj)
+
+    def get_likes_count(self, obj):
+        return len(self.get_liked_by(obj))
+
+    def get_followers_count(self, obj):
+        return len(self.get_followed_by(obj))
     
     def to_representation(self, instance):
         rep = super().to_representation(instance)
@@ -213,20 +539,12 @@ class StorySerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         category_name = validated_data.pop('category', '').strip()
         if category_name:
-            category_obj, _ = Category.objects.get_or_create(
-                name__iexact=category_name,
-                defaults={'name': category_name}
-            )
-            validated_data['category'] = category_obj
+            validated_data['category'] = categories.registry.get_or_create(category_name)
         return super().create(validated_data)
     def update(self, instance, validated_data):
         category_name = validated_data.pop('category', '').strip()
         if category_name:
-            category_obj, _ = Category.objects.get_or_create(
-                name__iexact=category_name,
-                defaults={'name': category_name}
-            )
-            validated_data['category'] = category_obj
+            validated_data['category'] = categories.registry.get_or_create(category_name)
         return super().update(instance, validated_data)
     def get_creator_admin(self, obj):
         # Get the creator's admin (if assigned to one)
@@ -239,60 +557,17 @@ class StorySerializer(serializers.ModelSerializer):
             }
         return None
     
+    def _page(self, obj):
+        if self.page is None or obj.pk not in self.page.shown:
+            # Rendered on its own rather than in a list
+            self.page = StoryPage([obj], self.context)
+        return self.page
+
     def get_versions(self, obj):
-        # Check if we should return all versions or just the root version
-        request = self.context.get('request')
-        if not request:
-            # Default to root version if no request context
-            root_version = obj.versions.order_by('version_number').first()
-            if root_version:
-                serializer = VersionSerializer(root_version, context=self.context)
-                return [serializer.data]
-            return []
-            
-        # Check if a specific version is requested (check both 'version' and 'versions' parameters)
-        version_param = request.query_params.get('version') or request.query_params.get('versions')
-        if version_param:
-            # First try to get the specific version by id
-            try:
-                version_id = int(version_param)
-                specific_version = obj.versions.filter(id=version_id).first()
-                if specific_version:
-                    serializer = VersionSerializer(specific_version, context=self.context)
-                    return [serializer.data]
-            except (ValueError, TypeError):
-                pass
-            
-            # If not found by id, try by version_number (padded)
-            try:
-                # Pad the version number for consistent comparison
-                padded_version = str(int(version_param)).zfill(5)
-                specific_version = obj.versions.filter(version_number=padded_version).first()
-                if specific_version:
-                    serializer = VersionSerializer(specific_version, context=self.context)
-                    return [serializer.data]
-            except (ValueError, TypeError):
-                # If version_param is not a valid integer, try exact match
-                specific_version = obj.versions.filter(version_number=version_param).first()
-                if specific_version:
-                    serializer = VersionSerializer(specific_version, context=self.context)
-                    return [serializer.data]
-            
-            # If version not found, return empty list
-            return []
-        
-        # Check if all versions are requested
-        if request.query_params.get('all_versions', '').lower() == 'true':
-            # Return all versions
-            serializer = VersionSerializer(obj.versions.all(), many=True, context=self.context)
-            return serializer.data
-        
-        # Default: return root version
-        root_version = obj.versions.order_by('version_number').first()
-        if root_version:
-            serializer = VersionSerializer(root_version, context=self.context)
-            return [serializer.data]
-        return []
+        page = self._page(obj)
+        serializer = VersionSerializer(page.shown[obj.pk], many=True, context=self.context)
+        serializer.child.page = page
+        return serializer.data
 
 class StoryReportSerializer(serializers.ModelSerializer):
     reporter_username = serializers.ReadOnlyField(source='reported_by.username')
@@ -304,6 +579,8 @@ class StoryReportSerializer(serializers.ModelSerializer):
         read_only_fields = ['reported_by']
 
 class EpisodeReportSerializer(serializers.ModelSerializer):
+    # Not Episode's default manager: quarantined and pending episodes can be reported too
+    episode = serializers.PrimaryKeyRelatedField(queryset=Episode.objects.with_hidden())
     reporter_username = serializers.ReadOnlyField(source='reported_by.username')
     episode_title = serializers.ReadOnlyField(source='episode.title')
     reports_count = serializers.SerializerMethodField()
@@ -355,4 +632,32 @@ class StoryInviteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("You cannot invite yourself.")
         return value
 
-        
\ No newline at end of file
+
+class NotificationSerializer(serializers.ModelSerializer):
+    actor_username = serializers.ReadOnlyField(source='actor.username')
+    story_title = serializers.ReadOnlyField(source='story.title')
+    episode_title = serializers.ReadOnlyField(source='episode.title')
+    read = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Notification
+        fields = [
+            'id', 'kind', 'actor', 'actor_username', 'story', 'story_title',
+            'episode', 'episode_title', 'invite', 'created_at', 'read', 'read_at',
+        ]
+        read_only_fields = fields
+
+    def get_read(self, obj):
+        return obj.read_at is not None
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    status = serializers.ReadOnlyField()
+
+    class Meta:
+        model = DeletionJob
+        fields = [
+            'id', 'kind', 'object_id', 'label', 'status', 'deleted_rows', 'current_table',
+            'created_at', 'finished_at', 'error',
+        ]
+        read_only_fields = fields
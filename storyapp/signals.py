@@ -1,6 +1,11 @@
-from django.db.models.signals import post_save
+from django.contrib.auth.models import User
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
 from django.dispatch import receiver
-from .models import EpisodeReport, Story
+from accounts.models import Profile
+from . import access, categories, deltas, diffs, events, notifications, trending
+from .models import Category, EpisodeReport, Story, Episode, StoryInvite, StoryLike, StoryFollow, StoryTrend, EpisodeLike
 
 @receiver(post_save, sender=EpisodeReport)
 def check_episode_reports(sender, instance, created, **kwargs):
@@ -18,4 +23,125 @@ def check_episode_reports(sender, instance, created, **kwargs):
         if report_count >= 3 and story.visibility != 'quarantined':
             story.visibility = 'quarantined'
             story.save()
-            print(f"Story '{story.title}' automatically quarantined due to {report_count} reports on episode '{episode.title}'")
\ No newline at end of file
+            print(f"Story '{story.title}' automatically quarantined due to {report_count} reports on episode '{episode.title}'")
+
+
+@receiver(post_save, sender=Episode)
+@receiver(post_delete, sender=Episode)
+def invalidate_episode_diffs(sender, instance, **kwargs):
+    diffs.bump_revision(instance.pk)
+
+
+@receiver(post_save, sender=Episode)
+def record_episode_event(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        events.record(instance, created)
+    instance._saved_status = instance.status
+
+
+@receiver(post_save, sender=Episode)
+def notify_story_followers(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        notifications.episode_created(instance)
+
+
+@receiver(post_save, sender=Episode)
+def trend_new_episode(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.status == Episode.PUBLIC:
+        trending.record(instance.version.story_id, 'episode')
+
+
+@receiver(request_finished)
+def flush_trending(sender, **kwargs):
+    # After the response is sent, so no request waits on the scores' write lock
+    trending.flush_if_due()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_categories(sender, **kwargs):
+    categories.changed()
+
+
+# Story access grants (storyapp.access) are resynced once the change commits,
+# when a cascade has finished deleting whatever it takes along
+@receiver(post_save, sender=Story)
+def sync_story_access(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: access.sync_stories([instance.pk]))
+
+
+@receiver(post_save, sender=StoryInvite)
+@receiver(post_delete, sender=StoryInvite)
+def sync_invite_access(sender, instance, created=False, raw=False, **kwargs):
+    if not raw and not (created and not instance.accepted):
+        transaction.on_commit(lambda: access.sync_stories([instance.story_id]))
+
+
+@receiver(post_init, sender=User)
+def remember_user_email(sender, instance, **kwargs):
+    # Left out when the email column was deferred
+    instance._saved_email = instance.__dict__.get('email')
+
+
+@receiver(post_save, sender=User)
+def sync_user_email_access(sender, instance, created, raw=False, **kwargs):
+    # Invites accepted without an account match one by address, so a new
+    # account or a changed address gains or loses their grants
+    if 'email' not in instance.__dict__:
+        return
+    previous, instance._saved_email = instance._saved_email, instance.email
+    if not raw and (created or previous != instance.email):
+        transaction.on_commit(lambda: access.sync_user(instance.pk))
+
+
+@receiver(post_save, sender=Profile)
+def sync_profile_access(sender, instance, created, raw=False, **kwargs):
+    # Role and manager decide the subadmin grants
+    previous, instance._saved_access = instance._saved_access, (instance.role, instance.assigned_to_id)
+    if created and previous is None:
+        previous = ('user', None)
+    if not raw and previous != instance._saved_access:
+        transaction.on_commit(lambda: access.sync_user(instance.user_id))
+
+
+@receiver(post_save, sender=Story)
+def update_trend_category(sender, instance, created, raw=False, **kwargs):
+    # Per-category rankings read the category copied onto the score row
+    if not created and not raw:
+        StoryTrend.objects.filter(story_id=instance.pk).exclude(category_id=instance.category_id).update(
+            category_id=instance.category_id
+        )
+
+
+@receiver(post_save, sender=StoryInvite)
+def notify_invited_user(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        notifications.invite_sent(instance)
+
+
+@receiver(pre_delete, sender=Episode)
+def materialize_delta_dependents(sender, instance, **kwargs):
+    # Episodes stored as diffs against this one need its text to be read
+    deltas.materialize_dependents(instance)
+
+
+# Engagement rows are in another database and do not cascade; remove them
+# when the story, episode or user they point at goes away.
+
+@receiver(post_delete, sender=Story)
+def delete_story_engagement(sender, instance, **kwargs):
+    StoryLike.objects.filter(story_id=instance.pk).delete()
+    StoryFollow.objects.filter(story_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=Episode)
+def delete_episode_engagement(sender, instance, **kwargs):
+    EpisodeLike.objects.filter(episode_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=User)
+def delete_user_engagement(sender, instance, **kwargs):
+    StoryLike.objects.filter(user_id=instance.pk).delete()
+    StoryFollow.objects.filter(user_id=instance.pk).delete()
+    EpisodeLike.objects.filter(user_id=instance.pk).delete()
@@ -1,3 +1,770 @@
-from django.test import TestCase
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import addModuleCleanup, mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connections
+from django.db.models import Q
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from story_project import metrics, routers
+from story_project.instrumentation import fingerprint
+from . import categories, deletion, deltas, recommendations, trending, writebehind
+from accounts.models import FavoriteStory, ProfileFollow
+from .management.commands import populate_db
+from .models import (
+    Category, Episode, EpisodeLike, EpisodeReport, Story, StoryAccess, StoryFollow, StoryInvite, StoryLike, Version,
+)
+from .views import StoryViewSet
+
+
+def setUpModule():
+    # Score bumps of test data are left unwritten: flushed after some request
+    # they would add to its query count, and at exit the test databases are
+    # gone. TrendingTests flushes its own.
+    patcher = mock.patch.object(trending, 'buffer', trending.TrendBuffer())
+    patcher.start()
+    addModuleCleanup(patcher.stop)
+    flush_seconds = override_settings(TRENDING_FLUSH_SECONDS=float('inf'))
+    flush_seconds.enable()
+    addModuleCleanup(flush_seconds.disable)
+    # Requests record metrics, which belong in a directory of their own. The
+    # flush thread would outlive it, so they are written once at the end.
+    directory = tempfile.TemporaryDirectory()
+    addModuleCleanup(directory.cleanup)
+    metrics_dir = override_settings(METRICS_DIR=directory.name)
+    metrics_dir.enable()
+    addModuleCleanup(metrics_dir.disable)
+    flush_thread = mock.patch.object(metrics.registry, '_start')
+    flush_thread.start()
+    addModuleCleanup(flush_thread.stop)
+    addModuleCleanup(metrics.registry.flush)
+
+
+class AsyncParityTests(TransactionTestCase):
+    """
+    The async views build story and version payloads by hand; they must
+    render exactly what the DRF views do for the same data. Committed data,
+    as the async views query from other threads than the test's.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        call_command('populate_db', scale=0.5, seed=7, verbosity=0, stdout=io.StringIO())
+        user = User.objects.filter(profile__role='user').first()
+        self.token = Token.objects.create(user=user).key
+
+    def paths(self):
+        story_ids = list(Story.objects.order_by('id').values_list('id', flat=True)[:4])
+        branched = Version.objects.order_by('-version_number').select_related('story').first()
+        story_ids.append(branched.story_id)
+        paths = ['public/stories/', 'categories/', 'public/stories/99999999/']
+        for story_id in story_ids:
+            for query in ['', '?all_versions=true', f'?version={branched.id}',
+                          f'?versions={branched.version_number}', '?version=2', '?version=abc']:
+                paths.append(f'public/stories/{story_id}/{query}')
+            paths.append(f'{story_id}/episodes/')
+        return paths
+
+    async def test_async_views_match_drf_views(self):
+        paths = await sync_to_async(self.paths)()
+        for headers in [{}, {'Authorization': f'Token {self.token}'}]:
+            for path in paths:
+                with self.subTest(path=path, authenticated=bool(headers)):
+                    expected = await sync_to_async(self.client.get)(f'/api/stories/{path}', headers=headers)
+                    response = await self.async_client.get(f'/api/stories/async/{path}', headers=headers)
+                    self.assertEqual(response.status_code, expected.status_code)
+                    self.assertEqual(response.json(), expected.json())
+
+
+
+@override_settings(READ_REPLICAS=[])
+class StoryListQueryTests(TestCase):
+    databases = {'default', 'engagement'}
+
+    @classmethod
+    def setUpTestData(cls):
+        subadmin = User.objects.create_user('subadmin', 'subadmin@example.com', 'secret')
+        subadmin.profile.role = 'subadmin'
+        subadmin.profile.save()
+        cls.author = User.objects.create_user('author', 'author@example.com', 'secret')
+        cls.author.profile.assigned_to = subadmin
+        cls.author.profile.save()
+        cls.category = Category.objects.create(name='Fantasy')
+
+    def add_stories(self, count):
+        for number in range(count):
+            story = Story.objects.create(title=f'Story {number}', description='About', creator=self.author, category=self.category)
+            first = Version.objects.create(story=story, version_number='00001')
+            second = Version.objects.create(story=story, version_number='00002')
+            opening = Episode.objects.create(version=first, title='Opening', content='Once', creator=self.author)
+            Episode.objects.create(version=first, title='Ending', content='Then', creator=self.author)
+            Episode.objects.create(version=second, title='Retold', content='Twice', creator=self.author, parent_episode=opening)
+            StoryLike.objects.create(story=story, user=self.author)
+            StoryFollow.objects.create(story=story, user=self.author)
+
+    def queries(self, path):
+        with CaptureQueriesContext(connections['default']) as default, \
+                CaptureQueriesContext(connections['engagement']) as engagement:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return len(default) + len(engagement)
+
+    def test_story_lists_cost_the_same_for_more_stories(self):
+        paths = ['/api/stories/public/stories/', '/api/stories/public/stories/?all_versions=true', '/api/stories/stories/']
+        self.add_stories(2)
+        few = [self.queries(path) for path in paths]
+        self.add_stories(6)
+        self.assertEqual([self.queries(path) for path in paths], few)
+
+
+# Requests read the default connection, the one holding the test transaction;
+# the replica mirror would be a second connection locked out by it
+@override_settings(READ_REPLICAS=[])
+class EpisodeVisibilityTests(TestCase):
+    databases = {'default', 'engagement'}
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author', 'author@example.com', 'secret')
+        cls.reader = User.objects.create_user('reader', 'reader@example.com', 'secret')
+        cls.story = Story.objects.create(title='Story', description='About', creator=author)
+        version = Version.objects.create(story=cls.story, version_number='1')
+        cls.public = Episode.objects.create(version=version, title='Public', content='Shown', creator=author)
+        cls.quarantined = Episode.objects.create(
+            version=version, title='Quarantined', content='Hidden', creator=author, status=Episode.QUARANTINED
+        )
+
+    def setUp(self):
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {Token.objects.create(user=self.reader).key}'
+
+    def test_lists_leave_out_hidden_episodes(self):
+        response = self.client.get(f'/api/stories/{self.story.id}/episodes/')
+        self.assertEqual([episode['id'] for episode in response.json()], [self.public.id])
+
+    def test_hidden_episodes_can_be_reported(self):
+        response = self.client.post(
+            '/api/stories/episode-reports/', {'episode': self.quarantined.id, 'reason': 'Spam'}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(EpisodeReport.objects.filter(episode=self.quarantined, reported_by=self.reader).exists())
+
+    def test_reads_use_the_live_partial_indexes(self):
+        in_order = Episode.objects.filter(version=self.public.version_id).order_by('created_at', 'id')
+        children = Episode.objects.filter(parent_episode=self.public.pk)
+        for queryset, index in [(in_order, 'episode_live_order'), (children, 'episode_live_children')]:
+            with self.subTest(index=index):
+                self.assertNotIn('JOIN', str(queryset.query))
+                self.assertIn(f'USING INDEX {index}', queryset.explain())
+                self.assertIn(f'USING INDEX {index}', queryset.values('id').explain())
+
+    def test_tombstoned_stories_hide_their_episodes(self):
+        deletion.delete_story(self.story)
+        self.assertFalse(Episode.objects.with_hidden().filter(version__story=self.story).exists())
+        response = self.client.get(f'/api/stories/episodes/{self.public.id}/')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(READ_REPLICAS=[])
+class RequestTimingTests(TestCase):
+    databases = {'default', 'engagement'}
+
+    def test_view_is_timed_apart_from_rendering(self):
+        author = User.objects.create_user('author', 'author@example.com', 'secret')
+        Story.objects.create(title='Story', description='About', creator=author)
+        response = self.client.get('/api/stories/public/stories/')
+        stats = response.wsgi_request.request_stats
+        self.assertGreater(stats.view_ms, 0)
+        self.assertGreater(stats.render_ms, 0)
+        self.assertGreater(stats.total_ms, stats.view_ms + stats.render_ms)
+
+    def test_slow_requests_log_fingerprints_without_values(self):
+        login = {'username': 'ada-lovelace', 'password': 'wrong'}
+        with self.settings(SLOW_REQUEST_QUERIES=1, SLOW_REQUEST_LOG_SQL=True):
+            with self.assertLogs('story_project.requests', 'WARNING') as logs:
+                self.client.post('/api/accounts/login/', login, content_type='application/json')
+        self.assertIn('1 queries', logs.output[0])
+        self.assertIn('1 x [default] SELECT ... FROM "auth_user" WHERE "auth_user"."username" = %s', logs.output[0])
+        self.assertNotIn('ada-lovelace', logs.output[0])
+
+        # The statements and their parameters only with DEBUG
+        self.client = self.client_class()
+        with self.settings(DEBUG=True, SLOW_REQUEST_QUERIES=1, SLOW_REQUEST_LOG_SQL=True):
+            with self.assertLogs('story_project.requests', 'WARNING') as logs:
+                self.client.post('/api/accounts/login/', login, content_type='application/json')
+        self.assertIn("('ada-lovelace',)", logs.output[0])
+
+    def test_fingerprints_leave_out_values(self):
+        self.assertEqual(
+            fingerprint('SELECT "a"."id", "a"."name" FROM "a" WHERE "a"."id" IN (%s, %s, %s) AND "a"."kind" = \'x\' LIMIT 21'),
+            'SELECT ... FROM "a" WHERE "a"."id" IN (%s, ...) AND "a"."kind" = %s LIMIT %s',
+        )
+
+
+@override_settings(EPISODE_DELTA_STORAGE=True, EPISODE_DELTA_SNAPSHOT_INTERVAL=3)
+class DeltaStorageTests(TestCase):
+    databases = {'default', 'engagement'}
+
+    def setUp(self):
+        deltas.body_cache.clear()
+        self.author = User.objects.create_user('author', 'author@example.com', 'secret')
+        story = Story.objects.create(title='Story', description='About', creator=self.author)
+        self.version = Version.objects.create(story=story, version_number='1')
+        words = [f'word{number}' for number in range(200)]
+        # Each branch rewrites one word of its parent and adds a line
+        self.texts = []
+        for number in range(6):
+            words[number * 7] = f'changed{number}'
+            self.texts.append(' '.join(words) + f'\n\nEnding {number}.')
+        self.chain = []
+        for text in self.texts:
+            parent = self.chain[-1] if self.chain else None
+            self.chain.append(Episode.objects.create(
+                version=self.version, title='Episode', content=text, creator=self.author, parent_episode=parent
+            ))
+
+    def stored_bodies(self):
+        deltas.body_cache.clear()
+        return [Episode.objects.with_hidden().get(pk=episode.pk).body for episode in self.chain]
+
+    def test_encode_and_apply_round_trip(self):
+        for base, text in [('', 'New text'), ('Old text', ''), ('a  b\tc\n', 'a b\n\nc d'), (self.texts[0], self.texts[5])]:
+            self.assertEqual(deltas.apply(base, deltas.encode(base, text)), text)
+
+    def test_chain_is_stored_as_diffs_with_snapshots(self):
+        stored = Episode._base_manager.filter(pk__in=[episode.pk for episode in self.chain]).order_by('id')
+        self.assertEqual([episode.delta_depth for episode in stored], [0, 1, 2, 3, 0, 1])
+        self.assertEqual([episode.content == '' for episode in stored], [False, True, True, True, False, True])
+        self.assertEqual(self.stored_bodies(), self.texts)
+
+    def test_editing_a_base_keeps_its_dependents(self):
+        middle = Episode.objects.get(pk=self.chain[2].pk)
+        middle.body = 'Rewritten entirely'
+        middle.save()
+        self.texts[2] = 'Rewritten entirely'
+        self.assertEqual(self.stored_bodies(), self.texts)
+        self.assertIsNone(Episode._base_manager.get(pk=self.chain[3].pk).content_delta)
+
+    def test_deleting_a_base_keeps_its_dependents(self):
+        Episode.objects.get(pk=self.chain[1].pk).delete()
+        del self.chain[1], self.texts[1]
+        self.assertEqual(self.stored_bodies(), self.texts)
+
+
+class WriteBehindRecoveryTests(TestCase):
+    databases = {'default', 'engagement'}
+
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(ENGAGEMENT_JOURNAL_DIR=self.directory))
+        # The pid of a process that has exited
+        self.dead_pid = subprocess.Popen([sys.executable, '-c', '']).pid
+        os.waitpid(self.dead_pid, 0)
+        StoryLike.objects.create(story_id=1, user_id=2)
+
+    def write_journal(self, name, lines):
+        with open(os.path.join(self.directory, name), 'w') as journal:
+            journal.writelines(lines)
+
+    @staticmethod
+    def change(label, target, owner, engaged):
+        return json.dumps([label, target, owner, int(engaged)]) + '\n'
+
+    def test_replays_the_journals_of_dead_processes(self):
+        self.write_journal(f'{self.dead_pid}.jsonl', [
+            self.change('storyapp.storylike', 1, 1, True),
+            self.change('storyapp.storylike', 1, 2, False),
+            self.change('storyapp.storyfollow', 1, 1, True),
+            self.change('storyapp.storyfollow', 1, 1, False),
+            self.change('storyapp.storyfollow', 3, 1, True),
+            # Torn by the crash
+            '["storyapp.storylike", 5, ',
+        ])
+        self.write_journal(f'{self.dead_pid}.1.flushing', [self.change('storyapp.storylike', 2, 1, True)])
+
+        self.assertEqual(writebehind.recover(), 2)
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(set(StoryLike.objects.values_list('story_id', 'user_id')), {(1, 1), (2, 1)})
+        self.assertEqual(set(StoryFollow.objects.values_list('story_id', 'user_id')), {(3, 1)})
+
+    def test_replaying_twice_changes_nothing(self):
+        lines = [self.change('storyapp.storylike', 1, 1, True), self.change('storyapp.storylike', 1, 2, False)]
+        self.write_journal(f'{self.dead_pid}.jsonl', lines)
+        writebehind.recover()
+        self.write_journal(f'{self.dead_pid}.jsonl', lines)
+        writebehind.recover()
+        self.assertEqual(list(StoryLike.objects.values_list('story_id', 'user_id')), [(1, 1)])
+
+    def test_leaves_the_journals_of_running_processes(self):
+        running = f'{os.getppid()}.jsonl'
+        self.write_journal(running, [self.change('storyapp.storylike', 1, 1, True)])
+        self.write_journal('notes.txt', ['not a journal\n'])
+        self.assertEqual(writebehind.recover(), 0)
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted([running, 'notes.txt']))
+        self.assertFalse(StoryLike.objects.filter(user_id=1).exists())
+
+
+@override_settings(READ_REPLICAS=[])
+class PopulateClearTests(TestCase):
+    databases = {'default', 'engagement'}
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_db', scale=0.3, seed=11, verbosity=0, stdout=io.StringIO())
+
+    def clear(self):
+        populate_db.Command(stdout=io.StringIO())._clear_data()
+
+    def test_clear_removes_content_on_both_databases(self):
+        self.assertTrue(StoryLike.objects.exists())
+        self.clear()
+        for model in (Story, Version, Episode, StoryLike, StoryFollow, EpisodeLike, FavoriteStory):
+            self.assertFalse(model._base_manager.exists(), model.__name__)
+        self.assertTrue(User.objects.exists())
+
+    def test_a_failed_clear_deletes_nothing(self):
+        likes, stories = StoryLike.objects.count(), Story.objects.count()
+        missing = mock.Mock(_meta=mock.Mock(db_table='missing_table', label_lower='storyapp.missing'))
+        with mock.patch.object(populate_db.Command, '_content_models', return_value=[StoryLike, Story, missing]):
+            with self.assertRaises(OperationalError):
+                self.clear()
+        self.assertEqual((StoryLike.objects.count(), Story.objects.count()), (likes, stories))
+
+
+@override_settings(READ_REPLICAS=[])
+class StoryAccessTests(TestCase):
+    databases = {'default', 'engagement'}
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_db', scale=0.3, seed=11, verbosity=0, stdout=io.StringIO())
+
+    @staticmethod
+    def listed(user):
+        request = Request(APIRequestFactory().get('/api/stories/stories/'))
+        request.user = user
+        return set(StoryViewSet(request=request, format_kwarg=None).get_queryset().values_list('id', flat=True))
+
+    @staticmethod
+    def old_listing(user):
+        """StoryViewSet's OR query from before the access table"""
+        invited = StoryInvite.objects.filter(invited_email=user.email, accepted=True).values_list('story_id', flat=True)
+        if user.profile.role == 'subadmin':
+            assigned = User.objects.filter(profile__assigned_to=user).values_list('id', flat=True)
+            # Subadmins now also see their own private stories
+            query = Q(creator__in=assigned) | Q(visibility='public') | Q(id__in=invited) | Q(creator=user)
+        else:
+            query = (
+                Q(visibility='public') | Q(creator=user) | Q(id__in=invited) |
+                Q(visibility='quarantined') | Q(visibility='reported')
+            )
+        return set(Story.objects.filter(query).values_list('id', flat=True))
+
+    def assert_consistent(self):
+        call_command('rebuild_story_access', check=True, stdout=io.StringIO())
+        users = User.objects.filter(profile__role__in=['user', 'subadmin']).select_related('profile')
+        self.assertTrue(users.filter(profile__role='subadmin').exists())
+        for user in users:
+            with self.subTest(user=user.username, role=user.profile.role):
+                self.assertEqual(self.listed(user), self.old_listing(user))
+
+    def test_grants_match_the_old_query_for_every_role(self):
+        self.assert_consistent()
+
+    def test_grants_follow_invites_and_assignments(self):
+        subadmins = list(User.objects.filter(profile__role='subadmin'))
+        with self.captureOnCommitCallbacks(execute=True):
+            for number, user in enumerate(User.objects.filter(profile__role='user')[:6]):
+                user.profile.assigned_to = subadmins[number % len(subadmins)] if number % 2 else None
+                user.profile.save()
+            for invite in StoryInvite.objects.filter(accepted=False, rejected=False)[:3]:
+                invite.accepted = True
+                invite.save()
+            author = User.objects.filter(profile__role='user').last()
+            Story.objects.create(title='New', description='Private', creator=author, visibility='private')
+        self.assert_consistent()
+
+    def test_grants_follow_email_changes(self):
+        author = User.objects.filter(profile__role='user').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            reader = User.objects.create_user('reader', 'reader@example.com', 'secret')
+            story = Story.objects.create(title='Invited', description='Private', creator=author, visibility='private')
+            StoryInvite.objects.create(story=story, invited_by=author, invited_email='Reader.New@Example.com', accepted=True)
+        for email, granted in [('reader.new@example.com', True), ('reader@example.com', False)]:
+            with self.captureOnCommitCallbacks(execute=True):
+                reader.email = email
+                reader.save()
+            self.assertEqual(story.id in self.listed(reader), granted)
+        self.assert_consistent()
+
+    def test_check_reports_drift(self):
+        StoryAccess.objects.filter(pk=StoryAccess.objects.first().pk).delete()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_story_access', check=True, stdout=io.StringIO())
+        call_command('rebuild_story_access', stdout=io.StringIO())
+        self.assert_consistent()
+
+
+@override_settings(READ_REPLICAS=[], DELETION_CHUNK_SIZE=2)
+class DeletionTests(TestCase):
+    databases = {'default', 'engagement'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@example.com', 'secret')
+        cls.writer = User.objects.create_user('writer', 'writer@example.com', 'secret')
+        cls.story = Story.objects.create(title='Story', description='About', creator=cls.owner)
+        cls.versions = [Version.objects.create(story=cls.story, version_number=str(number)) for number in (1, 2)]
+        cls.episodes = [
+            Episode.objects.create(version=version, title='Episode', content='Text', creator=cls.owner)
+            for version in cls.versions for _ in range(3)
+        ]
+        cls.guest = Episode.objects.create(version=cls.versions[0], title='Guest', content='Text', creator=cls.writer)
+
+    def engage(self, user, episodes):
+        StoryLike.objects.create(story=self.story, user=user)
+        StoryFollow.objects.create(story=self.story, user=user)
+        FavoriteStory.objects.create(story=self.story, profile=user.profile)
+        EpisodeLike.objects.bulk_create([EpisodeLike(episode=episode, user=user) for episode in episodes])
+
+    def test_deleting_a_user_hides_their_episodes_in_other_stories(self):
+        deletion.delete_user(self.writer)
+        response = self.client.get(f'/api/stories/{self.story.id}/episodes/')
+        self.assertNotIn(self.guest.id, [episode['id'] for episode in response.json()])
+        self.assertEqual(self.client.get(f'/api/stories/episodes/{self.guest.id}/').status_code, 404)
+        self.assertTrue(Story.objects.filter(pk=self.story.pk).exists())
+
+        deletion.drain()
+        self.assertFalse(Episode._base_manager.filter(pk=self.guest.pk).exists())
+        self.assertEqual(Episode.objects.filter(version__story=self.story).count(), len(self.episodes))
+
+    def test_jobs_are_left_to_the_worker(self):
+        with mock.patch.object(deletion.worker, 'kick') as kick, self.captureOnCommitCallbacks(execute=True):
+            deletion.delete_story(self.story)
+        kick.assert_not_called()
+        call_command('run_deletion_jobs', stdout=io.StringIO())
+        self.assertFalse(Story._base_manager.filter(pk=self.story.pk).exists())
+
+    def test_chunked_deletion_leaves_no_engagement_rows(self):
+        self.engage(self.writer, [*self.episodes, self.guest])
+        self.engage(self.owner, self.episodes)
+        ProfileFollow.objects.create(profile=self.writer.profile, user=self.owner)
+        ProfileFollow.objects.create(profile=self.owner.profile, user=self.writer)
+        deletion.delete_story(self.story)
+        deletion.delete_user(self.writer)
+        self.assertEqual(deletion.drain(), 2)
+
+        episode_ids = [episode.pk for episode in [*self.episodes, self.guest]]
+        self.assertFalse(Episode._base_manager.filter(pk__in=episode_ids).exists())
+        self.assertFalse(EpisodeLike.objects.filter(episode_id__in=episode_ids).exists())
+        for model in (StoryLike, StoryFollow, FavoriteStory):
+            with self.subTest(model=model.__name__):
+                self.assertFalse(model.objects.filter(story_id=self.story.pk).exists())
+        self.assertFalse(ProfileFollow.objects.exists())
+
+
+@override_settings(READ_REPLICAS=[])
+class EngagementToggleTests(TestCase):
+    databases = {'default', 'engagement'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user('reader', 'reader@example.com', 'secret')
+        cls.story = Story.objects.create(title='Story', description='About', creator=cls.reader)
+        version = Version.objects.create(story=cls.story, version_number='00001')
+        cls.episode = Episode.objects.create(version=version, title='Opening', content='Once', creator=cls.reader)
+
+    def setUp(self):
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {Token.objects.create(user=self.reader).key}'
+
+    def test_put_and_delete_can_be_repeated(self):
+        toggles = [
+            (f'/api/stories/stories/{self.story.id}/like/', StoryLike, 'liked', 'likes_count'),
+            (f'/api/stories/stories/{self.story.id}/follow/', StoryFollow, 'following', 'followers_count'),
+            (f'/api/stories/episodes/{self.episode.id}/like/', EpisodeLike, 'liked', 'likes_count'),
+        ]
+        for path, model, state_key, count_key in toggles:
+            with self.subTest(path=path):
+                for method, engaged in [('put', True), ('put', True), ('delete', False), ('delete', False)]:
+                    response = getattr(self.client, method)(path)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.json(), {state_key: engaged, count_key: int(engaged)})
+                    self.assertEqual(model.objects.count(), int(engaged))
+
+    def test_post_refuses_a_change_already_in_place(self):
+        path = f'/api/stories/stories/{self.story.id}/like/'
+        self.assertEqual(self.client.post(path).json(), {'liked': True, 'likes_count': 1, 'detail': 'Liked successfully.'})
+        self.assertEqual(self.client.post(path).status_code, 400)
+        self.assertEqual(StoryLike.objects.count(), 1)
+
+
+@override_settings(READ_REPLICAS=[])
+class InviteMatchingTests(TestCase):
+    databases = {'default', 'engagement'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'secret')
+        cls.story = Story.objects.create(title='Story', description='About', creator=cls.author, visibility='private')
+        # Stored before addresses were normalized
+        cls.invite = StoryInvite.objects.create(story=cls.story, invited_by=cls.author, invited_email=' Reader@Example.COM ')
+
+    def login(self, user):
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {Token.objects.create(user=user).key}'
+
+    def test_a_new_account_is_matched_to_its_invites(self):
+        reader = User.objects.create_user('reader', 'READER@example.com', 'secret')
+        self.invite.refresh_from_db()
+        self.assertEqual(self.invite.invited_user, reader)
+
+    def test_the_invitee_lists_and_accepts_the_invite(self):
+        reader = User.objects.create_user('reader', 'reader@EXAMPLE.com ', 'secret')
+        self.login(reader)
+        response = self.client.get('/api/stories/story-invites/')
+        self.assertEqual([invite['id'] for invite in response.json()], [self.invite.id])
+        response = self.client.post(f'/api/stories/story-invites/{self.invite.id}/accept/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_an_address_is_invited_once(self):
+        self.login(self.author)
+        response = self.client.post(
+            '/api/stories/story-invites/', {'story': self.story.id, 'invited_email': 'reader@example.com'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'invited_email': 'This user is already invited to this story.'})
+        self.assertEqual(StoryInvite.objects.count(), 1)
+
+
+@override_settings(READ_REPLICAS=[], ENGAGEMENT_WRITE_BEHIND=True, ENGAGEMENT_FLUSH_SECONDS=3600)
+class EngagementStatusTests(TestCase):
+    databases = {'default', 'engagement'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user('reader', 'reader@example.com', 'secret')
+        cls.liked, cls.followed = [
+            Story.objects.create(title=title, description='About', creator=cls.reader) for title in ('Liked', 'Followed')
+        ]
+        version = Version.objects.create(story=cls.liked, version_number='00001')
+        cls.episode = Episode.objects.create(version=version, title='Opening', content='Once', creator=cls.reader)
+        StoryLike.objects.create(story=cls.liked, user=cls.reader)
+        StoryFollow.objects.create(story=cls.followed, user=cls.reader)
+        FavoriteStory.objects.create(story=cls.liked, profile=cls.reader.profile)
+
+    def setUp(self):
+        self.enterContext(override_settings(ENGAGEMENT_JOURNAL_DIR=self.enterContext(tempfile.TemporaryDirectory())))
+        # Flushed by the test only: the buffer's thread waits for an hour
+        self.buffer = writebehind.WriteBehindBuffer()
+        self.enterContext(mock.patch.object(writebehind, 'buffer', self.buffer))
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {Token.objects.create(user=self.reader).key}'
+
+    def status(self):
+        response = self.client.get(
+            f'/api/stories/engagement/status/?stories={self.liked.id},{self.followed.id},99999999&episodes={self.episode.id}'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_buffered_changes_are_reported_before_they_are_written(self):
+        self.client.delete(f'/api/stories/stories/{self.liked.id}/like/')
+        self.client.put(f'/api/stories/stories/{self.followed.id}/like/')
+        self.client.put(f'/api/stories/episodes/{self.episode.id}/like/')
+        self.assertEqual(set(StoryLike.objects.values_list('story_id', flat=True)), {self.liked.id})
+        self.assertFalse(EpisodeLike.objects.exists())
+
+        expected = {
+            'stories': {
+                str(self.liked.id): {'liked': False, 'followed': False, 'favorited': True},
+                str(self.followed.id): {'liked': True, 'followed': True, 'favorited': False},
+                '99999999': {'liked': False, 'followed': False, 'favorited': False},
+            },
+            'episodes': {str(self.episode.id): {'liked': True}},
+        }
+        self.assertEqual(self.status(), expected)
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(set(StoryLike.objects.values_list('story_id', flat=True)), {self.followed.id})
+        self.assertEqual(self.status(), expected)
+
+
+@override_settings(READ_REPLICAS=[], TRENDING_FLUSH_SECONDS=0)
+class TrendingTests(TestCase):
+    databases = {'default', 'engagement'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user('reader', 'reader@example.com', 'secret')
+        fantasy, crime = Category.objects.create(name='Fantasy'), Category.objects.create(name='Crime')
+        cls.fantasy = fantasy
+        cls.liked, cls.followed, cls.continued, cls.private = [
+            Story.objects.create(title=title, description='About', creator=cls.reader, category=category, visibility=visibility)
+            for title, category, visibility in [
+                ('Liked', fantasy, 'public'), ('Followed', fantasy, 'public'),
+                ('Continued', crime, 'public'), ('Private', fantasy, 'private'),
+            ]
+        ]
+
+    def setUp(self):
+        # Leftovers of other tests must not be flushed onto these stories
+        self.enterContext(mock.patch.object(trending, 'buffer', trending.TrendBuffer()))
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {Token.objects.create(user=self.reader).key}'
+
+    def test_top_ranks_by_weight_within_a_category(self):
+        trending.record(self.liked.id, 'like')
+        trending.record(self.followed.id, 'follow')
+        trending.record(self.continued.id, 'episode')
+        trending.record(self.private.id, 'follow')
+        self.assertEqual(trending.top(10), [])
+        self.assertEqual(trending.buffer.flush(), 4)
+
+        ranked = trending.top(10)
+        self.assertEqual([story_id for story_id, _ in ranked], [self.continued.id, self.followed.id, self.liked.id])
+        for (_, score), expected in zip(ranked, [5.0, 3.0, 1.0]):
+            self.assertAlmostEqual(score, expected, places=3)
+        self.assertEqual([story_id for story_id, _ in trending.top(10, self.fantasy.id)], [self.followed.id, self.liked.id])
+        self.assertEqual([story_id for story_id, _ in trending.top(1)], [self.continued.id])
+
+    def test_likes_are_written_after_the_response(self):
+        calls = []
+        write = trending.bump
+
+        def bump(increments):
+            # ReplicaRoutingMiddleware only has a state set while it handles a request
+            calls.append(routers._replica_state.get())
+            write(increments)
+
+        with mock.patch.object(trending, 'bump', bump):
+            self.assertEqual(self.client.put(f'/api/stories/stories/{self.liked.id}/like/').status_code, 200)
+            self.assertEqual(self.client.put(f'/api/stories/stories/{self.liked.id}/like/').status_code, 200)
+        self.assertEqual(calls, [None])
+        self.assertEqual([story_id for story_id, _ in trending.top(10)], [self.liked.id])
+
+    def test_reading_the_ranking_does_not_pin_to_the_primary(self):
+        trending.record(self.liked.id, 'like')
+        trending.buffer.flush()
+        state = routers.activate_replicas(True)
+        self.addCleanup(routers.deactivate_replicas)
+        trending.top(10)
+        self.assertFalse(state.wrote)
+
+
+class RelatedStoriesTests(TestCase):
+    databases = {'default', 'engagement'}
+
+    def test_neighbours_after_a_build(self):
+        first, second, third = [User.objects.create_user(f'reader{n}', f'reader{n}@example.com', 'secret') for n in range(3)]
+        a, b, c, d, unread = [
+            Story.objects.create(title=title, description='About', creator=first) for title in 'ABCDE'
+        ]
+        for user, story in [(first, a), (first, b), (second, a), (second, b)]:
+            StoryLike.objects.create(user=user, story=story)
+        for user in (second, third):
+            StoryFollow.objects.create(user=user, story=c)
+        FavoriteStory.objects.create(profile=third.profile, story=d)
+
+        self.assertEqual(recommendations.build(), (4, 8))
+        # Cosine of the weighted engagement: like 1, follow and favorite 2
+        expected = {
+            a: [(b, 1.0), (c, 0.5)],
+            c: [(d, 0.5 ** 0.5), (a, 0.5), (b, 0.5)],
+            d: [(c, 0.5 ** 0.5)],
+            unread: [],
+        }
+        for story, related in expected.items():
+            found = recommendations.neighbours(story.id)
+            self.assertEqual([story_id for story_id, _ in found], [other.id for other, _ in related])
+            for (_, score), (_, expected_score) in zip(found, related):
+                self.assertAlmostEqual(score, expected_score)
+
+        recommendations.build(top_n=1)
+        self.assertEqual([story_id for story_id, _ in recommendations.neighbours(c.id)], [d.id])
+
+
+@override_settings(READ_REPLICAS=[])
+class CategoryRegistryTests(TestCase):
+    databases = {'default', 'engagement'}
+
+    def setUp(self):
+        self.registry = categories.CategoryRegistry()
+        self.enterContext(mock.patch.object(categories, 'registry', self.registry))
+        self.fantasy = Category.objects.create(name='Fantasy')
+        self.assertEqual(self.registry.all(), [self.fantasy])
+
+    def test_saving_and_deleting_invalidate_the_registry(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fantasy.name = 'High Fantasy'
+            self.fantasy.save()
+        self.assertEqual(self.registry.get(self.fantasy.pk).name, 'High Fantasy')
+        self.assertEqual(self.registry.by_name(' high  FANTASY '), self.fantasy)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fantasy.delete()
+        self.assertEqual(self.registry.all(), [])
+
+    def test_a_miss_does_not_pin_to_the_primary(self):
+        state = routers.activate_replicas(True)
+        self.addCleanup(routers.deactivate_replicas)
+        self.assertIsNone(self.registry.by_name('Crime'))
+        crime = Category.objects.create(name='Crime')
+        state.wrote = False
+        self.assertEqual(self.registry.resolve('crime'), crime)
+        self.assertFalse(state.wrote)
+
+
+@override_settings(READ_REPLICAS=[])
+class MetricsTests(TestCase):
+    databases = {'default', 'engagement'}
+
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(METRICS_DIR=self.directory))
+        self.registry = metrics.Registry()
+        # No flush thread: the tests flush themselves
+        self.enterContext(mock.patch.object(self.registry, '_start'))
+        self.requests = self.registry.counter('requests_total', 'Requests', ('view',))
+        self.dead_pid = subprocess.Popen([sys.executable, '-c', '']).pid
+        os.waitpid(self.dead_pid, 0)
+
+    def write(self, pid, count):
+        with open(os.path.join(self.directory, f'{pid}.json'), 'w') as metrics_file:
+            json.dump({'requests_total': [[['feed'], count]]}, metrics_file)
+
+    def test_files_of_exited_processes_are_taken_over_once(self):
+        self.write(self.dead_pid, 2)
+        self.write(os.getppid(), 5)
+        self.requests.inc(view='feed')
+        self.assertEqual(self.registry.prune(), 1)
+        self.assertEqual(self.registry.prune(), 0)
+        self.assertEqual(sorted(os.listdir(self.directory)), [f'{os.getppid()}.json'])
+        self.assertEqual(self.registry.collect()['requests_total'], {('feed',): 8})
+
+    def test_a_file_left_under_a_reused_pid_is_taken_over(self):
+        self.write(os.getpid(), 3)
+        self.assertEqual(self.registry.prune(), 1)
+        self.requests.inc(view='feed')
+        self.registry.flush()
+        self.assertEqual(self.registry.prune(), 0)
+        self.assertEqual(self.registry.collect()['requests_total'], {('feed',): 4})
+
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_endpoint_needs_the_token_or_a_staff_user(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token').status_code, 200)
+
+        self.client.force_login(User.objects.create_user('reader', 'reader@example.com', 'secret'))
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(User.objects.create_user('staff', 'staff@example.com', 'secret', is_staff=True))
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE http_requests_total counter', response.content)
@@ -0,0 +1,188 @@
+"""
+Trending stories.
+
+Every like, follow, new episode and read adds its TRENDING_WEIGHTS entry to
+the story's score, and scores decay exponentially with a half-life of
+TRENDING_HALF_LIFE_HOURS. Rather than decaying every row as time passes,
+an event at time t adds ``weight * exp((t - epoch) / tau)``, where ``epoch``
+is the single TrendingState row. All stored scores share that scale, so the
+ranking by stored score is the ranking by decayed score, an update touches
+one row, and the top K is read straight off the score index.
+
+The scale doubles every half-life. renormalize_trending moves the epoch to
+now and rescales every row with one UPDATE in the same transaction. Run it
+about daily: a float only overflows after roughly a thousand half-lives,
+but smaller numbers keep more precision. Each increment reads the epoch
+inside its own UPDATE, so it cannot use a stale one.
+
+Unlikes and unfollows subtract the weight at the time they happen.
+
+Events are not written where they happen. Likes, follows, reads and new
+episodes add to a per-process buffer, and storyapp.signals writes it after
+a response has been sent, at most every TRENDING_FLUSH_SECONDS, in one
+transaction. A like or follow therefore takes no write lock on the default
+database, and reading /trending writes nothing, so it keeps its client on
+the read replicas. An increment is scaled as of its flush rather than its
+event, off by a factor of at most exp(TRENDING_FLUSH_SECONDS / tau).
+"""
+import atexit
+from collections import Counter
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, FloatField, Subquery, Value
+from django.db.models.functions import Exp
+
+from .models import Story, StoryTrend, TrendingState
+
+logger = logging.getLogger('storyapp.trending')
+
+DEFAULT_WEIGHTS = {'like': 1.0, 'follow': 3.0, 'episode': 5.0, 'read': 0.1}
+
+# Stories whose decayed score falls below this are dropped on renormalizing
+MIN_SCORE = 1e-3
+
+
+def tau():
+    """Seconds for a score to fall by a factor of e"""
+    return getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 24) * 3600 / math.log(2)
+
+
+def weight(kind):
+    return getattr(settings, 'TRENDING_WEIGHTS', DEFAULT_WEIGHTS).get(kind, DEFAULT_WEIGHTS[kind])
+
+
+def epoch():
+    """The stored epoch; migration 0032 creates its row, which only writes ever recreate"""
+    stored = TrendingState.objects.filter(pk=1).values_list('epoch', flat=True).first()
+    return stored if stored is not None else time.time()
+
+
+def _ensure_state():
+    # Once per flush, which is rare enough not to remember it
+    TrendingState.objects.get_or_create(pk=1, defaults={'epoch': time.time()})
+
+
+def _scale():
+    """exp((now - epoch) / tau), evaluated by the database against the stored epoch"""
+    stored_epoch = Subquery(TrendingState.objects.filter(pk=1).values('epoch')[:1])
+    return Exp((Value(time.time()) - stored_epoch) / Value(tau()), output_field=FloatField())
+
+
+def bump(increments):
+    """Adds {story_id: weight} to the scores as of now, in one transaction"""
+    increments = {pk: amount for pk, amount in increments.items() if amount}
+    if not increments:
+        return
+    _ensure_state()
+    categories = dict(Story.objects.filter(pk__in=increments).values_list('id', 'category_id'))
+    by_amount = {}
+    for story_id, amount in increments.items():
+        if story_id in categories:
+            by_amount.setdefault(amount, []).append(story_id)
+    with transaction.atomic():
+        StoryTrend.objects.bulk_create(
+            [StoryTrend(story_id=pk, category_id=categories[pk]) for pk in categories], ignore_conflicts=True
+        )
+        for amount, story_ids in by_amount.items():
+            StoryTrend.objects.filter(story_id__in=story_ids).update(score=F('score') + amount * _scale())
+
+
+class TrendBuffer:
+    """Score increments of this process, summed per story until they are flushed"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._flushed_at = time.monotonic()
+
+    def add(self, story_id, amount):
+        with self._lock:
+            self._pending[story_id] += amount
+
+    def due(self):
+        with self._lock:
+            waited = time.monotonic() - self._flushed_at
+            return bool(self._pending) and waited >= getattr(settings, 'TRENDING_FLUSH_SECONDS', 10)
+
+    def flush(self):
+        """Adds the buffered increments to the scores; returns how many stories they touched"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            bump(pending)
+        except Exception:
+            # Kept for the next flush
+            with self._lock:
+                self._pending.update(pending)
+            raise
+        return len(pending)
+
+
+buffer = TrendBuffer()
+
+
+def flush_if_due():
+    if not buffer.due():
+        return
+    try:
+        buffer.flush()
+    except Exception:
+        logger.exception('Could not write trending scores; they stay buffered')
+
+
+def _flush_at_exit():
+    try:
+        buffer.flush()
+    except Exception:
+        logger.exception('Could not write trending scores at exit')
+
+
+atexit.register(_flush_at_exit)
+
+
+def record(story_id, kind, sign=1):
+    buffer.add(story_id, sign * weight(kind))
+
+
+def record_read(story_id):
+    record(story_id, 'read')
+
+
+def top(limit, category_id=None):
+    """
+    [(story_id, decayed score)] of the ``limit`` highest scoring public
+    stories, optionally in one category
+    """
+    trends = StoryTrend.objects.filter(story__visibility=Story.PUBLIC, score__gt=0)
+    if category_id is not None:
+        trends = trends.filter(category_id=category_id)
+    rows = list(trends.order_by('-score').values_list('story_id', 'score')[:limit])
+    decay = math.exp(-(time.time() - epoch()) / tau())
+    return [(story_id, score * decay) for story_id, score in rows]
+
+
+def renormalize():
+    """
+    Moves the epoch to now, rescaling every stored score, and drops the
+    stories whose score has decayed below MIN_SCORE. Returns (rescaled, dropped).
+    """
+    _ensure_state()
+    with transaction.atomic():
+        # A write first takes SQLite's write lock before the epoch is read,
+        # so no increment can land between reading and rescaling
+        TrendingState.objects.filter(pk=1).update(epoch=F('epoch'))
+        previous = epoch()
+        now = time.time()
+        TrendingState.objects.filter(pk=1).update(epoch=now)
+        factor = math.exp(-(now - previous) / tau())
+        rescaled = StoryTrend.objects.update(score=F('score') * factor)
+        dropped, _ = StoryTrend.objects.filter(score__lt=MIN_SCORE).delete()
+    return rescaled - dropped, dropped
@@ -9,7 +9,9 @@ from .views import (
     SubadminStoryListView, SubadminStoryVisibilityView, EpisodeReportsView, EpisodeReportViewSet,
     SubmitEpisodeForApprovalView,
     QuarantinedEpisodesListView,StoriesWithReportedEpisodesView,UserEpisodesWithReportedStoriesView,PendingEpisodesView,
-    DeleteEpisodeView,AdminEpisodeReviewView,ApproveEpisodeView,RejectEpisodeView,AdminDeleteStoryView,AdminPendingEpisodesView,CategoryViewSet,StoryInviteViewSet
+    DeleteEpisodeView,AdminEpisodeReviewView,ApproveEpisodeView,RejectEpisodeView,AdminDeleteStoryView,DeletionJobView,AdminPendingEpisodesView,CategoryViewSet,StoryInviteViewSet,
+    AdminProfileCaptureListView, AdminProfileCaptureDetailView, NotificationViewSet,
+    EngagementStatusView, TrendingStoriesView
 )
 
 router = DefaultRouter()
@@ -21,10 +23,15 @@ router.register(r'episode-reports', EpisodeReportViewSet)  # Fix: remove 'views.
 router.register('organizations', OrganizationViewSet)
 router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'story-invites', StoryInviteViewSet, basename='story-invite')
+router.register(r'notifications', NotificationViewSet, basename='notification')
 
 from django.urls import path
 from . import views
 from .views import UserQuarantinedEpisodesView
+from .async_views import (
+    AsyncPublicStoryListView, AsyncPublicStoryDetailView, AsyncEpisodesByStoryView,
+    AsyncCategoryListView, AsyncCategoryDetailView, AsyncEpisodeEventStreamView
+)
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -32,6 +39,15 @@ urlpatterns = [
     # Public endpoints
     path('public/stories/', PublicStoryListView.as_view(), name='public-stories'),
     path('public/stories/<int:pk>/', PublicStoryDetailView.as_view(), name='public-story-detail'),
+    path('trending/', TrendingStoriesView.as_view(), name='trending-stories'),
+
+    # Async variants of the public read endpoints, for ASGI deployments
+    path('async/public/stories/', AsyncPublicStoryListView.as_view(), name='async-public-stories'),
+    path('async/public/stories/<int:pk>/', AsyncPublicStoryDetailView.as_view(), name='async-public-story-detail'),
+    path('async/<int:story_id>/episodes/', AsyncEpisodesByStoryView.as_view(), name='async-episodes-by-story'),
+    path('async/categories/', AsyncCategoryListView.as_view(), name='async-categories'),
+    path('async/categories/<int:pk>/', AsyncCategoryDetailView.as_view(), name='async-category-detail'),
+    path('async/events/', AsyncEpisodeEventStreamView.as_view(), name='async-episode-events'),
     
     # Admin endpoints
     path('admin/users/', AdminUserListView.as_view(), name='admin-users'),
@@ -49,6 +65,8 @@ urlpatterns = [
     # New URL pattern for adding multiple members to specific organization
     path('accounts/organizations/<int:org_id>/add-member/', AddUserToOrganizationView.as_view(), name='add-members-to-organization'),
     path('admin/subadmin/stories/', SubadminStoryListView.as_view(), name='subadmin-stories'),
+    # Liked, followed and favorited flags of many stories and episodes at once
+    path('engagement/status/', EngagementStatusView.as_view(), name='engagement-status'),
     path('admin/subadmin/stories/<int:story_id>/visibility/', SubadminStoryVisibilityView.as_view(), name='subadmin_change_story_visibility'),
     # Add nested URLs for episodes
     path('<int:story_id>/episodes/', EpisodeViewSet.as_view({'post': 'create', 'get': 'by_story'})),
@@ -71,5 +89,9 @@ urlpatterns = [
     path('admin/episodes/<int:episode_id>/reject/', RejectEpisodeView.as_view(), name='reject-episode'),
     # Admin story deletion endpoint
     path('admin/stories/<int:story_id>/delete/', AdminDeleteStoryView.as_view(), name='admin-delete-story'),
+    path('admin/deletions/<int:job_id>/', DeletionJobView.as_view(), name='admin-deletion-job'),
+    # Request profiles captured with the X-Profile header
+    path('admin/profiles/', AdminProfileCaptureListView.as_view(), name='admin-profile-captures'),
+    path('admin/profiles/<str:capture_id>/', AdminProfileCaptureDetailView.as_view(), name='admin-profile-capture-detail'),
     
 ]
@@ -3,23 +3,49 @@ from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticate
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.pagination import CursorPagination
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.http import FileResponse
 from django.contrib.auth.models import User
 from rest_framework.permissions import AllowAny
 from accounts.models import Profile
 from .models import Story, Version, Episode, StoryReport, Organization , Category,StoryInvite
+from .models import StoryLike, StoryFollow, EpisodeLike, Notification, DeletionJob
+from . import access, categories, deletion, diffs, engagement, recommendations, trending
 from .serializers import (
-    StorySerializer, VersionSerializer, EpisodeSerializer, 
+    StorySerializer, VersionSerializer, EpisodeSerializer, EpisodeSummarySerializer, ReaderEpisodeSerializer, ReaderSummarySerializer,
     StoryReportSerializer, OrganizationSerializer, EpisodeReportSerializer, EpisodeReport,CategorySerializer,StoryInviteSerializer,
+    NotificationSerializer, DeletionJobSerializer, SUMMARY_RELATIONS,
 )
 from accounts.serializers import UserSerializer
+from story_project import profiling
 # Remove the circular import - don't import from .views
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.db.models import Q
 from rest_framework import serializers
 
 
+def engagement_response(request, model, field, obj, engaged, state_key, count_key, messages):
+    """
+    Shared body of the like and follow actions. PUT and DELETE set the state
+    and succeed however often they are repeated; POST keeps its original
+    contract of refusing a change that is already in place. ``messages`` is
+    the POST (success, refusal) pair.
+    """
+    changed, count = engagement.set_engaged(model, field, obj.pk, request.user.id, engaged)
+    if changed:
+        story_id = obj.pk if isinstance(obj, Story) else obj.version.story_id
+        trending.record(story_id, 'follow' if model is StoryFollow else 'like', 1 if engaged else -1)
+    if request.method == 'POST' and not changed:
+        return Response({'detail': messages[1]}, status=status.HTTP_400_BAD_REQUEST)
+    data = {state_key: engaged, count_key: count}
+    if request.method == 'POST':
+        data['detail'] = messages[0]
+    return Response(data)
+
+
 class IsCreatorOrReadOnly(IsAuthenticatedOrReadOnly):
     def has_object_permission(self, request, view, obj):
         if request.method in ['GET', 'HEAD', 'OPTIONS']:
@@ -57,6 +83,11 @@ class PublicStoryListView(generics.ListAPIView):
 
 class PublicStoryDetailView(generics.RetrieveAPIView):
     serializer_class = StorySerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        trending.record_read(response.data['id'])
+        return response
     
     def get_queryset(self):
         user = self.request.user
@@ -82,9 +113,8 @@ class StoryInviteViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def accept(self, request, pk=None):
         invite = self.get_object()
-        user_email = request.user.email.lower()
 
-        if invite.invited_email.lower() != user_email:
+        if invite.normalized_email != StoryInvite.normalize_email(request.user.email):
             return Response({'detail': 'You are not authorized to accept this invite.'}, status=403)
 
         if invite.accepted:
@@ -98,9 +128,8 @@ class StoryInviteViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def reject(self, request, pk=None):
         invite = self.get_object()
-        user_email = request.user.email.lower()
 
-        if invite.invited_email.lower() != user_email:
+        if invite.normalized_email != StoryInvite.normalize_email(request.user.email):
             return Response({'detail': 'You are not authorized to reject this invite.'}, status=403)
 
         if invite.accepted:
@@ -116,7 +145,7 @@ class StoryInviteViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         return StoryInvite.objects.filter(
-            invited_email__iexact=self.request.user.email,
+            normalized_email=StoryInvite.normalize_email(self.request.user.email),
             accepted=False,
             rejected=False
         )
@@ -131,7 +160,7 @@ class StoryInviteViewSet(viewsets.ModelViewSet):
 
         # Prevent duplicate invites to the same story
         story = serializer.validated_data['story']
-        if StoryInvite.objects.filter(invited_email__iexact=invited_email, story=story).exists():
+        if StoryInvite.objects.filter(normalized_email=StoryInvite.normalize_email(invited_email), story=story).exists():
             raise serializers.ValidationError({'invited_email': 'This user is already invited to this story.'})
 
         # Match user if registered
@@ -147,21 +176,146 @@ class StoryInviteViewSet(viewsets.ModelViewSet):
         invite.send_invitation_email()
 
 class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+    """Served from the in-memory category registry (storyapp.categories)"""
     queryset = Category.objects.all().order_by('name')
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
 
+    def list(self, request):
+        return Response(self.get_serializer(categories.registry.all(), many=True).data)
+
+    def retrieve(self, request, pk=None):
+        category = categories.registry.get(int(pk)) if pk.isdigit() else None
+        if category is None:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(self.get_serializer(category).data)
+
+class TrendingStoriesView(APIView):
+    """
+    Public stories ranked by trending score (storyapp.trending), read off
+    the score index: ?limit=<n>&category=<id or name>
+    """
+    permission_classes = [AllowAny]
+    max_limit = 100
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= limit <= self.max_limit:
+            return Response({'error': f'limit must be between 1 and {self.max_limit}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        category_id = None
+        category_param = request.query_params.get('category')
+        if category_param:
+            category = categories.registry.resolve(category_param)
+            if category is None:
+                return Response({'error': 'Category not found'}, status=status.HTTP_404_NOT_FOUND)
+            category_id = category.pk
+
+        ranked = trending.top(limit, category_id)
+        stories = Story.objects.select_related('category', 'creator__profile__assigned_to__profile').in_bulk(
+            [story_id for story_id, _ in ranked]
+        )
+        ranked = [(stories[story_id], score) for story_id, score in ranked if story_id in stories]
+        data = StorySerializer([story for story, _ in ranked], many=True, context={'request': request}).data
+        for item, (_, score) in zip(data, ranked):
+            item['trending_score'] = round(score, 4)
+        return Response(data)
+
+class EngagementStatusView(APIView):
+    """
+    The current user's flags for a page of content:
+    ?stories=1,2,3&episodes=4,5 returns whether each story is liked,
+    followed and favorited and whether each episode is liked, with one
+    set-based query per flag. Unknown ids are reported as false.
+    """
+    permission_classes = [IsAuthenticated]
+    max_ids = 200
+
+    def get(self, request):
+        try:
+            story_ids, episode_ids = (
+                list(dict.fromkeys(int(part) for part in request.query_params.get(name, '').split(',') if part.strip()))
+                for name in ('stories', 'episodes')
+            )
+        except ValueError:
+            return Response({'error': 'stories and episodes must be comma-separated ids'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(story_ids) > self.max_ids or len(episode_ids) > self.max_ids:
+            return Response({'error': f'At most {self.max_ids} stories and {self.max_ids} episodes per request'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        lookup = engagement.engagement_lookup({'request': request})
+        lookup.prime_story_status(story_ids)
+        lookup.prime_episode_status(episode_ids)
+        return Response({
+            'stories': {
+                pk: {
+                    'liked': lookup.status('story_liked', pk),
+                    'followed': lookup.status('story_followed', pk),
+                    'favorited': lookup.status('story_favorited', pk),
+                }
+                for pk in story_ids
+            },
+            'episodes': {pk: {'liked': lookup.status('episode_liked', pk)} for pk in episode_ids},
+        })
+
+class NotificationPagination(CursorPagination):
+    # Keyset pages over the (recipient, -id) index; no COUNT of the inbox
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
+
+class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
+    """The user's inbox, newest first; ?unread=true lists only unread notifications"""
+    serializer_class = NotificationSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = NotificationPagination
+
+    def get_queryset(self):
+        queryset = Notification.objects.filter(recipient=self.request.user).select_related(
+            'actor', 'story', 'episode'
+        ).defer('episode__content', 'episode__content_delta')
+        if self.action == 'list' and self.request.query_params.get('unread', '').lower() == 'true':
+            queryset = queryset.filter(read_at__isnull=True)
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        count = Notification.objects.filter(recipient=request.user, read_at__isnull=True).count()
+        return Response({'unread': count})
+
+    @action(detail=True, methods=['post'])
+    def read(self, request, pk=None):
+        notification = self.get_object()
+        if notification.read_at is None:
+            notification.read_at = timezone.now()
+            notification.save(update_fields=['read_at'])
+        return Response(self.get_serializer(notification).data)
+
+    @action(detail=False, methods=['post'])
+    def read_all(self, request):
+        marked = Notification.objects.filter(recipient=request.user, read_at__isnull=True).update(read_at=timezone.now())
+        return Response({'marked_read': marked})
+
 class StoryViewSet(viewsets.ModelViewSet):
     serializer_class = StorySerializer
     permission_classes = [IsCreatorOrReadOnly|IsAdmin|IsSubadmin]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    related_page_size = 10
+    related_max_page_size = 50
     
     def get_queryset(self):
         user = self.request.user
         queryset = Story.objects.all()
 
-    # CATEGORY FILTER (apply later)
+    # CATEGORY FILTER (apply later), resolved to an id in memory
         category_param = self.request.query_params.get('category')
+        if category_param:
+            category = categories.registry.by_name(category_param)
+            category_filter = Q(category_id=category.pk) if category is not None else Q(pk__in=[])
 
     # ✅ Unauthenticated users — safe default
         if not user.is_authenticated:
@@ -171,81 +325,61 @@ class StoryViewSet(viewsets.ModelViewSet):
             Q(visibility='reported')
             )
             if category_param:
-                queryset = queryset.filter(category__name__iexact=category_param)
+                queryset = queryset.filter(category_filter)
             return queryset
 
     # ✅ Authenticated user logic continues here...
         role = getattr(user.profile, 'role', None)
 
-        invited_story_ids = StoryInvite.objects.filter(
-        invited_email=user.email,
-        accepted=True
-        ).values_list('story_id', flat=True)
-
         if role == 'admin':
             pass  # Admin sees everything, leave queryset unchanged
 
-        elif role == 'subadmin':
-            assigned_user_ids = User.objects.filter(
-            profile__assigned_to=user
-            ).values_list('id', flat=True)
-
-            queryset = queryset.filter(
-            Q(creator__in=assigned_user_ids) |
-            Q(visibility='public') |
-            Q(id__in=invited_story_ids)
-        ).distinct()
-
         else:
-        # Normal user
+        # Everyone else: the visibilities open to their role, plus the stories
+        # they created, were invited to or manage (storyapp.access)
+            visible = ['public'] if role == 'subadmin' else ['public', 'quarantined', 'reported']
             queryset = queryset.filter(
-            Q(visibility='public') |
-            Q(creator=user) |
-            Q(id__in=invited_story_ids) |
-            Q(visibility='quarantined') |
-            Q(visibility='reported') |
-            Q(visibility='private', creator=user)
-            ).distinct()
+            Q(visibility__in=visible) |
+            Q(id__in=access.visible_to(user.pk))
+            )
 
         if category_param:
-            queryset = queryset.filter(category__name__iexact=category_param)
+            queryset = queryset.filter(category_filter)
 
         return queryset
 
     def perform_create(self, serializer):
         serializer.save(creator=self.request.user)
 
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    @action(detail=True, methods=['post', 'put', 'delete'], permission_classes=[IsAuthenticated])
     def like(self, request, pk=None):
-        story = self.get_object()
-        if request.user in story.liked_by.all():
-            return Response({'detail': 'Already liked.'}, status=400)
-        story.liked_by.add(request.user)
-        return Response({'detail': 'Liked successfully.'})
+        # PUT likes and DELETE unlikes idempotently
+        return engagement_response(
+            request, StoryLike, 'story', self.get_object(), request.method != 'DELETE',
+            'liked', 'likes_count', ('Liked successfully.', 'Already liked.')
+        )
     
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def unlike(self, request, pk=None):
-        story = self.get_object()
-        if request.user not in story.liked_by.all():
-            return Response({'detail': 'Not liked yet.'}, status=400)
-        story.liked_by.remove(request.user)
-        return Response({'detail': 'Unliked successfully.'})
+        return engagement_response(
+            request, StoryLike, 'story', self.get_object(), False,
+            'liked', 'likes_count', ('Unliked successfully.', 'Not liked yet.')
+        )
 
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    @action(detail=True, methods=['post', 'put', 'delete'], permission_classes=[IsAuthenticated])
     def follow(self, request, pk=None):
-        story = self.get_object()
-        if request.user in story.followed_by.all():
-            return Response({'detail': 'Already following.'}, status=400)
-        story.followed_by.add(request.user)
-        return Response({'detail': 'Followed successfully.'})
+        # PUT follows and DELETE unfollows idempotently
+        return engagement_response(
+            request, StoryFollow, 'story', self.get_object(), request.method != 'DELETE',
+            'following', 'followers_count', ('Followed successfully.', 'Already following.')
+        )
     
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def unfollow(self, request, pk=None):
-        story = self.get_object()
-        if request.user not in story.followed_by.all():
-            return Response({'detail': 'Not following yet.'}, status=400)
-        story.followed_by.remove(request.user)
-        return Response({'detail': 'Unfollowed successfully.'})
+        return engagement_response(
+            request, StoryFollow, 'story', self.get_object(), False,
+            'following', 'followers_count', ('Unfollowed successfully.', 'Not following yet.')
+        )
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def report(self, request, pk=None):
@@ -264,20 +398,56 @@ class StoryViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def feed(self, request):
-        # Get stories from users that the current user follows
-        following_users = request.user.profile.following.all()
+        # Get stories from users that the current user follows; the follow
+        # tables are in the engagement database, so resolve them to ids first
+        following_users = engagement.following_user_ids(request.user.profile)
+        followed_stories = engagement.followed_story_ids(request.user)
         stories = Story.objects.filter(
             Q(creator__in=following_users, visibility='public') | 
-            Q(followed_by=request.user)
+            Q(id__in=followed_stories)
         ).distinct().order_by('-created_at')
         serializer = self.get_serializer(stories, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """
+        Stories engaged with by the same readers, closest first: ?limit=<n>.
+        Neighbours come precomputed from build_related_stories; only the
+        ones this user may see are returned.
+        """
+        story = self.get_object()
+        try:
+            limit = int(request.query_params.get('limit', self.related_page_size))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= limit <= self.related_max_page_size:
+            return Response(
+                {'error': f'limit must be between 1 and {self.related_max_page_size}'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        ranked = recommendations.neighbours(story.pk)
+        visible = {
+            related.pk: related
+            for related in self.get_queryset().filter(pk__in=[story_id for story_id, _ in ranked]).select_related(
+                'category', 'creator__profile__assigned_to__profile'
+            )
+        }
+        ranked = [(visible[story_id], score) for story_id, score in ranked if story_id in visible][:limit]
+        data = self.get_serializer([related for related, _ in ranked], many=True).data
+        for item, (_, score) in zip(data, ranked):
+            item['related_score'] = round(score, 4)
+        return Response(data)
+
 class VersionViewSet(viewsets.ModelViewSet):
     queryset = Version.objects.all()
     serializer_class = VersionSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     #permission_classes = [IsCreatorOrReadOnly|IsAdminUser|IsSubadmin]
+    # Episodes per page of the reader action
+    reader_page_size = 10
+    reader_max_page_size = 50
 
     # We no longer need to handle version creation manually
     # The perform_create method can be removed
@@ -288,6 +458,48 @@ class VersionViewSet(viewsets.ModelViewSet):
             return Response({'error': 'You can only create versions for your own stories'}, status=status.HTTP_403_FORBIDDEN)'''
         serializer.save()
     
+    @action(detail=True, methods=['get'])
+    def read(self, request, pk=None):
+        """
+        The version's episodes in reading order with their full text, paged by
+        position: ?start=<position>&limit=<n>. With ?prefetch=true the
+        summaries of the following page come along too.
+        """
+        version = self.get_object()
+        trending.record_read(version.story_id)
+        try:
+            start = int(request.query_params.get('start', 0))
+            limit = int(request.query_params.get('limit', self.reader_page_size))
+        except ValueError:
+            return Response({'error': 'start and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if start < 0 or not 1 <= limit <= self.reader_max_page_size:
+            return Response(
+                {'error': f'start must be 0 or more and limit between 1 and {self.reader_max_page_size}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        in_order = Episode.objects.filter(version=version).order_by('created_at', 'id')
+        # One row past the page tells whether there is a next one
+        episodes = list(in_order.select_related('creator')[start:start + limit + 1])
+        has_next = len(episodes) > limit
+        episodes = episodes[:limit]
+        for position, episode in enumerate(episodes, start=start):
+            episode.position = position
+
+        data = {
+            'version': {'id': version.id, 'story': version.story_id, 'version_number': version.version_number},
+            'start': start,
+            'limit': limit,
+            'next_start': start + limit if has_next else None,
+            'episodes': ReaderEpisodeSerializer(episodes, many=True, context={'request': request}).data,
+        }
+        if has_next and request.query_params.get('prefetch', '').lower() == 'true':
+            following = list(in_order.only('id', 'title', 'excerpt', 'word_count')[start + limit:start + 2 * limit])
+            for position, episode in enumerate(following, start=start + limit):
+                episode.position = position
+            data['next_page'] = ReaderSummarySerializer(following, many=True).data
+        return Response(data)
+
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def branch(self, request, pk=None):
         version = self.get_object()
@@ -315,26 +527,37 @@ class VersionViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 class EpisodeViewSet(viewsets.ModelViewSet):
-    queryset = Episode.objects.all()
     serializer_class = EpisodeSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     #permission_classes = [IsCreatorOrReadOnly|IsAdminUser|IsSubadmin]
+
+    def get_queryset(self):
+        # Moderators reach every episode; creators also their own ones
+        # waiting on moderation
+        user = self.request.user
+        if IsSubadmin().has_permission(self.request, self):
+            return Episode.objects.with_hidden()
+        if user.is_authenticated:
+            return Episode.objects.with_hidden().filter(
+                Q(status=Episode.PUBLIC) |
+                Q(creator=user, status__in=[Episode.QUARANTINED, Episode.PENDING])
+            )
+        return Episode.objects.all()
     
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    @action(detail=True, methods=['post', 'put', 'delete'], permission_classes=[IsAuthenticated])
     def like(self, request, pk=None):
-        episode = self.get_object()
-        if request.user in episode.liked_by.all():
-            return Response({'detail': 'Already liked.'}, status=status.HTTP_400_BAD_REQUEST)
-        episode.liked_by.add(request.user)
-        return Response({'detail': 'Liked successfully.'}, status=status.HTTP_200_OK)
+        # PUT likes and DELETE unlikes idempotently
+        return engagement_response(
+            request, EpisodeLike, 'episode', self.get_object(), request.method != 'DELETE',
+            'liked', 'likes_count', ('Liked successfully.', 'Already liked.')
+        )
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def unlike(self, request, pk=None):
-        episode = self.get_object()
-        if request.user not in episode.liked_by.all():
-            return Response({'detail': 'Not liked yet.'}, status=status.HTTP_400_BAD_REQUEST)
-        episode.liked_by.remove(request.user)
-        return Response({'detail': 'Unliked successfully.'}, status=status.HTTP_200_OK)
+        return engagement_response(
+            request, EpisodeLike, 'episode', self.get_object(), False,
+            'liked', 'likes_count', ('Unliked successfully.', 'Not liked yet.')
+        )
 
     def create(self, request, *args, **kwargs):
         # Get story_id from URL if present
@@ -432,14 +655,37 @@ class EpisodeViewSet(viewsets.ModelViewSet):
         if not story_id:
             return Response({'error': 'story_id parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        episodes = Episode.objects.filter(version__story_id=story_id)
+        episodes = Episode.objects.filter(version__story_id=story_id).select_related(*SUMMARY_RELATIONS).defer('content')
         
-        # Explicitly use the EpisodeSerializer with all fields
-        from .serializers import EpisodeSerializer
-        serializer = EpisodeSerializer(episodes, many=True, context={'request': request})
+        # Lists carry summaries; the full text comes from the episode detail endpoint
+        serializer = EpisodeSummarySerializer(episodes, many=True, context={'request': request})
         
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'])
+    def diff(self, request, pk=None):
+        """Diff against another episode in the same lineage: ?other=<id>&granularity=word|line&style=json|unified"""
+        other_id = request.query_params.get('other')
+        granularity = request.query_params.get('granularity', 'word')
+        style = request.query_params.get('style', 'json')
+        if not other_id or not other_id.isdigit():
+            return Response({'error': 'other must be an episode id'}, status=status.HTTP_400_BAD_REQUEST)
+        if granularity not in diffs.GRANULARITIES:
+            return Response({'error': f'granularity must be one of {", ".join(diffs.GRANULARITIES)}'}, status=status.HTTP_400_BAD_REQUEST)
+        if style not in diffs.STYLES:
+            return Response({'error': f'style must be one of {", ".join(diffs.STYLES)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # The texts are only loaded if the diff is not cached
+        episodes = self.get_queryset().select_related('version').defer('content', 'content_delta')
+        episode = get_object_or_404(episodes, pk=pk)
+        other = get_object_or_404(episodes, pk=other_id)
+        self.check_object_permissions(request, episode)
+        self.check_object_permissions(request, other)
+        try:
+            return Response(diffs.cached_diff(episode, other, granularity, style))
+        except diffs.LineageError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    
     @action(detail=True, methods=['get'])
     def next(self, request, pk=None):
         episode = self.get_object()
@@ -526,7 +772,7 @@ class EpisodeReportViewSet(viewsets.ModelViewSet):
 
     def create(self, request, *args, **kwargs):
         response = super().create(request, *args, **kwargs)
-        episode = Episode.objects.get(id=response.data['episode'])
+        episode = Episode.objects.with_hidden().get(id=response.data['episode'])
         if episode.status == Episode.QUARANTINED:
             response.data['message'] = 'Episode has been quarantined due to multiple reports'
         return response
@@ -561,7 +807,8 @@ class StoryReportViewSet(viewsets.ModelViewSet):
 
 # For example:
 class AdminUserListView(generics.ListAPIView):
-    queryset = User.objects.all()
+    # Deactivated users are being deleted (storyapp.deletion)
+    queryset = User.objects.filter(is_active=True)
     serializer_class = UserSerializer
     permission_classes = [IsAdmin]  # Changed from IsAdminUser
 
@@ -653,7 +900,7 @@ class SubadminUserListView(generics.ListAPIView):
     def get_queryset(self):
         # Get users in the same organizations as the subadmin
         user_orgs = self.request.user.organizations.all()
-        return User.objects.filter(organizations__in=user_orgs).distinct()
+        return User.objects.filter(organizations__in=user_orgs, is_active=True).distinct()
 
 class AddUserToOrganizationView(APIView):
     permission_classes = [IsSubadmin]
@@ -833,30 +1080,21 @@ class SubadminStoryListView(generics.ListAPIView):
     
     def get_queryset(self):
         user = self.request.user
-        
-        # Get users in the same organizations as the subadmin
-        user_orgs = user.organizations.all()
-        org_users = User.objects.filter(organizations__in=user_orgs)
-        
-        # Get users assigned to this subadmin
-        assigned_users = User.objects.filter(profile__assigned_to=user)
-        
-        # Instead of using the OR operator, use Q objects to combine the conditions
-        from django.db.models import Q
-        
-        # Get all managed users using Q objects
+
+        # Users in the same organizations as the subadmin or assigned to
+        # them, as one subquery
         managed_users = User.objects.filter(
-            Q(organizations__in=user_orgs) | 
+            Q(organizations__in=user.organizations.all()) |
             Q(profile__assigned_to=user)
-        ).distinct()
-        
+        ).values('id')
+
         # Get all stories where either:
         # 1. The creator is one of the managed users, or
         # 2. The story has episodes created by managed users
         return Story.objects.filter(
-            Q(creator__in=managed_users) | 
-            Q(versions__episodes__creator__in=managed_users)
-        ).distinct()
+            Q(creator__in=managed_users) |
+            Q(id__in=Episode.objects.with_hidden().filter(creator__in=managed_users).values('version__story_id'))
+        )
 
 ## Step 2: Create the API View
 from rest_framework import generics, permissions
@@ -872,10 +1110,7 @@ class UserQuarantinedEpisodesView(generics.ListAPIView):
         """
         This view returns all quarantined episodes created by the current user
         """
-        return Episode.objects.filter(
-            creator=self.request.user,
-            status=Episode.QUARANTINED
-        ).order_by('-created_at')
+        return Episode.objects.only_quarantined().filter(creator=self.request.user).order_by('-created_at')
         
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
@@ -926,7 +1161,7 @@ class SubmitEpisodeForApprovalView(APIView):
     
     def post(self, request, episode_id):
         try:
-            episode = Episode.objects.get(id=episode_id)
+            episode = Episode.objects.with_hidden().get(id=episode_id)
             
             # Check if the user is the creator of the episode
             if episode.creator != request.user:
@@ -983,13 +1218,10 @@ class AdminEpisodeReviewView(generics.ListAPIView):
                 episode__creator__in=managed_users
             ).distinct()
 
-            deleted_episodes = Episode.objects.filter(
-                status=Episode.DELETED,
-                creator__in=managed_users
-            ).distinct()
+            deleted_episodes = Episode.objects.only_deleted().filter(creator__in=managed_users).distinct()
         else:
             queryset = self.get_queryset()
-            deleted_episodes = Episode.objects.filter(status=Episode.DELETED)
+            deleted_episodes = Episode.objects.only_deleted()
 
         serializer = self.get_serializer(queryset, many=True)
 
@@ -1004,14 +1236,14 @@ class AdminEpisodeReviewView(generics.ListAPIView):
 
             if episode_id:
                 try:
-                    episode = Episode.objects.get(id=episode_id)
+                    episode = Episode.objects.with_hidden().get(id=episode_id)
                     version = episode.version
                     story = version.story
 
                     episode_data = {
                         'id': episode.id,
                         'title': episode.title,
-                        'content': episode.content,
+                        'content': episode.body,
                         'version': version.id,
                         'parent_episode': episode.parent_episode.id if episode.parent_episode else None,
                         'created_at': episode.created_at,
@@ -1078,7 +1310,7 @@ class AdminEpisodeReviewView(generics.ListAPIView):
                 episode_data = {
                     'id': episode.id,
                     'title': episode.title,
-                    'content': episode.content,
+                    'content': episode.body,
                     'version': version.id,
                     'parent_episode': episode.parent_episode.id if episode.parent_episode else None,
                     'created_at': episode.created_at,
@@ -1172,7 +1404,7 @@ class AdminPendingEpisodesView(generics.ListAPIView):
             if episode_id:
                 try:
                     # Get the episode object
-                    episode = Episode.objects.get(id=episode_id)
+                    episode = Episode.objects.with_hidden().get(id=episode_id)
                     # Get the version and story
                     version = episode.version
                     story = version.story
@@ -1181,7 +1413,7 @@ class AdminPendingEpisodesView(generics.ListAPIView):
                     episode_data = {
                         'id': episode.id,
                         'title': episode.title,
-                        'content': episode.content,
+                        'content': episode.body,
                         'version': version.id,
                         'parent_episode': episode.parent_episode.id if episode.parent_episode else None,
                         'created_at': episode.created_at,
@@ -1269,7 +1501,7 @@ class DeleteEpisodeView(generics.UpdateAPIView):
     so an admin can review it before permanent deletion.
     """
     permission_classes = [IsAuthenticated]
-    queryset = Episode.objects.all()
+    queryset = Episode.objects.with_hidden()
     serializer_class = EpisodeSerializer
     lookup_url_kwarg = 'episode_id'
     
@@ -1298,7 +1530,7 @@ class ApproveEpisodeView(APIView):
     def post(self, request, episode_id):
         try:
             # Look for episode with either PENDING or DELETED status
-            episode = Episode.objects.get(
+            episode = Episode.objects.with_hidden().get(
                 id=episode_id, 
                 status__in=[Episode.PENDING, Episode.DELETED]
             )
@@ -1317,7 +1549,7 @@ class RejectEpisodeView(APIView):
     
     def post(self, request, episode_id):
         try:
-            episode = Episode.objects.get(id=episode_id, status=Episode.PENDING)
+            episode = Episode.objects.only_pending().get(id=episode_id)
             
             # Keep the episode quarantined
             episode.status = Episode.QUARANTINED
@@ -1340,7 +1572,7 @@ class StoriesWithReportedEpisodesView(generics.ListAPIView):
     
     def list(self, request, *args, **kwargs):
         # Get all quarantined episodes created by the current user
-        user_quarantined_episodes = Episode.objects.filter(
+        user_quarantined_episodes = Episode.objects.with_hidden().filter(
             creator=self.request.user,
             version__story__visibility='quarantined'
         ).select_related('version__story').distinct()
@@ -1406,19 +1638,11 @@ class UserEpisodesWithReportedStoriesView(generics.ListAPIView):
     
     def get_queryset(self):
         """
-        This view returns all episodes created by the current user
-        from stories that have at least one quarantined episode
+        This view returns the quarantined episodes created by the current
+        user, the only ones the listing keeps
         """
-        # First find stories that have quarantined episodes by this user
-        stories_with_quarantined_episodes = Story.objects.filter(
-            versions__episodes__status=Episode.QUARANTINED,
-            versions__episodes__creator=self.request.user
-        ).distinct()
-        
-        # Then get all episodes by the current user from those stories
-        return Episode.objects.filter(
-            creator=self.request.user,
-            version__story__in=stories_with_quarantined_episodes
+        return Episode.objects.only_quarantined().filter(
+            creator=self.request.user
         ).select_related('version__story', 'creator')
     
     def list(self, request, *args, **kwargs):
@@ -1453,11 +1677,11 @@ class UserEpisodesWithReportedStoriesView(generics.ListAPIView):
         return Response(response_data)
 
 class PendingEpisodesView(generics.ListAPIView):
-    serializer_class = EpisodeSerializer
+    serializer_class = EpisodeSummarySerializer
     permission_classes = [IsAdmin]
     
     def get_queryset(self):
-        return Episode.objects.filter(status=Episode.PENDING).select_related('version__story', 'creator')
+        return Episode.objects.only_pending().select_related(*SUMMARY_RELATIONS).defer('content')
 
 class AdminDeleteStoryView(generics.DestroyAPIView):
     """
@@ -1470,12 +1694,56 @@ class AdminDeleteStoryView(generics.DestroyAPIView):
     def destroy(self, request, *args, **kwargs):
         story = self.get_object()
         
-        # Permanently delete the story and all related content
-        story.delete()
+        # Tombstone the story now; its content is deleted in the background
+        job = deletion.delete_story(story, request.user)
         
         return Response(
-            {"message": "Story and all related content permanently deleted"}, 
-            status=status.HTTP_204_NO_CONTENT
+            {
+                "message": "Story deleted; related content is being removed",
+                "job": DeletionJobSerializer(job).data,
+            },
+            status=status.HTTP_202_ACCEPTED
         )
 
-        
\ No newline at end of file
+
+class DeletionJobView(generics.RetrieveAPIView):
+    """Progress of a background deletion; subadmins only see the ones they started"""
+    permission_classes = [IsAdmin|IsSubadmin]
+    serializer_class = DeletionJobSerializer
+    lookup_url_kwarg = 'job_id'
+
+    def get_queryset(self):
+        jobs = DeletionJob.objects.all()
+        if self.request.user.profile.role != 'admin':
+            jobs = jobs.filter(requested_by=self.request.user)
+        return jobs
+
+        
+class AdminProfileCaptureListView(APIView):
+    """
+    Lists the request profiles captured by ProfilingMiddleware, newest first
+    """
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response(profiling.list_captures())
+
+class AdminProfileCaptureDetailView(APIView):
+    """
+    Returns the summary of one capture; ?download=true returns the raw
+    cProfile stats file for pstats/snakeviz instead
+    """
+    permission_classes = [IsAdmin]
+
+    def get(self, request, capture_id):
+        summary = profiling.load_summary(capture_id)
+        if summary is None:
+            return Response({'error': 'Capture not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        if request.query_params.get('download', 'false').lower() == 'true':
+            path = profiling.capture_path(capture_id, '.prof')
+            try:
+                return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{capture_id}.prof')
+            except FileNotFoundError:
+                return Response({'error': 'Capture not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(summary)
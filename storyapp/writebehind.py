@@ -0,0 +1,249 @@
+"""
+Write-behind buffering for likes, follows and favorites.
+
+With ENGAGEMENT_WRITE_BEHIND enabled, engagement.set_engaged does not write
+to the engagement database. It appends the change to this process's journal
+file in ENGAGEMENT_JOURNAL_DIR and records it in an in-memory buffer keyed
+by (table, target, owner), where repeated toggles collapse to their latest
+state. A background thread applies the buffer every ENGAGEMENT_FLUSH_SECONDS,
+or sooner once ENGAGEMENT_FLUSH_MAX_PENDING changes are waiting, in one
+transaction per flush.
+
+Until a change is flushed, the lookups in storyapp.engagement overlay it on
+what they read, so users see their own actions at once. Only the process
+that took a change can see it before the flush.
+
+The journal is the durable copy. Each line is fsynced before the request
+returns, and a journal is only removed once its changes are committed. When
+a process starts buffering it replays the journals of processes that are no
+longer running. flush_engagement_journal does the same from the command
+line. Replaying is idempotent: likes are inserted with ON CONFLICT DO NOTHING
+and unlikes are deletes.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, router, transaction
+
+logger = logging.getLogger('storyapp.writebehind')
+
+# Buffered tables: model label -> (target field, owner field)
+BUFFERED = {
+    'storyapp.storylike': ('story', 'user'),
+    'storyapp.storyfollow': ('story', 'user'),
+    'storyapp.episodelike': ('episode', 'user'),
+    'accounts.favoritestory': ('story', 'profile'),
+}
+
+
+def enabled():
+    return getattr(settings, 'ENGAGEMENT_WRITE_BEHIND', False)
+
+
+def journal_dir():
+    return str(getattr(settings, 'ENGAGEMENT_JOURNAL_DIR', os.path.join(settings.BASE_DIR, 'engagement-journal')))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_journal(path):
+    """The latest state per (label, target, owner) in a journal; a torn last line is ignored"""
+    changes = {}
+    with open(path) as journal:
+        for line in journal:
+            try:
+                label, target, owner, engaged = json.loads(line)
+            except ValueError:
+                continue
+            changes[(label, target, owner)] = bool(engaged)
+    return changes
+
+
+def apply(changes):
+    """Writes {(label, target, owner): engaged} in one transaction per database"""
+    by_alias = {}
+    for (label, target, owner), engaged in changes.items():
+        model = apps.get_model(label)
+        alias = router.db_for_write(model)
+        by_alias.setdefault(alias, {}).setdefault(model, ([], []))[0 if engaged else 1].append((target, owner))
+
+    for alias, models in by_alias.items():
+        connection = connections[alias]
+        quote = connection.ops.quote_name
+        with transaction.atomic(using=alias):
+            with connection.cursor() as cursor:
+                for model, (added, removed) in models.items():
+                    target_field, owner_field = BUFFERED[model._meta.label_lower]
+                    table = quote(model._meta.db_table)
+                    target_column = quote(model._meta.get_field(target_field).column)
+                    owner_column = quote(model._meta.get_field(owner_field).column)
+                    if added:
+                        cursor.executemany(
+                            f'INSERT INTO {table} ({target_column}, {owner_column}) VALUES (%s, %s) '
+                            f'ON CONFLICT DO NOTHING',
+                            added,
+                        )
+                    if removed:
+                        cursor.executemany(
+                            f'DELETE FROM {table} WHERE {target_column} = %s AND {owner_column} = %s',
+                            removed,
+                        )
+
+
+def recover():
+    """Replays and removes the journals of processes that are no longer running; returns how many"""
+    directory = journal_dir()
+    names = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+    replayed = 0
+    for name in names:
+        pid = name.split('.', 1)[0]
+        # A file named after this process predates it: the pid was reused
+        if not pid.isdigit() or (int(pid) != os.getpid() and _pid_alive(int(pid))):
+            continue
+        path = os.path.join(directory, name)
+        apply(_read_journal(path))
+        os.remove(path)
+        replayed += 1
+    return replayed
+
+
+class WriteBehindBuffer:
+    """The pending changes of this process and the thread that flushes them"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+
+    def _start(self):
+        # Also after a fork: the child starts with its own journal and thread
+        self._pid = os.getpid()
+        # {(label, target, owner): (engaged, engaged in the database)}
+        self._pending = {}
+        self._flushing = {}
+        self._sequence = 0
+        # Renamed journals whose changes are not committed yet
+        self._unwritten = []
+        os.makedirs(journal_dir(), exist_ok=True)
+        try:
+            recover()
+        except Exception:
+            logger.exception('Could not replay engagement journals')
+        self._journal = open(self._journal_path(), 'a')
+        threading.Thread(target=self._run, name='engagement-write-behind', daemon=True).start()
+
+    def _journal_path(self):
+        return os.path.join(journal_dir(), f'{self._pid}.jsonl')
+
+    def _state(self, key):
+        """(engaged, in the database) for a key already buffered, else None"""
+        return self._pending.get(key) or self._flushing.get(key)
+
+    def record(self, model, target, owner, engaged, stored):
+        """
+        Buffers one change. ``stored`` tells whether the row exists in the
+        database; it is only called when the key is not buffered yet. Returns
+        whether the visible state changed.
+        """
+        label = model._meta.label_lower
+        key = (label, target, owner)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._start()
+            state = self._state(key)
+        if state is None:
+            in_database = stored()
+            state = (in_database, in_database)
+        with self._lock:
+            state = self._state(key) or state
+            changed = state[0] != engaged
+            self._journal.write(json.dumps([label, target, owner, int(engaged)]) + '\n')
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._pending[key] = (engaged, state[1])
+            if len(self._pending) >= getattr(settings, 'ENGAGEMENT_FLUSH_MAX_PENDING', 1000):
+                self._wake.set()
+        return changed
+
+    def overlay(self, model):
+        """{(target, owner): engaged} for the changes to ``model`` not yet in the database"""
+        if self._pid != os.getpid():
+            return {}
+        label = model._meta.label_lower
+        with self._lock:
+            merged = {**self._flushing, **self._pending}
+        return {
+            (target, owner): engaged
+            for (key_label, target, owner), (engaged, in_database) in merged.items()
+            if key_label == label and engaged != in_database
+        }
+
+    def flush(self):
+        with self._lock:
+            if self._pid != os.getpid() or not self._pending:
+                return 0
+            self._flushing, self._pending = self._pending, {}
+            self._journal.close()
+            self._sequence += 1
+            flushing_path = f'{self._journal_path()[:-len(".jsonl")]}.{self._sequence}.flushing'
+            os.replace(self._journal_path(), flushing_path)
+            self._unwritten.append(flushing_path)
+            self._journal = open(self._journal_path(), 'a')
+            changes = {key: engaged for key, (engaged, in_database) in self._flushing.items()}
+        try:
+            apply(changes)
+        except Exception:
+            # Keep the changes visible and buffered for the next attempt; the
+            # renamed journals stay on disk until they are written
+            with self._lock:
+                self._pending = {**self._flushing, **self._pending}
+                self._flushing = {}
+            raise
+        with self._lock:
+            # Changes taken during the flush now sit on top of what it wrote
+            for key, (engaged, in_database) in self._flushing.items():
+                if key in self._pending:
+                    self._pending[key] = (self._pending[key][0], engaged)
+            self._flushing = {}
+            written, self._unwritten = self._unwritten, []
+        for path in written:
+            os.remove(path)
+        return len(changes)
+
+    def _run(self):
+        interval = getattr(settings, 'ENGAGEMENT_FLUSH_SECONDS', 1.0)
+        while True:
+            self._wake.wait(interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Engagement write-behind flush failed')
+            finally:
+                connections.close_all()
+
+
+buffer = WriteBehindBuffer()
+
+
+def _flush_at_exit():
+    try:
+        buffer.flush()
+    except Exception:
+        logger.exception('Could not flush engagement changes at exit; they stay in the journal')
+
+
+atexit.register(_flush_at_exit)